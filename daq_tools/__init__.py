@@ -1,24 +1,55 @@
 from typing import Dict, Type
-from .core import SoftwareTimingDAQ, BoardInfo, DAQReadError, BoardType
+import importlib
+from .core import SoftwareTimingDAQ, BoardInfo, DAQReadError, BoardType, IOMethod, IOOperation, OutputState
 
-DAQ_CONSTRUCTORS: Dict[BoardType, Type[SoftwareTimingDAQ]] = {}
+from .simulated import Simulated_SoftTiming
+from .backends import BackendRegistry
 
-try:
-    from .arduino import Arduino_SoftTiming
-    DAQ_CONSTRUCTORS.update({BoardType.ARDUINO: Arduino_SoftTiming})
-except:
-    print('Arduino not available, install pyfirmata')
+# hardware backends are imported on first use, see BackendRegistry
+DAQ_CONSTRUCTORS: Dict[BoardType, Type[SoftwareTimingDAQ]] = BackendRegistry()
+DAQ_CONSTRUCTORS[BoardType.SIMULATED] = Simulated_SoftTiming
 
-try:
-    from .labjack import LabJackU3_SoftTiming
-    DAQ_CONSTRUCTORS.update({BoardType.LABJACK: LabJackU3_SoftTiming})
-except:
-    print('Labjack not available, install exodriver')
+_BACKEND_CLASSES = {
+    'Arduino_SoftTiming': BoardType.ARDUINO,
+    'LabJackU3_SoftTiming': BoardType.LABJACK,
+    'NI_SoftTiming': BoardType.NATIONAL_INSTRUMENTS,
+}
 
-try:
-    from .national_instruments import NI_SoftTiming
-    DAQ_CONSTRUCTORS.update({BoardType.NATIONAL_INSTRUMENTS: NI_SoftTiming})
-except:
-    print('National Instruments not available, install nidaqmx')
+# name -> module, imported on first access so that `import daq_tools` stays
+# light (no numpy, no multiprocessing machinery) for simple board access
+_LAZY = {
+    **dict.fromkeys(['DAQGroup'], 'group'),
+    **dict.fromkeys(['DeviceServer', 'DeviceClient', 'DeviceServerError'], 'server'),
+    **dict.fromkeys(['TracingDAQ', 'read_trace', 'replay_trace'], 'trace'),
+    **dict.fromkeys(['Edge', 'EdgeTrigger', 'ThresholdTrigger', 'TriggeredCapture', 'TriggeredCaptureHandler', 'EventWindow'], 'trigger'),
+    **dict.fromkeys(['FIRDecimator', 'MultiStageDecimator', 'DecimatorBank', 'DecimationStage'], 'decimation'),
+    **dict.fromkeys(['Recorder', 'RecordingReader', 'RecordingHandler', 'Envelope'], 'recording'),
+    **dict.fromkeys(['SeqlockArray'], 'shared'),
+    **dict.fromkeys(['RunningStatistics', 'StatisticsHandler', 'read_statistics'], 'statistics'),
+    **dict.fromkeys(['PackedDigital', 'Transitions', 'TransitionFinder', 'DigitalReader'], 'digital'),
+    **dict.fromkeys(['RealtimeConfig', 'Policy', 'measure_scheduling_latency'], 'realtime'),
+    **dict.fromkeys(['AdaptiveChunking', 'ChunkSizeController', 'ChunkCostModel'], 'chunking'),
+    **dict.fromkeys(['ChunkHeader', 'TimestampedChunk', 'ClockEstimator'], 'clock'),
+    **dict.fromkeys(['PulseSequence', 'CompiledSequence', 'OutputChunk'], 'sequence'),
+    **dict.fromkeys(['ControlLoop', 'LoopStats'], 'control'),
+    **dict.fromkeys(['EdgeEvent', 'EdgeStats', 'PollingEdgeWatcher'], 'edges'),
+    **dict.fromkeys(['U3Calibration'], 'calibration'),
+    **dict.fromkeys(['LatestValues', 'Latest'], 'latest'),
+    **dict.fromkeys(['Pipeline', 'Connection', 'ChunkRing'], 'pipeline'),
+}
 
+def __getattr__(name: str):
+    # e.g. `from daq_tools import LabJackU3_SoftTiming` imports the LabJack backend only
+    if name in _BACKEND_CLASSES:
+        try:
+            return DAQ_CONSTRUCTORS[_BACKEND_CLASSES[name]]
+        except KeyError:
+            pass
+    elif name in _LAZY:
+        value = getattr(importlib.import_module(f'.{_LAZY[name]}', __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
+def __dir__():
+    return sorted([*globals(), *_BACKEND_CLASSES, *_LAZY])
@@ -1,7 +1,10 @@
-from .core import SoftwareTimingDAQ, DAQReadError, BoardInfo, BoardType
-from pyfirmata import Arduino, INPUT, OUTPUT, PWM
+from .core import SoftwareTimingDAQ, DAQReadError, BoardInfo, BoardType, IOMethod, IOOperation, serialized, coalesced
+from .edges import EdgeWatcher
+from pyfirmata import Arduino, INPUT, OUTPUT, PWM, UNAVAILABLE, DIGITAL_MESSAGE
 from serial.tools import list_ports
-from typing import List, Optional
+from typing import Dict, List, Optional, Sequence
+import threading
+import time
 import logging
 
 logger = logging.getLogger(__name__)
@@ -14,8 +17,72 @@ SUPPORTED_ARDUINO_BOARDS = {
     ("2341", "0001"), # Uno Rev2 or variants
 }
 
+# digital message (3 bytes, 10 bits each on the wire) plus USB full speed polling
+FIRMATA_MESSAGE_BITS = 30
+USB_LATENCY = 1e-3
+
+class FirmataEdgeWatcher(EdgeWatcher):
+    '''
+    No polling: with digital reporting enabled, the Firmata firmware sends
+    the state of a port as soon as one of its input pins changes. Messages
+    are read by a thread and checked for changes of the watched pins. The
+    detection latency bound is the transmission time of the message plus
+    the USB polling interval.
+    '''
+
+    def __init__(self, daq: "Arduino_SoftTiming") -> None:
+        super().__init__(daq)
+        self.board = daq.device
+        self.latency = FIRMATA_MESSAGE_BITS / self.board.sp.baudrate + USB_LATENCY
+        self._handle_message = self.board._command_handlers[DIGITAL_MESSAGE]
+        self.board.add_cmd_handler(DIGITAL_MESSAGE, self._digital_message)
+        self._thread = threading.Thread(target=self._run, daemon=True, name=f'firmata reader {daq.board_id}')
+        self._thread.start()
+
+    def _watch(self, channel: int) -> None:
+        with self.daq.device_access():
+            pin = self.board.digital[channel]
+            if pin.PWM_CAPABLE:
+                raise ValueError(f'digital read not available on PWM pin')
+            pin.mode = INPUT
+            # the board answers with the current state of the port
+            pin.enable_reporting()
+
+    def _unwatch(self, channel: int) -> None:
+        with self.daq.device_access():
+            port = self.board.digital[channel].port
+            if not any(c // 8 == port.port_number for c in self.channels):
+                port.disable_reporting()
+
+    def _digital_message(self, port_nr, lsb, msb):
+        # keep pin values up to date for digital_read
+        self._handle_message(port_nr, lsb, msb)
+        now = time.perf_counter()
+        self.stats.transactions += 1
+        mask = lsb + (msb << 7)
+        for channel in self.channels:
+            if channel // 8 == port_nr:
+                self.stats.reads += 1
+                self._update(channel, bool(mask >> (channel % 8) & 1), now, self.latency)
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                self.board.iterate()
+            except Exception as e:
+                if not self._stop_event.is_set():
+                    logger.warning(f'Firmata reader stopped: {e}')
+                    self.stats.errors += 1
+                return
+
+    def stop(self) -> None:
+        super().stop()
+        self.board._command_handlers[DIGITAL_MESSAGE] = self._handle_message
+
 class Arduino_SoftTiming(SoftwareTimingDAQ):
 
+    PWM_ON_DIGITAL_PINS = True
+
     def __init__(self, *args, **kwargs) -> None:
         
         super().__init__(*args, **kwargs)
@@ -28,8 +95,10 @@ class Arduino_SoftTiming(SoftwareTimingDAQ):
             raise
         
         self._closed = False
+        self._resetting = False
         self.reset_state()
 
+    @serialized
     def digital_read(self, channel: int) -> float:
 
         try:
@@ -47,6 +116,7 @@ class Arduino_SoftTiming(SoftwareTimingDAQ):
             raise DAQReadError(f"Failed to read from digital channel {channel}.")
         return val
 
+    @coalesced
     def digital_write(self, channel: int, val: bool) -> None:
         
         try:
@@ -60,6 +130,7 @@ class Arduino_SoftTiming(SoftwareTimingDAQ):
         pin.mode = OUTPUT
         pin.write(val)
 
+    @coalesced
     def pwm_write(self, channel: int, duty_cycle: float) -> None:
         """
         Set PWM on a pin with a duty cycle (0.0 to 1.0).
@@ -75,6 +146,7 @@ class Arduino_SoftTiming(SoftwareTimingDAQ):
         pin.mode = PWM
         pin.write(duty_cycle)
         
+    @serialized
     def analog_read(self, channel: int) -> float:
         try:
             pin = self.device.analog[channel]
@@ -94,25 +166,67 @@ class Arduino_SoftTiming(SoftwareTimingDAQ):
     def analog_write(self, channel: int, val: float) -> None:
         raise NotImplementedError("Arduino does not support analog write, use PWM instead.")
 
+    def _create_edge_watcher(self) -> FirmataEdgeWatcher:
+        return FirmataEdgeWatcher(self)
+
+    @serialized
+    def execute(self, operations: Sequence[IOOperation]) -> List[Optional[float]]:
+        """
+        Digital writes to pins of the same port are sent as a single 
+        Firmata port message instead of one message per pin.
+        """
+
+        ports: Dict[int, object] = {}
+
+        def flush():
+            for port in ports.values():
+                port.write()
+            ports.clear()
+
+        results = []
+        for operation in operations:
+            if operation.method != IOMethod.DIGITAL_WRITE:
+                flush()
+                results.extend(super().execute([operation]))
+                continue
+
+            try:
+                pin = self.device.digital[operation.channel]
+            except IndexError:
+                raise ValueError(f"Invalid channel {operation.channel}. Valid channels are 0 to {len(self.device.digital) - 1}.")
+            
+            if pin.PWM_CAPABLE and not self._resetting:
+                # reset_state sets PWM pins in an unknown state as LOW outputs
+                raise ValueError(f'digital write not available on PWM pin')
+
+            if pin.mode != OUTPUT:
+                pin.mode = OUTPUT
+            pin.value = int(bool(operation.value))
+            ports[pin.port.port_number] = pin.port
+            results.append(None)
+
+        flush()
+        self._record_outputs(operations)
+        return results
+
+    @serialized
     def close(self) -> None:
         if self._closed:
             return  # Already closed, do nothing
         
         logger.info("Closing Arduino connection, setting outputs off")
+        self.stop_edge_watcher()
         self.reset_state()
         self.device.exit()
         self._closed = True
     
+    @serialized
     def reset_state(self):
-
-        logger.info("Resetting all output pins to LOW")
-
-        for pin in self.device.digital:
-            try:
-                pin.write(False)  
-            except Exception as e:
-                logger.warning(f"Failed to reset digital pin {pin.pin_number}: {e}")
-
+        self._resetting = True
+        try:
+            self.reset_outputs()
+        finally:
+            self._resetting = False
 
     @classmethod
     def list_boards(cls) -> List[BoardInfo]:
@@ -145,13 +259,13 @@ class Arduino_SoftTiming(SoftwareTimingDAQ):
         return [idx for idx, pin in enumerate(self.device.analog)]
     
     def list_digital_input_channels(self) -> List[int]:
-        return [idx for idx, pin in enumerate(self.device.digital) if not pin.PWM_CAPABLE]
+        return [idx for idx, pin in enumerate(self.device.digital) if not pin.PWM_CAPABLE and pin.mode != UNAVAILABLE]
     
     def list_digital_output_channels(self) -> List[int]:
         return self.list_digital_input_channels()
 
     def list_pwm_output_channels(self) -> List[int]:
-        return [idx for idx, pin in enumerate(self.device.digital) if pin.PWM_CAPABLE]
+        return [idx for idx, pin in enumerate(self.device.digital) if pin.PWM_CAPABLE and pin.mode != UNAVAILABLE]
 
     def list_pwm_input_channels(self) -> List[int]:
         return []
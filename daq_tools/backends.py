@@ -0,0 +1,66 @@
+from .core import SoftwareTimingDAQ, BoardType
+from collections.abc import MutableMapping
+from typing import Dict, Iterator, Tuple, Type
+import importlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# board type -> (module, class, what to install when the import fails)
+BACKENDS: Dict[BoardType, Tuple[str, str, str]] = {
+    BoardType.SIMULATED: ('simulated', 'Simulated_SoftTiming', ''),
+    BoardType.ARDUINO: ('arduino', 'Arduino_SoftTiming', 'install pyfirmata'),
+    BoardType.LABJACK: ('labjack', 'LabJackU3_SoftTiming', 'install exodriver'),
+    BoardType.NATIONAL_INSTRUMENTS: ('national_instruments', 'NI_SoftTiming', 'install nidaqmx'),
+}
+
+class BackendRegistry(MutableMapping):
+    '''
+    Board type -> SoftwareTimingDAQ class. A backend (and its driver library,
+    which can take a while to load) is imported the first time it is looked
+    up, so using one board type does not pay for the others. Board types
+    whose backend can't be imported are missing (KeyError). Other classes
+    can be registered with registry[board_type] = cls.
+    '''
+
+    def __init__(self) -> None:
+        self._classes: Dict[BoardType, Type[SoftwareTimingDAQ]] = {}
+        self._errors: Dict[BoardType, Exception] = {}
+
+    def __getitem__(self, board_type: BoardType) -> Type[SoftwareTimingDAQ]:
+
+        if board_type in self._classes:
+            return self._classes[board_type]
+        if board_type not in BACKENDS or board_type in self._errors:
+            raise KeyError(board_type)
+
+        module, name, hint = BACKENDS[board_type]
+        try:
+            cls = getattr(importlib.import_module(f'.{module}', __package__), name)
+        except Exception as e:
+            self._errors[board_type] = e
+            logger.warning(f'{board_type} not available, {hint} ({e})')
+            raise KeyError(board_type) from e
+
+        self._classes[board_type] = cls
+        return cls
+
+    def __setitem__(self, board_type: BoardType, cls: Type[SoftwareTimingDAQ]) -> None:
+        self._classes[board_type] = cls
+        self._errors.pop(board_type, None)
+
+    def __delitem__(self, board_type: BoardType) -> None:
+        del self._classes[board_type]
+
+    def __iter__(self) -> Iterator[BoardType]:
+        # imports every backend
+        for board_type in dict.fromkeys([*BACKENDS, *self._classes]):
+            if board_type in self:
+                yield board_type
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def errors(self) -> Dict[BoardType, Exception]:
+        """Why the backends that were looked up could not be imported"""
+        return dict(self._errors)
@@ -0,0 +1,214 @@
+from typing import Dict, Optional, Sequence, Union
+import numpy as np
+import json
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# The U3 calibration memory holds slope / offset pairs converting raw 16 bit
+# AIN counts to volts and volts to 8 bit DAC counts (section 2.6.2 of the U3
+# user's guide). Reading it takes several USB transactions, so it is read once
+# per device and cached on disk by serial number.
+
+CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
+    'daq_tools', 'calibration'
+)
+
+# values LabJackPython uses when no calibration was read
+NOMINAL = {
+    'lvSESlope': 0.000037231,
+    'lvSEOffset': 0.0,
+    'lvDiffSlope': 0.000074463,
+    'lvDiffOffset': -2.44,
+    'dac0Slope': 51.717,
+    'dac0Offset': 0.0,
+    'dac1Slope': 51.717,
+    'dac1Offset': 0.0,
+    **{f'hvAIN{i}Slope': 0.000314 for i in range(4)},
+    **{f'hvAIN{i}Offset': -10.3 for i in range(4)},
+}
+
+Channels = Union[int, Sequence[int], np.ndarray]
+
+class U3Calibration:
+    '''
+    Vectorized conversions for one U3: raw AIN counts to volts and volts to
+    16 bit DAC counts, for whole arrays at once. `channels` gives the channel
+    of each element along the last axis, e.g. the column order of a
+    (samples, channels) chunk.
+
+    Per channel user scaling is folded into the calibration:
+        value = polynomial(gain * volts + offset)
+    gain and offset are merged with the calibration slope and offset, so a
+    linear channel costs a single multiply-add per sample; polynomials
+    (coefficients lowest order first) add a Horner evaluation on their columns.
+    '''
+
+    NUM_AIN = 16
+    NUM_DAC = 2
+    HV_CHANNELS = 4 # AIN0-3 are high voltage on a U3-HV
+
+    def __init__(self, serial: int, cal_data: Dict[str, float], is_hv: bool = False) -> None:
+
+        self.serial = serial
+        self.cal_data = dict(cal_data)
+        self.is_hv = is_hv
+
+        self._ain_slope = np.full(self.NUM_AIN, cal_data['lvSESlope'])
+        self._ain_offset = np.full(self.NUM_AIN, cal_data['lvSEOffset'])
+        if is_hv:
+            for i in range(self.HV_CHANNELS):
+                self._ain_slope[i] = cal_data[f'hvAIN{i}Slope']
+                self._ain_offset[i] = cal_data[f'hvAIN{i}Offset']
+        self._diff_slope = np.full(self.NUM_AIN, cal_data['lvDiffSlope'])
+        self._diff_offset = np.full(self.NUM_AIN, cal_data['lvDiffOffset'])
+        self._dac_slope = np.array([cal_data[f'dac{i}Slope'] for i in range(self.NUM_DAC)])
+        self._dac_offset = np.array([cal_data[f'dac{i}Offset'] for i in range(self.NUM_DAC)])
+
+        self.gain = np.ones(self.NUM_AIN)
+        self.offset = np.zeros(self.NUM_AIN)
+        self.polynomials: Dict[int, np.ndarray] = {}
+        self._update()
+
+    @classmethod
+    def nominal(cls, serial: int = 0, is_hv: bool = False) -> "U3Calibration":
+        """Typical values, for devices whose calibration memory can't be read"""
+        return cls(serial, NOMINAL, is_hv)
+
+    @classmethod
+    def load(cls, device, cache_dir: Optional[str] = CACHE_DIR, refresh: bool = False) -> "U3Calibration":
+        '''
+        Calibration of an open u3.U3, from the cache if present (refresh=True
+        reads the device again, e.g. after a recalibration). The constants are
+        also handed to the device so LabJackPython's own conversions use them.
+        '''
+
+        serial = device.serialNumber
+        is_hv = getattr(device, 'isHV', False)
+        path = os.path.join(cache_dir, f'u3_{serial}.json') if cache_dir else None
+
+        if path is not None and not refresh and os.path.exists(path):
+            try:
+                calibration = cls.from_file(path)
+                if calibration.serial != serial or calibration.is_hv != is_hv:
+                    raise ValueError('does not match the device')
+                device.calData = dict(calibration.cal_data)
+                logger.debug(f'Loaded calibration of U3 S/N {serial} from {path}')
+                return calibration
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning(f'Ignoring calibration cache {path}: {e}')
+
+        calibration = cls(serial, device.getCalibrationData(), is_hv)
+        logger.info(f'Read calibration of U3 S/N {serial}')
+        if path is not None:
+            try:
+                calibration.save(path)
+            except OSError as e:
+                logger.warning(f'Could not cache calibration to {path}: {e}')
+        return calibration
+
+    @classmethod
+    def from_file(cls, path: str) -> "U3Calibration":
+        with open(path) as f:
+            info = json.load(f)
+        return cls(info['serial'], info['cal_data'], info['is_hv'])
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok = True)
+        # write then rename, another process may be reading it
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'serial': self.serial, 'is_hv': self.is_hv, 'cal_data': self.cal_data}, f, indent = 4)
+        os.replace(tmp, path)
+
+    def set_scaling(
+            self,
+            channel: int,
+            gain: float = 1.0,
+            offset: float = 0.0,
+            polynomial: Optional[Sequence[float]] = None
+        ) -> None:
+        """User scaling of an analog input, value = polynomial(gain * volts + offset)"""
+
+        self._ain_slope[channel] # IndexError on invalid channel
+        self.gain[channel] = gain
+        self.offset[channel] = offset
+        if polynomial is None:
+            self.polynomials.pop(channel, None)
+        else:
+            self.polynomials[channel] = np.asarray(polynomial, dtype = np.float64)
+        self._update()
+
+    def _update(self) -> None:
+        # calibration and user gain / offset in a single affine map of the counts
+        self._slope = self.gain * self._ain_slope
+        self._intercept = self.gain * self._ain_offset + self.offset
+        self._diff_intercept = self.gain * self._diff_offset + self.offset
+        self._diff_scaled_slope = self.gain * self._diff_slope
+
+    def counts_to_volts(
+            self,
+            counts: np.ndarray,
+            channels: Channels,
+            differential: bool = False,
+            scaling: bool = True,
+            out: Optional[np.ndarray] = None
+        ) -> np.ndarray:
+        '''
+        Calibrated values of raw AIN counts, in volts, or in user units when
+        `scaling`. `differential` uses the low voltage differential calibration.
+        '''
+
+        channels = np.asarray(channels)
+        if scaling:
+            slope = self._diff_scaled_slope if differential else self._slope
+            intercept = self._diff_intercept if differential else self._intercept
+        else:
+            slope = self._diff_slope if differential else self._ain_slope
+            intercept = self._diff_offset if differential else self._ain_offset
+
+        slope = slope[channels]
+        if out is None:
+            out = np.empty(np.broadcast_shapes(np.shape(counts), slope.shape))
+        np.multiply(counts, slope, out = out)
+        np.add(out, intercept[channels], out = out)
+
+        if scaling and self.polynomials:
+            columns = np.atleast_1d(channels)
+            for column, channel in enumerate(columns):
+                coefficients = self.polynomials.get(int(channel))
+                if coefficients is None:
+                    continue
+                values = out[..., column] if channels.ndim else out
+                x = values.copy()
+                values.fill(coefficients[-1])
+                for c in coefficients[-2::-1]:
+                    values *= x
+                    values += c
+        return out
+
+    def volts_to_dac(self, volts: np.ndarray, channels: Channels, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """16 bit DAC counts (DAC16 command) for output voltages, clipped to the DAC range"""
+
+        channels = np.asarray(channels)
+        slope = self._dac_slope[channels] * 256
+        bits = np.empty(np.broadcast_shapes(np.shape(volts), slope.shape))
+        np.multiply(volts, slope, out = bits)
+        bits += self._dac_offset[channels] * 256
+        np.clip(bits, 0, 0xFFFF, out = bits)
+        if out is None:
+            out = np.empty(bits.shape, dtype = np.uint16)
+        np.floor(bits, out = bits)
+        out[...] = bits
+        return out
+
+    def dac_to_volts(self, counts: np.ndarray, channels: Channels) -> np.ndarray:
+        """Output voltages for 16 bit DAC counts"""
+
+        channels = np.asarray(channels)
+        return (np.asarray(counts, dtype = np.float64) / 256 - self._dac_offset[channels]) / self._dac_slope[channels]
+
+    def __repr__(self) -> str:
+        return f'U3Calibration(serial={self.serial}, is_hv={self.is_hv})'
@@ -0,0 +1,232 @@
+from .shared import SeqlockArray
+from collections import deque
+from typing import Deque, NamedTuple, Optional
+import math
+import time
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Latency of a sample through the pipeline, for chunks of n samples at rate r
+# with q chunks already waiting in the queue:
+#   n/r              waiting for the chunk to be complete (first sample)
+#   + (q+1) cost(n)  processing of the chunks ahead of it and of its own chunk
+# with cost(n) = per_chunk + per_sample * n, measured where the data is consumed.
+# The chunk size is the largest that meets the target latency (fewer, larger
+# chunks have less overhead), but never so small that the consumer cannot keep up.
+
+class ChunkCostModel:
+    '''
+    Online least squares fit of the processing time of a chunk against its
+    size, cost(n) = per_chunk + per_sample * n, with exponential forgetting
+    so that it follows changes of load.
+    '''
+
+    def __init__(self, memory: float = 100) -> None:
+        self.decay = 1 - 1 / memory
+        self.reset()
+
+    def reset(self) -> None:
+        self._s = np.zeros(5) # weight, sum n, sum n^2, sum cost, sum n*cost
+        self.count = 0
+
+    def add(self, num_samples: int, duration: float) -> None:
+        self._s *= self.decay
+        self._s += (1, num_samples, num_samples ** 2, duration, num_samples * duration)
+        self.count += 1
+
+    @property
+    def coefficients(self):
+        """(per_chunk, per_sample) in seconds"""
+
+        w, sn, snn, sc, snc = self._s
+        if w == 0:
+            return 0.0, 0.0
+        mean_n = sn / w
+        mean_c = sc / w
+        var_n = snn / w - mean_n ** 2
+        if var_n <= 1e-6 * max(mean_n ** 2, 1):
+            # all chunks about the same size: overhead and per sample cost
+            # cannot be told apart, count it all as overhead, which leads to
+            # larger chunks rather than to a consumer falling behind
+            return mean_c, 0.0
+        per_sample = (snc / w - mean_n * mean_c) / var_n
+        per_chunk = mean_c - per_sample * mean_n
+        # clip to what makes physical sense
+        if per_sample < 0:
+            return mean_c, 0.0
+        if per_chunk < 0:
+            return 0.0, mean_c / max(mean_n, 1)
+        return per_chunk, per_sample
+
+    def predict(self, num_samples: int) -> float:
+        per_chunk, per_sample = self.coefficients
+        return per_chunk + per_sample * num_samples
+
+class ChunkDecision(NamedTuple):
+    time: float # time.monotonic()
+    chunk_size: int
+    previous: int
+    per_chunk: float
+    per_sample: float
+    occupancy: float # average number of chunks waiting in the queue
+    predicted_latency: float
+    reason: str
+
+class ChunkSizeController:
+    '''
+    Pick the chunk size from the cost model and the queue occupancy.
+
+    min_chunk / max_chunk bound the chunk size, max_chunk is further limited
+    to half of the hardware buffer (`buffer_size`) so that the buffer cannot
+    overrun while a chunk is being transferred. Sizes are rounded to a
+    multiple of `granularity`. The queue occupancy is averaged over about
+    `occupancy_memory` chunks. The size only changes when the new value
+    differs by more than `hysteresis` (relative), decisions are logged and
+    kept in `decisions`.
+    '''
+
+    def __init__(
+            self,
+            sample_rate: float,
+            target_latency: float,
+            min_chunk: int = 1,
+            max_chunk: int = 1_000_000,
+            buffer_size: Optional[int] = None,
+            initial: Optional[int] = None,
+            utilization: float = 0.8,
+            granularity: int = 1,
+            hysteresis: float = 0.1,
+            occupancy_memory: float = 20,
+            history: int = 1000
+        ) -> None:
+
+        if buffer_size is not None:
+            max_chunk = min(max_chunk, buffer_size // 2)
+        if not 1 <= min_chunk <= max_chunk:
+            raise ValueError(f'Invalid chunk size range [{min_chunk}, {max_chunk}]')
+
+        self.sample_rate = sample_rate
+        self.target_latency = target_latency
+        self.min_chunk = min_chunk
+        self.max_chunk = max_chunk
+        self.utilization = utilization
+        self.granularity = granularity
+        self.hysteresis = hysteresis
+        self.occupancy_alpha = 1 / occupancy_memory
+        self.occupancy = 0.0
+
+        if initial is None:
+            # half of the latency budget to fill a chunk
+            initial = target_latency * sample_rate / 2
+        self.chunk_size = self._clip(initial)
+        self.decisions: Deque[ChunkDecision] = deque(maxlen=history)
+
+    def limit(self, max_chunk: int) -> None:
+        """Lower max_chunk, e.g. to the slot size of a shared memory connection"""
+
+        largest = min(self.max_chunk, max_chunk) // self.granularity * self.granularity
+        if largest < 1:
+            raise ValueError(f'No chunk size multiple of {self.granularity} is at most {max_chunk}')
+        self.max_chunk = largest
+        self.min_chunk = min(self.min_chunk, largest)
+        self.chunk_size = min(self.chunk_size, largest)
+
+    def _clip(self, size: float) -> int:
+        size = min(max(size, self.min_chunk), self.max_chunk)
+        size = max(round(size / self.granularity), 1) * self.granularity
+        return int(size)
+
+    def predicted_latency(self, chunk_size: int, per_chunk: float, per_sample: float, occupancy: float) -> float:
+        return chunk_size / self.sample_rate + (occupancy + 1) * (per_chunk + per_sample * chunk_size)
+
+    def update(self, per_chunk: float, per_sample: float, occupancy: int) -> int:
+        """Return the size of the next chunk"""
+
+        self.occupancy += self.occupancy_alpha * (occupancy - self.occupancy)
+        occupancy = self.occupancy
+        period = 1 / self.sample_rate
+
+        # smallest chunk the consumer can process in time, with some margin
+        budget = self.utilization * period - per_sample
+        smallest = per_chunk / budget if budget > 0 else math.inf
+
+        # largest chunk meeting the target latency
+        room = self.target_latency - (occupancy + 1) * per_chunk
+        largest = room / (period + (occupancy + 1) * per_sample) if room > 0 else 0
+
+        meets_target = smallest <= largest
+        if smallest == math.inf:
+            size, reason = self.max_chunk, 'consumer too slow for the sample rate at any chunk size'
+        elif not meets_target:
+            size, reason = math.ceil(smallest), 'target latency not reachable, keeping up with the stream instead'
+        else:
+            size, reason = largest, 'largest chunk meeting the target latency'
+        size = self._clip(size)
+
+        if abs(size - self.chunk_size) > self.hysteresis * self.chunk_size:
+            decision = ChunkDecision(
+                time = time.monotonic(),
+                chunk_size = size,
+                previous = self.chunk_size,
+                per_chunk = per_chunk,
+                per_sample = per_sample,
+                occupancy = occupancy,
+                predicted_latency = self.predicted_latency(size, per_chunk, per_sample, occupancy),
+                reason = reason
+            )
+            self.decisions.append(decision)
+            logger.log(
+                logging.INFO if meets_target else logging.WARNING,
+                f'Chunk size {self.chunk_size} -> {size} ({reason}): cost {1e6*per_chunk:.1f}us/chunk '
+                f'+ {1e9*per_sample:.1f}ns/sample, {occupancy:.2f} chunk(s) queued, '
+                f'predicted latency {1e3*decision.predicted_latency:.2f}ms'
+            )
+            self.chunk_size = size
+
+        return self.chunk_size
+
+class AdaptiveChunking:
+    '''
+    Chunk size tuning shared by the two ends of a queue: the consumer
+    (DataHandler) reports how long each chunk took to process, the producer
+    (DAQ_Reader) asks for the size of the next chunk. The cost model is
+    published through shared memory, so the consumer never waits on the
+    producer. Create it before starting the processes.
+    '''
+
+    def __init__(self, sample_rate: float, target_latency: float, memory: float = 100, **kwargs) -> None:
+        self.controller = ChunkSizeController(sample_rate, target_latency, **kwargs)
+        self.model = ChunkCostModel(memory)
+        self.shared = SeqlockArray((3,)) # per_chunk, per_sample, count
+        self._coefficients = np.zeros(3)
+
+    @property
+    def chunk_size(self) -> int:
+        return self.controller.chunk_size
+
+    def report(self, num_samples: int, duration: float) -> None:
+        """Consumer side: processing time of one chunk"""
+
+        self.model.add(num_samples, duration)
+        self._coefficients[:2] = self.model.coefficients
+        self._coefficients[2] = self.model.count
+        self.shared.write(self._coefficients)
+
+    def next_chunk_size(self, occupancy: int = 0) -> int:
+        """Producer side: size of the next chunk, given the number of chunks waiting in the queue"""
+
+        (per_chunk, per_sample, count), _ = self.shared.read(self._coefficients)
+        if count == 0:
+            return self.controller.chunk_size
+        return self.controller.update(per_chunk, per_sample, occupancy)
+
+    def close(self) -> None:
+        self.shared.close()
+
+def queue_occupancy(q) -> int:
+    try:
+        return q.qsize()
+    except NotImplementedError: # macOS
+        return 0
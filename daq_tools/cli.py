@@ -0,0 +1,334 @@
+'''
+daq-tools command line: probe, benchmark and monitor boards.
+
+    daq-tools list [TYPE ...] [--refresh]
+    daq-tools bench BOARD [--ops digital_read analog_read ...] [-n 1000] [--batch 16]
+    daq-tools monitor BOARD [--analog 0 1] [--digital 2] [--rate 100]
+
+BOARD is TYPE[:ID], e.g. simulated, labjack:320012345, ni:0, arduino:/dev/ttyACM0.
+Without ID the only board of that type found by discovery is used.
+Only the backend of the board type in use is imported.
+'''
+
+from .core import SoftwareTimingDAQ, BoardInfo, BoardType, IOMethod, IOOperation, IO_METHOD_NAMES
+from . import DAQ_CONSTRUCTORS
+from dataclasses import asdict
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+import argparse
+import json
+import os
+import sys
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+CACHE_FILE = os.path.join(
+    os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
+    'daq_tools', 'boards.json'
+)
+
+BOARD_TYPES = {
+    'simulated': BoardType.SIMULATED,
+    'sim': BoardType.SIMULATED,
+    'arduino': BoardType.ARDUINO,
+    'labjack': BoardType.LABJACK,
+    'u3': BoardType.LABJACK,
+    'ni': BoardType.NATIONAL_INSTRUMENTS,
+    'national_instruments': BoardType.NATIONAL_INSTRUMENTS,
+}
+
+BENCH_METHODS = {name: method for method, name in IO_METHOD_NAMES.items() if method in (
+    IOMethod.DIGITAL_READ, IOMethod.DIGITAL_WRITE, IOMethod.ANALOG_READ, IOMethod.ANALOG_WRITE, IOMethod.PWM_WRITE
+)}
+
+class CommandError(Exception):
+    pass
+
+def parse_board(spec: str) -> Tuple[BoardType, Optional[Union[int, str]]]:
+    board_type, _, board_id = spec.partition(':')
+    try:
+        board_type = BOARD_TYPES[board_type.lower()]
+    except KeyError:
+        raise CommandError(f'unknown board type {board_type!r}, use one of {", ".join(BOARD_TYPES)}')
+    if not board_id:
+        return board_type, None
+    return board_type, int(board_id) if board_id.isdigit() else board_id
+
+def backend(board_type: BoardType):
+    try:
+        return DAQ_CONSTRUCTORS[board_type]
+    except KeyError:
+        error = DAQ_CONSTRUCTORS.errors().get(board_type)
+        raise CommandError(f'{board_type} backend not available: {error}')
+
+# discovery -----------------------------------------------------------------------
+
+def _load_cache(path: str) -> Dict[str, dict]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_cache(path: str, cache: Dict[str, dict]) -> None:
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(cache, f, indent = 4)
+        os.replace(tmp, path)
+    except OSError as e:
+        logger.warning(f'Could not write board cache {path}: {e}')
+
+def discover(
+        board_type: BoardType,
+        max_age: float = 600.0,
+        refresh: bool = False,
+        cache_file: str = CACHE_FILE
+    ) -> Tuple[List[BoardInfo], Optional[float]]:
+    '''
+    Boards of one type, from the cache if it is younger than max_age seconds
+    (list_boards opens every board, which is slow). Returns the boards and the
+    age of the cached result, None when discovery just ran.
+    '''
+
+    cache = _load_cache(cache_file)
+    entry = cache.get(board_type.name)
+    if entry is not None and not refresh and time.time() - entry['time'] < max_age:
+        boards = [BoardInfo(**{**board, 'board_type': BoardType(board['board_type'])}) for board in entry['boards']]
+        return boards, time.time() - entry['time']
+
+    boards = backend(board_type).list_boards()
+    cache[board_type.name] = {'time': time.time(), 'boards': [asdict(board) for board in boards]}
+    _save_cache(cache_file, cache)
+    return boards, None
+
+def open_board(spec: str, simulated_latency: float = 0.0, max_age: float = 600.0) -> SoftwareTimingDAQ:
+
+    board_type, board_id = parse_board(spec)
+    cls = backend(board_type)
+    if board_type == BoardType.SIMULATED:
+        return cls(board_id or 0, latency = simulated_latency)
+
+    if board_id is None:
+        boards, _ = discover(board_type, max_age)
+        if len(boards) != 1:
+            found = ', '.join(str(board.id) for board in boards) or 'none'
+            raise CommandError(f'{len(boards)} {board_type} board(s) found ({found}), give one as {spec}:ID')
+        board_id = boards[0].id
+    return cls(board_id)
+
+# commands ------------------------------------------------------------------------
+
+def command_list(args) -> None:
+
+    board_types = [parse_board(name)[0] for name in args.types] or list(dict.fromkeys(BOARD_TYPES.values()))
+    for board_type in board_types:
+        try:
+            boards, age = discover(board_type, args.max_age, args.refresh)
+        except CommandError as e:
+            print(f'{board_type}: {e}')
+            continue
+        except Exception as e:
+            print(f'{board_type}: discovery failed: {e}')
+            continue
+
+        source = 'just now' if age is None else f'cached {age:.0f}s ago'
+        print(f'{board_type}: {len(boards)} board(s) ({source})')
+        for board in boards:
+            print(
+                f'  {board.id}  {board.name}\n'
+                f'    AI {board.analog_input}  AO {board.analog_output}  '
+                f'DI {board.digital_input}  DO {board.digital_output}  PWM {board.pwm_output}'
+            )
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    return sorted_values[min(int(q * len(sorted_values)), len(sorted_values) - 1)]
+
+def _default_channel(daq: SoftwareTimingDAQ, method: IOMethod) -> Optional[int]:
+    channels = {
+        IOMethod.DIGITAL_READ: daq.list_digital_input_channels,
+        IOMethod.DIGITAL_WRITE: daq.list_digital_output_channels,
+        IOMethod.ANALOG_READ: daq.list_analog_input_channels,
+        IOMethod.ANALOG_WRITE: daq.list_analog_output_channels,
+        IOMethod.PWM_WRITE: daq.list_pwm_output_channels,
+    }[method]()
+    return channels[0] if channels else None
+
+def _write_value(method: IOMethod, i: int) -> float:
+    # alternate between two values so that backends can't skip the write
+    if method == IOMethod.DIGITAL_WRITE:
+        return float(i % 2)
+    if method == IOMethod.ANALOG_WRITE:
+        return 1.0 if i % 2 else 0.0
+    return 0.25 if i % 2 else 0.75
+
+def command_bench(args) -> None:
+
+    with open_board(args.board, args.simulated_latency, args.max_age) as daq:
+        print(f'{daq.__class__.__name__} {daq.board_id}: {args.iterations} iterations per operation')
+        print(f'{"operation":<15} {"channel":>7} {"mean":>9} {"p50":>9} {"p99":>9} {"max":>9} {"ops/s":>9}')
+
+        for name in args.ops:
+            method = BENCH_METHODS[name]
+            channel = args.channel if args.channel is not None else _default_channel(daq, method)
+            if channel is None:
+                print(f'{name:<15} {"-":>7} no channel')
+                continue
+
+            func = getattr(daq, name)
+            durations = []
+            try:
+                start = time.perf_counter()
+                for i in range(args.iterations):
+                    t = time.perf_counter()
+                    if method.is_write:
+                        func(channel, _write_value(method, i))
+                    else:
+                        func(channel)
+                    durations.append(time.perf_counter() - t)
+                elapsed = time.perf_counter() - start
+            except Exception as e:
+                print(f'{name:<15} {channel:>7} failed: {e}')
+                continue
+
+            durations.sort()
+            us = lambda x: f'{1e6*x:.1f}us'
+            print(
+                f'{name:<15} {channel:>7} {us(sum(durations)/len(durations)):>9} '
+                f'{us(_percentile(durations, 0.5)):>9} {us(_percentile(durations, 0.99)):>9} '
+                f'{us(durations[-1]):>9} {len(durations)/elapsed:>9.0f}'
+            )
+
+            if args.batch > 1:
+                batch = [
+                    IOOperation(method, channel, _write_value(method, i) if method.is_write else 0.0)
+                    for i in range(args.batch)
+                ]
+                num_batches = max(args.iterations // args.batch, 1)
+                start = time.perf_counter()
+                for _ in range(num_batches):
+                    daq.execute(batch)
+                elapsed = time.perf_counter() - start
+                print(
+                    f'{"  batch of " + str(args.batch):<15} {channel:>7} '
+                    f'{us(elapsed/num_batches):>9} per batch, {num_batches*args.batch/elapsed:>9.0f} ops/s'
+                )
+
+        print(f'lock wait {daq.access_stats.lock_wait}')
+
+def _monitor_inputs(daq: SoftwareTimingDAQ, analog: Optional[Sequence[int]], digital: Optional[Sequence[int]]) -> List[IOOperation]:
+    if analog is None and digital is None:
+        analog = daq.list_analog_input_channels()
+        digital = daq.list_digital_input_channels()
+    return [IOOperation(IOMethod.ANALOG_READ, channel) for channel in analog or []] + \
+        [IOOperation(IOMethod.DIGITAL_READ, channel) for channel in digital or []]
+
+def command_monitor(args) -> None:
+
+    from .control import ControlLoop
+
+    with open_board(args.board, args.simulated_latency, args.max_age) as daq:
+
+        inputs = _monitor_inputs(daq, args.analog, args.digital)
+        if not inputs:
+            raise CommandError('no input channel to monitor')
+
+        title = f'{daq.__class__.__name__} {daq.board_id}'
+        interactive = sys.stdout.isatty()
+        lines_drawn = 0
+        last_draw = 0.0
+        window_start = time.perf_counter()
+        window_count = 0
+        achieved = 0.0
+
+        def step(t: float, values: List[float]) -> None:
+            nonlocal lines_drawn, last_draw, window_start, window_count, achieved
+
+            now = time.perf_counter()
+            window_count += 1
+            # first estimate after 0.2s, then every second
+            if now - window_start >= 1.0 or (not achieved and now - window_start >= 0.2):
+                achieved = window_count / (now - window_start)
+            if now - window_start >= 1.0:
+                window_start = now
+                window_count = 0
+            if now - last_draw < 1 / args.refresh:
+                return
+            last_draw = now
+
+            lines = [f'{title}  target {args.rate:g} Hz  achieved {achieved:.1f} Hz  (ctrl-c to stop)']
+            for operation, value in zip(inputs, values):
+                if operation.method == IOMethod.ANALOG_READ:
+                    lines.append(f'  AI{operation.channel:<3} {value:>10.4f}')
+                else:
+                    lines.append(f'  DI{operation.channel:<3} {"HIGH" if value else "low":>10}')
+
+            if interactive and lines_drawn:
+                sys.stdout.write(f'\x1b[{lines_drawn}F')
+            sys.stdout.write('\n'.join(f'{line}\x1b[K' if interactive else line for line in lines) + '\n')
+            sys.stdout.flush()
+            lines_drawn = len(lines)
+
+        loop = ControlLoop(daq, args.rate, step, inputs = inputs)
+        try:
+            stats = loop.run(duration = args.duration)
+        except KeyboardInterrupt:
+            stats = loop.stats
+        print(f'{stats.iterations} samples, {stats.overruns} overrun(s), {stats.skipped} skipped, io {stats.io}')
+
+# entry point ---------------------------------------------------------------------
+
+def build_parser() -> argparse.ArgumentParser:
+
+    parser = argparse.ArgumentParser(prog = 'daq-tools', description = 'Probe, benchmark and monitor DAQ boards')
+    parser.add_argument('-v', '--verbose', action = 'store_true', help = 'debug logging')
+    commands = parser.add_subparsers(dest = 'command', required = True)
+
+    board_options = argparse.ArgumentParser(add_help = False)
+    board_options.add_argument('board', help = 'TYPE[:ID], e.g. simulated, labjack:320012345, ni:0, arduino:/dev/ttyACM0')
+    board_options.add_argument('--simulated-latency', type = float, default = 0.0, help = 'per transaction latency of a simulated board (s)')
+    board_options.add_argument('--max-age', type = float, default = 600.0, help = 'reuse cached discovery younger than this (s)')
+
+    command = commands.add_parser('list', help = 'list connected boards')
+    command.add_argument('types', nargs = '*', help = f'board types ({", ".join(BOARD_TYPES)}), all by default')
+    command.add_argument('--refresh', action = 'store_true', help = 'ignore the discovery cache')
+    command.add_argument('--max-age', type = float, default = 600.0, help = 'reuse cached discovery younger than this (s)')
+    command.set_defaults(func = command_list)
+
+    command = commands.add_parser('bench', parents = [board_options], help = 'latency and throughput of single operations')
+    command.add_argument('--ops', nargs = '+', choices = list(BENCH_METHODS), default = ['digital_read', 'digital_write', 'analog_read', 'analog_write'])
+    command.add_argument('--channel', type = int, help = 'channel for every operation (default: first channel of the right kind)')
+    command.add_argument('-n', '--iterations', type = int, default = 1000)
+    command.add_argument('--batch', type = int, default = 16, help = 'also time execute() batches of this size (1 to skip)')
+    command.set_defaults(func = command_bench)
+
+    command = commands.add_parser('monitor', parents = [board_options], help = 'live view of input channels')
+    command.add_argument('--analog', type = int, nargs = '*', help = 'analog inputs (default: all inputs when neither --analog nor --digital)')
+    command.add_argument('--digital', type = int, nargs = '*', help = 'digital inputs')
+    command.add_argument('--rate', type = float, default = 100.0, help = 'sampling rate (Hz)')
+    command.add_argument('--refresh', type = float, default = 10.0, help = 'display refresh rate (Hz)')
+    command.add_argument('--duration', type = float, help = 'stop after this many seconds')
+    command.set_defaults(func = command_monitor)
+
+    return parser
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level = logging.DEBUG if args.verbose else logging.WARNING)
+    if not args.verbose:
+        # missing backends are reported by the commands themselves
+        logging.getLogger('daq_tools.backends').setLevel(logging.ERROR)
+    try:
+        args.func(args)
+    except CommandError as e:
+        print(f'daq-tools: {e}', file = sys.stderr)
+        return 1
+    except (KeyboardInterrupt, BrokenPipeError):
+        pass
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,151 @@
+from typing import NamedTuple, Union
+import struct
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Chunks read from hardware timed devices can carry a header: index of the
+# first sample since the start of the acquisition (counted by DAQ_Reader) and
+# host time (time.monotonic) when the chunk was read, i.e. a little after its
+# last sample was acquired. A ClockEstimator fits host time against sample
+# index, so data from different devices, or camera frames, can be put on the
+# same (host) time axis.
+
+HEADER = struct.Struct('<qId') # first_sample, num_samples, host_time
+
+class ChunkHeader(NamedTuple):
+    first_sample: int
+    num_samples: int
+    host_time: float
+
+    @property
+    def last_sample(self) -> int:
+        return self.first_sample + self.num_samples - 1
+
+    def to_bytes(self) -> bytes:
+        return HEADER.pack(*self)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "ChunkHeader":
+        return cls(*HEADER.unpack(data))
+
+class TimestampedChunk(NamedTuple):
+    header: ChunkHeader
+    data: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+def _fit_line(x: np.ndarray, y: np.ndarray):
+    # least squares around the means, well conditioned even far from index 0
+    x_mean = x.mean()
+    y_mean = y.mean()
+    dx = x - x_mean
+    slope = np.dot(dx, y - y_mean) / np.dot(dx, dx)
+    return slope, y_mean - slope * x_mean
+
+class ClockEstimator:
+    '''
+    Online linear fit host_time = offset + period * sample_index from chunk
+    headers, over the last `window` chunks.
+
+    Host timestamps are late by a variable transfer / scheduling delay, so
+    residuals are one-sided: points further than `rejection` times the
+    median absolute deviation above the fit are dropped and the fit is
+    redone without them, then moved down onto the earliest timestamps (the
+    ones with the smallest delay). The fitted period gives the actual sample rate
+    of the device and its drift with respect to the nominal rate.
+
+    Fitting costs O(window) per chunk, conversions are O(1) per sample.
+    '''
+
+    def __init__(self, sample_rate: float, window: int = 256, rejection: float = 3.0) -> None:
+        self.nominal_rate = sample_rate
+        self.window = window
+        self.rejection = rejection
+        self.reset()
+
+    def reset(self) -> None:
+        # samples and times relative to the first point to keep precision
+        self._x = np.zeros(self.window)
+        self._y = np.zeros(self.window)
+        self._count = 0
+        self._x0 = 0
+        self._t0 = 0.0
+        self.period = 1 / self.nominal_rate
+        self.offset = 0.0
+        self.jitter = 0.0
+        self.num_rejected = 0
+
+    def add(self, header: ChunkHeader) -> None:
+
+        if header.num_samples == 0:
+            return
+
+        if self._count == 0:
+            self._x0 = header.last_sample
+            self._t0 = header.host_time
+
+        i = self._count % self.window
+        self._x[i] = header.last_sample - self._x0
+        self._y[i] = header.host_time - self._t0
+        self._count += 1
+        self._fit()
+
+    def _fit(self) -> None:
+
+        n = min(self._count, self.window)
+        x = self._x[:n]
+        y = self._y[:n]
+
+        if n < 3:
+            # not enough points to fit, nominal rate through the earliest point
+            self.period = 1 / self.nominal_rate
+            self.offset = np.min(y - self.period * x)
+            return
+
+        if np.ptp(x) == 0:
+            return
+        period, offset = _fit_line(x, y)
+        residuals = y - (offset + period * x)
+        median = np.median(residuals)
+        mad = np.median(np.abs(residuals - median))
+        keep = residuals <= median + self.rejection * max(mad, 1e-9)
+        rejected = n - np.count_nonzero(keep)
+        if rejected and np.count_nonzero(keep) >= 3:
+            period, offset = _fit_line(x[keep], y[keep])
+            residuals = y[keep] - (offset + period * x[keep])
+        self.num_rejected = rejected
+
+        self.period = period
+        self.offset = offset + residuals.min()
+        self.jitter = float(np.std(residuals))
+
+    @property
+    def sample_rate(self) -> float:
+        """Sample rate of the device measured with the host clock"""
+        return 1 / self.period
+
+    @property
+    def drift_ppm(self) -> float:
+        """Device clock drift with respect to the host clock, in parts per million"""
+        return (self.sample_rate / self.nominal_rate - 1) * 1e6
+
+    def host_time(self, sample_index: Union[int, np.ndarray]) -> Union[float, np.ndarray]:
+        """time.monotonic() at which sample(s) were acquired"""
+        return self._t0 + self.offset + self.period * (np.asarray(sample_index) - self._x0)
+
+    def sample_index(self, host_time: Union[float, np.ndarray]) -> Union[float, np.ndarray]:
+        """Fractional sample index acquired at time(s) host_time, e.g. to align another stream"""
+        return self._x0 + (np.asarray(host_time) - self._t0 - self.offset) / self.period
+
+    def chunk_times(self, header: ChunkHeader) -> np.ndarray:
+        """Host time of every sample of a chunk"""
+        return self.host_time(header.first_sample + np.arange(header.num_samples))
+
+    def __str__(self) -> str:
+        return (
+            f'{self.sample_rate:.3f} Hz ({self.drift_ppm:+.1f} ppm), '
+            f'jitter {1e6*self.jitter:.1f}us, {self.num_rejected} outlier(s) in window'
+        )
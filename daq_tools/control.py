@@ -0,0 +1,141 @@
+from .core import SoftwareTimingDAQ, IOOperation
+from .metrics import LatencyStats, Histogram
+from .timing import sleep_until
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Sequence
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# step(t, inputs) -> writes
+#   t: time of the iteration's deadline since the start of the loop, in seconds
+#   inputs: values read for the loop's inputs, in order
+#   writes: write operations (IOOperation with a *_WRITE method), or None
+Step = Callable[[float, List[float]], Optional[Sequence[IOOperation]]]
+
+@dataclass
+class LoopStats:
+    iterations: int = 0
+    elapsed: float = 0.0
+    overruns: int = 0 # iterations that ended after the next deadline
+    skipped: int = 0 # deadlines dropped to get back on schedule
+    lateness: LatencyStats = field(default_factory = LatencyStats) # wake up time - deadline
+    jitter: Histogram = field(default_factory = Histogram.log)
+    io: LatencyStats = field(default_factory = LatencyStats) # device transaction(s)
+    compute: LatencyStats = field(default_factory = LatencyStats) # step function
+
+    @property
+    def rate(self) -> float:
+        return self.iterations / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f'{self.iterations} iterations at {self.rate:.1f} Hz, '
+            f'{self.overruns} overrun(s), {self.skipped} skipped deadline(s)\n'
+            f'lateness {self.lateness}\nio {self.io}\ncompute {self.compute}\n'
+            f'lateness histogram:\n{self.jitter}'
+        )
+
+class ControlLoop:
+    '''
+    Run step() at a fixed rate on absolute deadlines (start + k * period),
+    so timing errors do not accumulate.
+
+    Each iteration is a single device transaction: the writes returned by
+    the previous step go out at the deadline, followed by the reads of the
+    inputs, and step() computes the next writes. Outputs are thus applied
+    exactly one period after the inputs they were computed from. With
+    `write_immediately`, writes are sent as soon as step() returns instead
+    (two transactions per iteration, lower but variable delay).
+
+    When an iteration ends after the next deadline (overrun), the loop
+    either starts the next iteration right away to catch up, or, with
+    `skip_missed`, drops the missed deadlines and waits for the next one.
+    '''
+
+    def __init__(
+            self,
+            daq: SoftwareTimingDAQ,
+            rate: float,
+            step: Step,
+            inputs: Sequence[IOOperation] = (),
+            write_immediately: bool = False,
+            skip_missed: bool = True
+        ) -> None:
+
+        for operation in inputs:
+            if operation.method.is_write:
+                raise ValueError(f'Loop inputs should be reads, got {operation.method}')
+
+        self.daq = daq
+        self.period = 1 / rate
+        self.step = step
+        self.inputs = list(inputs)
+        self.write_immediately = write_immediately
+        self.skip_missed = skip_missed
+        self.stats = LoopStats()
+        self._stop_event = threading.Event()
+
+    def stop(self) -> None:
+        """Stop the loop from another thread"""
+        self._stop_event.set()
+
+    def _transaction(self, writes: Sequence[IOOperation], reads: Sequence[IOOperation]) -> List[float]:
+        if not writes and not reads:
+            return []
+        start = time.perf_counter()
+        results = self.daq.execute(list(writes) + list(reads))
+        self.stats.io.add(time.perf_counter() - start)
+        return results[len(writes):]
+
+    def run(self, duration: Optional[float] = None, iterations: Optional[int] = None) -> LoopStats:
+        """Run until duration (seconds) or number of iterations is reached, or stop() is called"""
+
+        self._stop_event.clear()
+        self.stats = LoopStats()
+        stats = self.stats
+        writes: Sequence[IOOperation] = []
+
+        start = time.perf_counter()
+        k = 0
+        while not self._stop_event.is_set():
+            deadline = start + k * self.period
+            if duration is not None and k * self.period >= duration:
+                break
+            if iterations is not None and stats.iterations >= iterations:
+                break
+
+            late = sleep_until(deadline)
+            stats.lateness.add(late)
+            stats.jitter.add(late)
+
+            inputs = self._transaction([] if self.write_immediately else writes, self.inputs)
+
+            compute_start = time.perf_counter()
+            writes = self.step(k * self.period, inputs) or []
+            stats.compute.add(time.perf_counter() - compute_start)
+
+            if self.write_immediately:
+                self._transaction(writes, [])
+
+            stats.iterations += 1
+            k += 1
+
+            # deadlines already past, whether they are skipped or caught up with
+            behind = int((time.perf_counter() - start) / self.period) + 1 - k
+            if behind > 0:
+                stats.overruns += 1
+                if self.skip_missed:
+                    # next deadline still to come, on the same grid
+                    stats.skipped += behind
+                    k += behind
+
+        # last outputs
+        if not self.write_immediately and writes:
+            self._transaction(writes, [])
+
+        stats.elapsed = time.perf_counter() - start
+        logger.info(f'Control loop at {1/self.period:.1f} Hz: {stats}')
+        return stats
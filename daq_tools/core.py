@@ -1,10 +1,14 @@
 from abc import ABC, abstractmethod
-from typing import List, Union
+from typing import Dict, List, Union, NamedTuple, Optional, Sequence, Callable, Tuple, TYPE_CHECKING
+from contextlib import contextmanager
+import functools
+import inspect
 import threading
 import time
 import logging
 from enum import IntEnum
 from dataclasses import dataclass, field
+from .metrics import AccessStats
 
 logger = logging.getLogger(__name__)
 
@@ -12,6 +16,7 @@ class BoardType(IntEnum):
     ARDUINO = 0
     LABJACK = 1
     NATIONAL_INSTRUMENTS = 2
+    SIMULATED = 3
     NONE = -1
 
     def __str__(self) -> str:
@@ -29,10 +34,131 @@ class BoardInfo:
     pwm_output: List[int] = field(default_factory = list)
     pwm_input: List[int] = field(default_factory = list)
 
+class IOMethod(IntEnum):
+    DIGITAL_READ = 0
+    DIGITAL_WRITE = 1
+    ANALOG_READ = 2
+    ANALOG_WRITE = 3
+    PWM_READ = 4
+    PWM_WRITE = 5
+
+    def __str__(self) -> str:
+        return self.name
+
+    @property
+    def is_write(self) -> bool:
+        return self in (IOMethod.DIGITAL_WRITE, IOMethod.ANALOG_WRITE, IOMethod.PWM_WRITE)
+
+IO_METHOD_NAMES = {
+    IOMethod.DIGITAL_READ: 'digital_read',
+    IOMethod.DIGITAL_WRITE: 'digital_write',
+    IOMethod.ANALOG_READ: 'analog_read',
+    IOMethod.ANALOG_WRITE: 'analog_write',
+    IOMethod.PWM_READ: 'pwm_read',
+    IOMethod.PWM_WRITE: 'pwm_write',
+}
+
+OUTPUT_METHODS = {
+    'digital_write': IOMethod.DIGITAL_WRITE,
+    'analog_write': IOMethod.ANALOG_WRITE,
+    'pwm_write': IOMethod.PWM_WRITE,
+}
+
+class Edge(IntEnum):
+    RISING = 0
+    FALLING = 1
+    BOTH = 2
+
+    def __str__(self) -> str:
+        return self.name
+
+class IOOperation(NamedTuple):
+    method: IOMethod
+    channel: int
+    value: float = 0.0
+
+@dataclass
+class OutputState:
+    """Last value written to each output channel. Channels never written are absent."""
+    digital: Dict[int, bool] = field(default_factory = dict)
+    analog: Dict[int, float] = field(default_factory = dict)
+    pwm: Dict[int, float] = field(default_factory = dict)
+
 class DAQReadError(Exception):
     """Exception raised for errors in reading from the DAQ device."""
     pass
 
+def serialized(func: Callable) -> Callable:
+    """
+    Run the decorated SoftwareTimingDAQ method with exclusive access to the device.
+    When an `execute` batch fails, the outputs it writes are marked unknown, part
+    of the batch may have been applied.
+    """
+
+    if func.__name__ != 'execute':
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            with self.device_access():
+                return func(self, *args, **kwargs)
+        return wrapper
+
+    @functools.wraps(func)
+    def execute_wrapper(self, *args, **kwargs):
+        with self.device_access():
+            try:
+                return func(self, *args, **kwargs)
+            except Exception:
+                self._forget_outputs(args[0] if args else kwargs['operations'])
+                raise
+
+    return execute_wrapper
+
+def coalesced(func: Callable) -> Callable:
+    """
+    Run the decorated write method (self, channel, value, ...) with exclusive access 
+    to the device. While a write to a channel waits for the device, later writes to 
+    the same channel replace its value and return immediately (last write wins).
+    """
+
+    params = list(inspect.signature(func).parameters.values())
+    channel_name = params[1].name
+    channel_default = params[1].default
+    value_name = params[2].name
+    value_default = params[2].default
+    output_method = OUTPUT_METHODS.get(func.__name__)
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        if args:
+            channel, args = args[0], args[1:]
+        else:
+            channel = kwargs.pop(channel_name, channel_default)
+        key = (func.__name__, channel)
+
+        with self._pending_lock:
+            self.access_stats.writes += 1
+            waiting = key in self._pending_writes
+            self._pending_writes[key] = (args, kwargs)
+        if waiting:
+            self.access_stats.writes_coalesced += 1
+            return
+
+        with self.device_access():
+            with self._pending_lock:
+                args, kwargs = self._pending_writes.pop(key)
+            try:
+                res = func(self, channel, *args, **kwargs)
+            except Exception:
+                if output_method is not None:
+                    self._forget_outputs([IOOperation(output_method, channel)])
+                raise
+            if output_method is not None:
+                value = args[0] if args else kwargs.get(value_name, value_default)
+                self._record_output(output_method, channel, value)
+            return res
+
+    return wrapper
+
 class SoftwareTimingDAQ(ABC):
     """
     This interface supports basic digital and analog I/O operations, including reading and writing
@@ -53,10 +179,58 @@ class SoftwareTimingDAQ(ABC):
     However, because thread scheduling and execution timing depend on the OS and Python runtime,
     these methods should **not** be used for timing-sensitive or real-time applications
     where precise pulse timing and latency guarantees are required.
+
+    Note on thread safety:
+    Backends decorate their methods with `serialized` (reads, configuration) and
+    `coalesced` (writes) so that only one thread talks to the device at a time.
+    Writes to a channel that is already waiting for the device are merged, only the
+    latest value is written. Contention is reported in `access_stats`.
+
+    Note on output state:
+    The last value written to every output is remembered (see `get_output_state`).
+    `reset_state` uses it to only write the outputs that are not already LOW.
+    On boards where PWM is a mode of a digital output pin (`PWM_ON_DIGITAL_PINS`),
+    a pin is reset the way it was last written, as a digital output if unknown,
+    so that a reset does not switch every PWM capable pin to PWM mode.
+
+    Note on digital input events:
+    `on_edge` and `wait_for_edge` share one watcher per board. By default it polls
+    all watched channels in a single `execute` batch, backends with a cheaper way
+    to be notified of changes override `_create_edge_watcher`.
     """
 
+    PWM_ON_DIGITAL_PINS = False
+    ANALOG_OUTPUT_RANGE: Optional[Tuple[float, float]] = None # volts, None if not checked
+
     def __init__(self, board_id: Union[str, int]) -> None:
         self.board_id = board_id
+        self.access_stats = AccessStats()
+        self._lock = threading.Lock()
+        self._lock_owner: Optional[int] = None
+        self._pending_lock = threading.Lock()
+        self._pending_writes = {}
+        self._output_state: Dict[IOMethod, Dict[int, float]] = {
+            method: {} for method in OUTPUT_METHODS.values()
+        }
+        self._edge_watcher = None
+
+    @contextmanager
+    def device_access(self):
+        """Hold the device lock, re-entrant for the thread that owns it."""
+
+        thread = threading.get_ident()
+        if self._lock_owner == thread:
+            yield
+            return
+
+        start = time.perf_counter()
+        with self._lock:
+            self.access_stats.lock_wait.add(time.perf_counter() - start)
+            self._lock_owner = thread
+            try:
+                yield
+            finally:
+                self._lock_owner = None
 
     @abstractmethod
     def digital_read(self, channel: int) -> float:
@@ -132,6 +306,157 @@ class SoftwareTimingDAQ(ABC):
         """Return a list of available DAQ boards connected to the system."""
         pass
 
+    def _record_output(self, method: IOMethod, channel: int, value: float) -> None:
+        if method == IOMethod.DIGITAL_WRITE:
+            value = bool(value)
+        self._output_state[method][channel] = value
+        if self.PWM_ON_DIGITAL_PINS and method in (IOMethod.DIGITAL_WRITE, IOMethod.PWM_WRITE):
+            # the pin left the other mode
+            other = IOMethod.PWM_WRITE if method == IOMethod.DIGITAL_WRITE else IOMethod.DIGITAL_WRITE
+            self._output_state[other].pop(channel, None)
+
+    def _record_outputs(self, operations: Sequence[IOOperation]) -> None:
+        """Update the output state after a batch, for backends overriding `execute`"""
+        for method, channel, value in operations:
+            if method.is_write:
+                self._record_output(method, channel, value)
+
+    def _forget_outputs(self, operations: Sequence[IOOperation]) -> None:
+        """Mark the outputs written by a failed call as unknown, so that the next reset writes them"""
+        for method, channel, _ in operations:
+            if not method.is_write:
+                continue
+            self._output_state[method].pop(channel, None)
+            if self.PWM_ON_DIGITAL_PINS and method in (IOMethod.DIGITAL_WRITE, IOMethod.PWM_WRITE):
+                # the mode of the pin is unknown too
+                other = IOMethod.PWM_WRITE if method == IOMethod.DIGITAL_WRITE else IOMethod.DIGITAL_WRITE
+                self._output_state[other].pop(channel, None)
+
+    def get_output_state(self) -> OutputState:
+        """Last values written to the outputs, without talking to the device."""
+        return OutputState(
+            digital = dict(self._output_state[IOMethod.DIGITAL_WRITE]),
+            analog = dict(self._output_state[IOMethod.ANALOG_WRITE]),
+            pwm = dict(self._output_state[IOMethod.PWM_WRITE])
+        )
+
+    def forget_output_state(self) -> None:
+        """Mark all outputs as unknown, e.g. after the device was power cycled. The next reset writes everything."""
+        for state in self._output_state.values():
+            state.clear()
+
+    def _reset_operations(self) -> List[IOOperation]:
+        """Writes needed to set all outputs LOW, skipping outputs known to be LOW already."""
+        channels = {
+            IOMethod.DIGITAL_WRITE: self.list_digital_output_channels(),
+            IOMethod.ANALOG_WRITE: self.list_analog_output_channels(),
+            IOMethod.PWM_WRITE: self.list_pwm_output_channels(),
+        }
+        if self.PWM_ON_DIGITAL_PINS:
+            # pins last used as PWM are reset as PWM, all others (including PWM
+            # capable pins in an unknown state) as digital outputs
+            pwm = self._output_state[IOMethod.PWM_WRITE]
+            digital = channels[IOMethod.DIGITAL_WRITE]
+            channels[IOMethod.DIGITAL_WRITE] = [
+                c for c in digital + [c for c in channels[IOMethod.PWM_WRITE] if c not in digital]
+                if c not in pwm
+            ]
+            channels[IOMethod.PWM_WRITE] = [c for c in channels[IOMethod.PWM_WRITE] if c in pwm]
+        return [
+            IOOperation(method, channel, 0)
+            for method, chans in channels.items()
+            for channel in chans
+            if self._output_state[method].get(channel) != 0
+        ]
+
+    def reset_outputs(self) -> None:
+        """Set all outputs LOW in a single batch, only touching outputs that are not LOW already."""
+
+        operations = self._reset_operations()
+        if not operations:
+            return
+
+        logger.info(f"Resetting {len(operations)} output channel(s) to LOW")
+        try:
+            self.execute(operations)
+        except Exception as e:
+            logger.warning(f"Batched reset failed ({e}), resetting channels one at a time")
+            for operation in operations:
+                try:
+                    self.execute([operation])
+                except Exception as e:
+                    logger.warning(f"Failed to reset {operation.method} channel {operation.channel}: {e}")
+
+    def check_operation(self, operation: IOOperation) -> None:
+        """Raise ValueError for a value the board can't output, without talking to the device"""
+
+        method, _, value = operation
+        if method == IOMethod.PWM_WRITE and not 0 <= value <= 1:
+            raise ValueError('duty_cycle should be between 0 and 1')
+        if method == IOMethod.ANALOG_WRITE and self.ANALOG_OUTPUT_RANGE is not None:
+            low, high = self.ANALOG_OUTPUT_RANGE
+            if not low <= value <= high:
+                raise ValueError(f'{value} V outside of the analog output range [{low}, {high}] V')
+
+    def can_batch(self, operations: Sequence[IOOperation]) -> bool:
+        """Whether the operations can go in one `execute` call, backends with restrictions override it"""
+        return True
+
+    @serialized
+    def execute(self, operations: Sequence[IOOperation]) -> List[Optional[float]]:
+        """
+        Run a batch of operations and return one result per operation 
+        (None for writes). The default implementation runs them one by one,
+        backends that can group commands in a single device transaction
+        should override this.
+        """
+        results = []
+        for method, channel, value in operations:
+            func = getattr(self, IO_METHOD_NAMES[method])
+            if method == IOMethod.DIGITAL_WRITE:
+                func(channel, bool(value))
+                results.append(None)
+            elif method.is_write:
+                func(channel, value)
+                results.append(None)
+            else:
+                results.append(func(channel))
+        return results
+
+    def _create_edge_watcher(self):
+        from .edges import PollingEdgeWatcher
+        return PollingEdgeWatcher(self)
+
+    def _get_edge_watcher(self):
+        if self._edge_watcher is None:
+            self._edge_watcher = self._create_edge_watcher()
+        return self._edge_watcher
+
+    def on_edge(self, channel: int, callback: Callable, edge: Edge = Edge.RISING) -> int:
+        '''
+        Call callback(event: EdgeEvent) on every edge of a digital input, from the
+        watcher thread (keep it short). Returns a handle for `remove_edge_callback`.
+        '''
+        return self._get_edge_watcher().add(channel, edge, callback)
+
+    def remove_edge_callback(self, handle: int) -> None:
+        if self._edge_watcher is not None:
+            self._edge_watcher.remove(handle)
+
+    def wait_for_edge(self, channel: int, edge: Edge = Edge.RISING, timeout: Optional[float] = None):
+        '''Block until an edge of a digital input, return the EdgeEvent or None after timeout seconds'''
+        return self._get_edge_watcher().wait(channel, edge, timeout)
+
+    def get_edge_stats(self):
+        '''Edge detection latency and bus load (EdgeStats), None if no edge was ever watched'''
+        return None if self._edge_watcher is None else self._edge_watcher.stats
+
+    def stop_edge_watcher(self) -> None:
+        '''Stop watching inputs, backends call it when closing'''
+        if self._edge_watcher is not None:
+            self._edge_watcher.stop()
+            self._edge_watcher = None
+
     @classmethod
     def auto_connect(cls) -> "SoftwareTimingDAQ":
         boards = cls.list_boards()
@@ -211,18 +536,42 @@ class SoftwareTimingDAQ(ABC):
 
 # TODO Work in progress ---
 
-from multiprocessing import Queue, Event, Process
+from multiprocessing import Process
 import queue
 
+# numpy based helpers are imported where they are used, so that using a
+# board (e.g. the command line) does not load them
+if TYPE_CHECKING:
+    from .realtime import RealtimeConfig
+    from .chunking import AdaptiveChunking
+    from .clock import ChunkHeader, ClockEstimator
+    from .latest import LatestValues
+
 class HardwareTimingDAQ(ABC):
     
-    def get_chunk(self):
+    def get_chunk(self, num_samples: Optional[int] = None):
+        '''num_samples: size of the chunk, None for the default size of the device'''
         pass
     
     def put_chunk(self):
         pass
 
-class SignalGenerator(Process):
+class PipelineProcess(Process):
+    """ Pipeline stage with optional real-time settings, applied when the process starts """
+
+    realtime: Optional['RealtimeConfig'] = None
+
+    def set_realtime(self, config: Optional['RealtimeConfig']) -> None:
+        self.realtime = config
+
+    def enter_realtime(self):
+        self.realtime_session = self.realtime.enter(self.name) if self.realtime is not None else None
+
+    def exit_realtime(self):
+        if self.realtime_session is not None:
+            self.realtime_session.close()
+
+class SignalGenerator(PipelineProcess):
     """ Generates data to send to DAQ for digital / analog write and place on queue """
 
     def configure(self, stop_event, queue):
@@ -234,6 +583,7 @@ class SignalGenerator(Process):
         pass
         
     def run(self):
+        self.enter_realtime()
         self.initialize()
 
         while not self.stop_event.is_set():
@@ -241,43 +591,92 @@ class SignalGenerator(Process):
             self.queue.put(data)
 
         self.cleanup()
+        self.exit_realtime()
 
     def cleanup(self):
         pass
 
-class DAQ_Reader(Process):
+class DAQ_Reader(PipelineProcess):
     """ Pulls data from DAQ for digital / analog read and place on queue"""
 
-    def configure(self, stop_event, queue, daq):
+    def configure(
+            self,
+            stop_event,
+            queue,
+            daq,
+            chunking: Optional['AdaptiveChunking'] = None,
+            timestamps: bool = False,
+            latest: Optional['LatestValues'] = None
+        ):
         
         self.stop_event = stop_event
         self.queue = queue
         self.daq = daq
+        self.chunking = chunking
+        self.timestamps = timestamps
+        self.latest = latest
+        self.samples_read = 0
+
+    def next_chunk_size(self) -> Optional[int]:
+        if self.chunking is None:
+            return None
+        from .chunking import queue_occupancy
+        return self.chunking.next_chunk_size(queue_occupancy(self.queue))
+
+    def stamp(self, data):
+        '''With timestamps on, wrap a chunk that was just read with its first sample index and the host time'''
+        if not self.timestamps:
+            return data
+        from .clock import ChunkHeader, TimestampedChunk
+        header = ChunkHeader(self.samples_read, len(data), time.monotonic())
+        self.samples_read += len(data)
+        return TimestampedChunk(header, data)
+
+    def publish(self, data):
+        '''Put the last sample of a chunk that was just read in the latest values table, if any'''
+        if self.latest is not None:
+            self.latest.publish_chunk(data)
     
     @abstractmethod
     def initialize(self):
         pass
         
     def run(self):
+        self.enter_realtime()
         self.initialize()
 
         while not self.stop_event.is_set():
-            data = self.daq.get_chunk()
-            self.queue.put(data)
+            data = self.daq.get_chunk(self.next_chunk_size())
+            self.publish(data)
+            self.queue.put(self.stamp(data))
 
         self.cleanup()
+        self.exit_realtime()
 
     @abstractmethod
     def cleanup(self):
         pass
 
-class DataHandler(Process):
+class DataHandler(PipelineProcess):
     """ Do something with data read from DAQ (plot, store, ...) """
 
-    def configure(self, stop_event, queue):
+    def configure(
+            self,
+            stop_event,
+            queue,
+            chunking: Optional['AdaptiveChunking'] = None,
+            clock: Optional['ClockEstimator'] = None
+        ):
         
         self.stop_event = stop_event
         self.queue = queue
+        self.chunking = chunking
+        self.clock = clock
+        self.header: Optional['ChunkHeader'] = None
+
+    def sample_times(self):
+        '''Host time of every sample of the chunk being handled (needs timestamps and a clock)'''
+        return self.clock.chunk_times(self.header)
 
     @abstractmethod    
     def initialize(self):
@@ -288,22 +687,35 @@ class DataHandler(Process):
         pass
         
     def run(self):
+        from .clock import TimestampedChunk
+        self.enter_realtime()
         self.initialize()
 
         while not self.stop_event.is_set():
             try:
                 data = self.queue.get_nowait()
+                if isinstance(data, TimestampedChunk):
+                    self.header = data.header
+                    if self.clock is not None:
+                        self.clock.add(data.header)
+                    data = data.data
+                start = time.perf_counter()
                 self.handle_data(data)
+                if self.chunking is not None:
+                    self.chunking.report(len(data), time.perf_counter() - start)
             except queue.Empty:
                 pass
 
         self.cleanup()
+        if self.clock is not None:
+            logger.info(f'{self.name} device clock: {self.clock}')
+        self.exit_realtime()
 
     @abstractmethod
     def cleanup(self):
         pass
 
-class DAQ_Writer(Process):
+class DAQ_Writer(PipelineProcess):
     """ Puts data on the DAQ """
 
     def configure(self, stop_event, queue, daq):
@@ -316,6 +728,7 @@ class DAQ_Writer(Process):
         pass
         
     def run(self):
+        self.enter_realtime()
         self.initialize()
 
         while not self.stop_event.is_set():
@@ -326,14 +739,15 @@ class DAQ_Writer(Process):
                 pass
 
         self.cleanup()
+        self.exit_realtime()
 
     def cleanup(self):
         pass
 
-def empty_queue(queue):
+def empty_queue(q):
     try:
         while True:
-            queue.get_nowait()
+            q.get_nowait()
     except queue.Empty:
         pass
 
@@ -345,12 +759,27 @@ class System(ABC):
             daq_reader: DAQ_Reader,
             data_handler: DataHandler,
             signal_generator: SignalGenerator,
-            daq_writer: DAQ_Writer
+            daq_writer: DAQ_Writer,
+            realtime: Optional[Dict[str, 'RealtimeConfig']] = None,
+            chunking: Optional['AdaptiveChunking'] = None,
+            clock: Optional['ClockEstimator'] = None,
+            latest: Optional['LatestValues'] = None
         ):
-
-        self.stop_event = Event()
-        self.queue_write = Queue(maxsize=2)
-        self.queue_read = Queue(maxsize=2)
+        '''
+        Fixed pipeline: daq_reader -> data_handler and signal_generator -> daq_writer,
+        see pipeline.Pipeline for other graphs.
+
+        realtime: per stage real-time settings, keyed by 'daq_reader',
+        'data_handler', 'signal_generator' or 'daq_writer'
+        chunking: tune the size of the chunks read from the DAQ
+        to a target latency
+        clock: timestamp the chunks read from the DAQ and estimate
+        the device clock in the data handler
+        latest: shared memory table the DAQ reader updates with the
+        last sample of every chunk, for other processes to read
+        '''
+
+        from .pipeline import Pipeline
 
         self.daq = daq
         self.daq_reader = daq_reader
@@ -358,29 +787,24 @@ class System(ABC):
         self.signal_generator = signal_generator
         self.daq_writer = daq_writer
 
-        self.daq_reader.configure(self.stop_event, self.queue_read, self.daq)
-        self.data_handler.configure(self.stop_event, self.queue_read) 
-        self.signal_generator.configure(self.stop_event, self.queue_write)
-        self.daq_writer.configure(self.stop_event, self.queue_write, self.daq)  
+        for stage in (realtime or {}):
+            if stage not in ('daq_reader', 'data_handler', 'signal_generator', 'daq_writer'):
+                raise ValueError(f'Unknown pipeline stage {stage}')
+        realtime = realtime or {}
+
+        self.pipeline = Pipeline()
+        self.pipeline.add('daq_reader', daq_reader, realtime.get('daq_reader'),
+            daq = daq, chunking = chunking, timestamps = clock is not None, latest = latest)
+        self.pipeline.add('data_handler', data_handler, realtime.get('data_handler'), chunking = chunking, clock = clock)
+        self.pipeline.add('signal_generator', signal_generator, realtime.get('signal_generator'))
+        self.pipeline.add('daq_writer', daq_writer, realtime.get('daq_writer'), daq = daq)
+        self.queue_read = self.pipeline.connect('daq_reader', 'data_handler').queue
+        self.queue_write = self.pipeline.connect('signal_generator', 'daq_writer').queue
+        self.pipeline.build()
 
     def start(self):
-
-        self.data_handler.start()
-        self.signal_generator.start()
-        self.daq_reader.start()
-        self.daq_writer.start()
+        self.pipeline.start()
 
     def stop(self):
-        
-        # send stop signal
-        self.stop_event.set()
-
-        # empty the queue
-        empty_queue(self.queue_read)
-        empty_queue(self.queue_write)
-
-        # join
-        self.data_handler.join()
-        self.signal_generator.join()
-        self.daq_reader.join()
-        self.daq_writer.join()
\ No newline at end of file
+        # readers before handlers, each handler once it got everything
+        self.pipeline.stop()
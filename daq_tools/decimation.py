@@ -0,0 +1,190 @@
+from .core import PipelineProcess
+from typing import Dict, List, Sequence
+from numpy.lib.stride_tricks import sliding_window_view
+import numpy as np
+import queue
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Streamed data comes in chunks of shape (num_samples, num_channels)
+
+def design_lowpass(num_taps: int, cutoff: float) -> np.ndarray:
+    """
+    Windowed-sinc lowpass FIR filter with unit DC gain.
+    cutoff is a fraction of the Nyquist frequency (0 < cutoff < 1).
+    """
+
+    if not 0 < cutoff < 1:
+        raise ValueError('cutoff should be between 0 and 1')
+
+    n = np.arange(num_taps) - (num_taps - 1) / 2
+    taps = cutoff * np.sinc(cutoff * n) * np.blackman(num_taps)
+    return taps / taps.sum()
+
+def stage_factors(factor: int, max_stage_factor: int = 8) -> List[int]:
+    """Split a decimation factor in stages, cheaper than a single long filter for large factors"""
+
+    primes = []
+    remainder = factor
+    divisor = 2
+    while divisor * divisor <= remainder:
+        while remainder % divisor == 0:
+            primes.append(divisor)
+            remainder //= divisor
+        divisor += 1
+    if remainder > 1:
+        primes.append(remainder)
+
+    # group prime factors, largest first, as long as a stage stays small
+    stages: List[int] = []
+    for prime in sorted(primes, reverse=True):
+        for i, stage in enumerate(stages):
+            if stage * prime <= max_stage_factor:
+                stages[i] *= prime
+                break
+        else:
+            stages.append(prime)
+    return sorted(stages, reverse=True)
+
+class FIRDecimator:
+    '''
+    Lowpass filter and keep one sample out of `factor`, chunk by chunk.
+    Only the output samples that are kept are computed (polyphase), and
+    the filter history is carried across chunks, so the output does not
+    depend on how the stream was cut into chunks.
+    '''
+
+    def __init__(
+            self,
+            factor: int,
+            num_channels: int,
+            taps_per_phase: int = 16,
+            cutoff: float = 0.8,
+            dtype = np.float64
+        ) -> None:
+
+        self.factor = factor
+        self.num_channels = num_channels
+        self.taps = design_lowpass(taps_per_phase * factor + 1, cutoff / factor).astype(dtype)
+        self._reversed_taps = self.taps[::-1].copy()
+        self.dtype = dtype
+        self.reset()
+
+    def reset(self) -> None:
+        self._history = np.zeros((len(self.taps) - 1, self.num_channels), dtype=self.dtype)
+        self._phase = 0 # position of the next output sample in the next chunk
+
+    def process(self, chunk: np.ndarray) -> np.ndarray:
+
+        if chunk.ndim == 1:
+            chunk = chunk[:, np.newaxis]
+
+        x = np.concatenate((self._history, chunk.astype(self.dtype, copy=False)))
+        if len(x) < len(self.taps):
+            # empty chunk (e.g. an earlier stage had no output yet): nothing to compute
+            y = np.empty((0, x.shape[1]), dtype=self.dtype)
+        else:
+            windows = sliding_window_view(x, len(self.taps), axis=0)[self._phase::self.factor]
+            y = windows @ self._reversed_taps
+
+        num_new = len(chunk)
+        self._phase = (self._phase - num_new) % self.factor
+        self._history = x[len(x) - len(self._history):]
+        return y
+
+class MultiStageDecimator:
+    """Cascade of FIRDecimator stages"""
+
+    def __init__(
+            self,
+            factor: int,
+            num_channels: int,
+            max_stage_factor: int = 8,
+            **kwargs
+        ) -> None:
+
+        self.factor = factor
+        self.stages = [
+            FIRDecimator(stage, num_channels, **kwargs)
+            for stage in stage_factors(factor, max_stage_factor)
+        ]
+
+    def reset(self) -> None:
+        for stage in self.stages:
+            stage.reset()
+
+    def process(self, chunk: np.ndarray) -> np.ndarray:
+        for stage in self.stages:
+            chunk = stage.process(chunk)
+        return chunk
+
+class DecimatorBank:
+    '''
+    Decimate one input stream by several factors at once. A factor is
+    computed from the output of the largest smaller factor dividing it
+    (e.g. x100 is derived from x10), so shared stages are computed once.
+    A factor of 1 passes the input through.
+    '''
+
+    def __init__(self, factors: Sequence[int], num_channels: int, **kwargs) -> None:
+
+        self.factors = sorted(set(factors))
+        self._sources: Dict[int, int] = {}
+        self._decimators: Dict[int, MultiStageDecimator] = {}
+
+        for i, factor in enumerate(self.factors):
+            if factor < 1:
+                raise ValueError('decimation factors should be positive integers')
+            if factor == 1:
+                continue
+            source = max([1] + [f for f in self.factors[:i] if factor % f == 0])
+            self._sources[factor] = source
+            self._decimators[factor] = MultiStageDecimator(factor // source, num_channels, **kwargs)
+
+    def reset(self) -> None:
+        for decimator in self._decimators.values():
+            decimator.reset()
+
+    def process(self, chunk: np.ndarray) -> Dict[int, np.ndarray]:
+        if chunk.ndim == 1:
+            chunk = chunk[:, np.newaxis]
+
+        outputs = {1: chunk}
+        for factor in self.factors:
+            if factor != 1:
+                outputs[factor] = self._decimators[factor].process(outputs[self._sources[factor]])
+        return {factor: outputs[factor] for factor in self.factors}
+
+class DecimationStage(PipelineProcess):
+    """ Sits between DAQ_Reader and data handlers: decimate chunks and send each rate to its own queue """
+
+    def configure(self, stop_event, queue_in, queues_out, num_channels, **kwargs):
+
+        self.stop_event = stop_event
+        self.queue_in = queue_in
+        self.queues_out = queues_out
+        self.num_channels = num_channels
+        self.decimator_kwargs = kwargs
+
+    def initialize(self):
+        self.bank = DecimatorBank(list(self.queues_out), self.num_channels, **self.decimator_kwargs)
+
+    def run(self):
+        self.enter_realtime()
+        self.initialize()
+
+        while not self.stop_event.is_set():
+            try:
+                data = self.queue_in.get_nowait()
+                for factor, decimated in self.bank.process(data).items():
+                    if len(decimated):
+                        self.queues_out[factor].put(decimated)
+            except queue.Empty:
+                pass
+
+        self.cleanup()
+        self.exit_realtime()
+
+    def cleanup(self):
+        pass
@@ -0,0 +1,158 @@
+from .core import DAQ_Reader
+from .chunking import AdaptiveChunking
+from typing import NamedTuple, Optional
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Packed digital chunks: one bit per line, lines packed in bytes LSB first,
+# i.e. line i is bit i % 8 of byte i // 8. This is the memory layout of a
+# little endian port word, so NI / LabJack port reads map to it without
+# moving bits around.
+
+class PackedDigital(NamedTuple):
+    words: np.ndarray # (num_samples, num_bytes) uint8
+    num_lines: int
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    @property
+    def nbytes(self) -> int:
+        return self.words.nbytes
+
+class Transitions(NamedTuple):
+    index: np.ndarray # sample index within the chunk
+    line: np.ndarray
+    rising: np.ndarray # bool, False for falling edges
+
+def num_bytes(num_lines: int) -> int:
+    return (num_lines + 7) // 8
+
+def pack(chunk: np.ndarray, level: float = 0.5) -> PackedDigital:
+    """Pack a (num_samples, num_lines) chunk of bool, or of values HIGH above `level`"""
+
+    if chunk.ndim == 1:
+        chunk = chunk[:, np.newaxis]
+    if chunk.dtype != bool:
+        chunk = chunk > level
+    words = np.packbits(chunk, axis=1, bitorder='little')
+    return PackedDigital(words, chunk.shape[1])
+
+def unpack(packed: PackedDigital, dtype = bool) -> np.ndarray:
+    """Back to (num_samples, num_lines), one value per line"""
+
+    lines = np.unpackbits(packed.words, axis=1, count=packed.num_lines, bitorder='little')
+    return lines.view(bool) if dtype == bool else lines.astype(dtype, copy=False)
+
+def from_port_words(words: np.ndarray, num_lines: int) -> PackedDigital:
+    """Wrap port reads (one unsigned integer per sample, e.g. uint32 from NI port reads)"""
+
+    words = np.ascontiguousarray(words, dtype=words.dtype.newbyteorder('<'))
+    as_bytes = words.view(np.uint8).reshape(len(words), words.dtype.itemsize)
+    packed = as_bytes[:, :num_bytes(num_lines)]
+    if num_lines % 8:
+        # clear the bits above the last line, they would show up as lines in transitions()
+        packed = packed.copy()
+        packed[:, -1] &= (1 << (num_lines % 8)) - 1
+    return PackedDigital(packed, num_lines)
+
+def to_port_words(packed: PackedDigital, dtype = np.uint32) -> np.ndarray:
+    """One integer per sample, e.g. to write a port"""
+
+    dtype = np.dtype(dtype).newbyteorder('<')
+    if packed.words.shape[1] > dtype.itemsize:
+        raise ValueError(f'{packed.num_lines} lines do not fit in {dtype}')
+    padded = np.zeros((len(packed), dtype.itemsize), dtype=np.uint8)
+    padded[:, :packed.words.shape[1]] = packed.words
+    return padded.view(dtype).ravel()
+
+def transitions(packed: PackedDigital, previous: Optional[np.ndarray] = None) -> Transitions:
+    '''
+    Edges on every line, straight from the packed words: consecutive words
+    are XORed and only the bytes that changed are unpacked, so the cost is
+    proportional to the number of samples plus the number of edges, not to
+    samples x lines. `previous` is the last word of the previous chunk
+    (no edge is reported on the first sample if None).
+    Transitions are sorted by sample index, then line.
+    '''
+
+    words = packed.words
+    if len(words) == 0:
+        empty = np.empty(0, dtype=np.intp)
+        return Transitions(empty, empty, np.empty(0, dtype=bool))
+
+    before = np.empty_like(words)
+    before[0] = words[0] if previous is None else previous
+    before[1:] = words[:-1]
+    changed = words ^ before
+
+    rows, cols = np.nonzero(changed)
+    bits = np.unpackbits(changed[rows, cols][:, np.newaxis], axis=1, bitorder='little')
+    which, bit = np.nonzero(bits)
+
+    index = rows[which]
+    byte = cols[which]
+    line = byte * 8 + bit
+    rising = (words[index, byte] >> bit.astype(np.uint8)) & 1 == 1
+    return Transitions(index, line, rising)
+
+class TransitionFinder:
+    """transitions() over consecutive chunks, sample indices count from the start of the stream"""
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self._previous = None
+        self._total = 0
+
+    def find(self, packed: PackedDigital) -> Transitions:
+        found = transitions(packed, self._previous)
+        if len(packed):
+            self._previous = packed.words[-1].copy()
+        offset = self._total
+        self._total += len(packed)
+        return found._replace(index=found.index + offset)
+
+class DigitalReader(DAQ_Reader):
+    """ DAQ_Reader packing digital chunks before they go on the queue, 8 lines per byte """
+
+    def configure(
+            self,
+            stop_event,
+            queue,
+            daq,
+            chunking: Optional[AdaptiveChunking] = None,
+            timestamps: bool = False,
+            level: float = 0.5,
+            latest = None
+        ):
+        super().configure(stop_event, queue, daq, chunking, timestamps, latest)
+        self.level = level
+
+    def publish(self, data):
+        # only the last word is unpacked
+        if self.latest is not None and len(data):
+            self.latest.publish_chunk(unpack(PackedDigital(data.words[-1:], data.num_lines)))
+
+    def initialize(self):
+        pass
+
+    def run(self):
+        self.enter_realtime()
+        self.initialize()
+
+        while not self.stop_event.is_set():
+            data = self.daq.get_chunk(self.next_chunk_size())
+            if not isinstance(data, PackedDigital):
+                data = pack(np.asarray(data), self.level)
+            self.publish(data)
+            self.queue.put(self.stamp(data))
+
+        self.cleanup()
+        self.exit_realtime()
+
+    def cleanup(self):
+        pass
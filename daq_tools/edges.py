@@ -0,0 +1,225 @@
+from .core import SoftwareTimingDAQ, Edge, IOMethod, IOOperation
+from .metrics import LatencyStats
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class EdgeEvent(NamedTuple):
+    channel: int
+    rising: bool
+    time: float # time.perf_counter() when the edge was detected
+    latency: float # upper bound of the delay between the edge and its detection
+
+@dataclass
+class EdgeStats:
+    '''
+    transactions: device transactions (polls, or messages received from the board)
+    reads: channel reads in these transactions
+    latency: detection latency bound of every edge, for polling the time between
+        the last poll that saw the old state and the one that saw the new state
+    '''
+
+    transactions: int = 0
+    reads: int = 0
+    events: int = 0
+    errors: int = 0
+    latency: LatencyStats = field(default_factory = LatencyStats)
+    start: float = field(default_factory = time.perf_counter)
+
+    @property
+    def transaction_rate(self) -> float:
+        """Bus load, in transactions per second"""
+        elapsed = time.perf_counter() - self.start
+        return self.transactions / elapsed if elapsed > 0 else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f'{self.events} edge(s), {self.transactions} transaction(s) '
+            f'({self.transaction_rate:.1f}/s, {self.reads} channel reads), '
+            f'{self.errors} error(s), detection latency {self.latency}'
+        )
+
+class EdgeWatcher(ABC):
+    '''
+    Callbacks on edges of digital inputs of one board. Subclasses detect the
+    state of the watched channels and call `_update` with it.
+    '''
+
+    def __init__(self, daq: SoftwareTimingDAQ) -> None:
+        self.daq = daq
+        self.stats = EdgeStats()
+        self._lock = threading.Lock()
+        self._callbacks: Dict[int, Tuple[int, Edge, Callable]] = {} # handle -> (channel, edge, callback)
+        self._states: Dict[int, bool] = {}
+        self._next_handle = 0
+        self._stop_event = threading.Event()
+
+    @property
+    def channels(self) -> List[int]:
+        with self._lock:
+            return sorted({channel for channel, edge, callback in self._callbacks.values()})
+
+    @abstractmethod
+    def _watch(self, channel: int) -> None:
+        """Start watching a channel"""
+        pass
+
+    @abstractmethod
+    def _unwatch(self, channel: int) -> None:
+        """Stop watching a channel"""
+        pass
+
+    def add(self, channel: int, edge: Edge, callback: Callable) -> int:
+        with self._lock:
+            new_channel = channel not in {c for c, e, f in self._callbacks.values()}
+            handle = self._next_handle
+            self._next_handle += 1
+            self._callbacks[handle] = (channel, edge, callback)
+        if new_channel:
+            try:
+                self._watch(channel)
+            except Exception:
+                with self._lock:
+                    del self._callbacks[handle]
+                raise
+        return handle
+
+    def remove(self, handle: int) -> None:
+        with self._lock:
+            channel, edge, callback = self._callbacks.pop(handle, (None, None, None))
+            if channel is None or channel in {c for c, e, f in self._callbacks.values()}:
+                return
+            self._states.pop(channel, None)
+        self._unwatch(channel)
+
+    def wait(self, channel: int, edge: Edge, timeout: Optional[float] = None) -> Optional[EdgeEvent]:
+        events: List[EdgeEvent] = []
+        done = threading.Event()
+
+        def callback(event: EdgeEvent):
+            if not done.is_set():
+                events.append(event)
+                done.set()
+
+        handle = self.add(channel, edge, callback)
+        try:
+            done.wait(timeout)
+        finally:
+            self.remove(handle)
+        return events[0] if events else None
+
+    def _update(self, channel: int, state: bool, now: float, latency: float) -> None:
+        """New state of a channel, dispatch an event if it changed"""
+
+        with self._lock:
+            previous = self._states.get(channel)
+            self._states[channel] = state
+            if previous is None or previous == state:
+                return
+            wanted = Edge.RISING if state else Edge.FALLING
+            callbacks = [
+                callback for c, edge, callback in self._callbacks.values()
+                if c == channel and edge in (wanted, Edge.BOTH)
+            ]
+
+        self.stats.events += 1
+        self.stats.latency.add(latency)
+        event = EdgeEvent(channel, state, now, latency)
+        for callback in callbacks:
+            try:
+                callback(event)
+            except Exception:
+                logger.exception(f'Edge callback on channel {channel} failed')
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+class PollingEdgeWatcher(EdgeWatcher):
+    '''
+    One thread polls all watched channels in a single `execute` batch, i.e.
+    one device transaction per poll whatever the number of channels. The
+    poll interval adapts: `min_interval` right after an edge, growing by
+    `backoff` at every quiet poll up to `max_interval`, so an idle input
+    costs little bus time and a busy one is followed closely.
+    '''
+
+    def __init__(
+            self,
+            daq: SoftwareTimingDAQ,
+            min_interval: float = 1e-3,
+            max_interval: float = 20e-3,
+            backoff: float = 1.2
+        ) -> None:
+
+        super().__init__(daq)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.interval = min_interval
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name=f'edge watcher {daq.board_id}')
+        self._thread.start()
+
+    def _watch(self, channel: int) -> None:
+        self.interval = self.min_interval
+        self._wake.set()
+
+    def _unwatch(self, channel: int) -> None:
+        pass
+
+    def _poll(self, channels: List[int]) -> Optional[List[float]]:
+        operations = [IOOperation(IOMethod.DIGITAL_READ, channel) for channel in channels]
+        with self.daq.device_access():
+            # the board may have been closed while we waited for it
+            if self._stop_event.is_set():
+                return None
+            return self.daq.execute(operations)
+
+    def _run(self) -> None:
+
+        last_poll: Dict[int, float] = {}
+        while not self._stop_event.is_set():
+
+            channels = self.channels
+            if not channels:
+                last_poll.clear()
+                self._wake.wait()
+                self._wake.clear()
+                continue
+
+            start = time.perf_counter()
+            try:
+                values = self._poll(channels)
+            except Exception as e:
+                logger.warning(f'Edge watcher: polling {channels} failed: {e}')
+                self.stats.errors += 1
+                self._stop_event.wait(self.max_interval)
+                continue
+            if values is None:
+                break
+            now = time.perf_counter()
+            self.stats.transactions += 1
+            self.stats.reads += len(channels)
+
+            events = self.stats.events
+            for channel, value in zip(channels, values):
+                self._update(channel, bool(value) and value > 0.5, now, now - last_poll.get(channel, start))
+                last_poll[channel] = start
+
+            if self.stats.events > events:
+                self.interval = self.min_interval
+            else:
+                self.interval = min(self.interval * self.backoff, self.max_interval)
+
+            # new channels are polled right away
+            if self._wake.wait(max(start + self.interval - time.perf_counter(), 0)):
+                self._wake.clear()
+
+    def stop(self) -> None:
+        super().stop()
+        self._wake.set()
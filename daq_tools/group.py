@@ -0,0 +1,200 @@
+from concurrent.futures import ThreadPoolExecutor, Future
+from dataclasses import replace
+from typing import Dict, List, Optional, Sequence, Tuple
+import time
+import logging
+
+from .core import SoftwareTimingDAQ, BoardInfo, IOMethod, IOOperation
+from .metrics import LatencyStats
+
+logger = logging.getLogger(__name__)
+
+# channels of a group are addressed as (device name, channel index on that device)
+GroupChannel = Tuple[str, int]
+GroupOperation = Tuple[IOMethod, GroupChannel, float]
+
+class DAQGroup:
+    '''
+    Drive several SoftwareTimingDAQ boards through one channel namespace.
+
+    Each device gets its own single worker thread: calls on one device
+    are serialized in submission order, while calls on different devices
+    run concurrently. A batch passed to `execute` is split per device and
+    every part is sent as one `SoftwareTimingDAQ.execute` call, so updating
+    outputs on three boards costs about one round trip instead of three.
+    '''
+
+    def __init__(self, daqs: Dict[str, SoftwareTimingDAQ]) -> None:
+
+        self.daqs = dict(daqs)
+        self._executors = {
+            name: ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'daq_{name}')
+            for name in self.daqs
+        }
+        self._latency = {name: LatencyStats() for name in self.daqs}
+        self._closed = False
+
+    @classmethod
+    def from_boards(
+            cls,
+            boards: List[BoardInfo],
+            names: Optional[List[str]] = None
+        ) -> "DAQGroup":
+        '''
+        Open every board with the matching constructor from DAQ_CONSTRUCTORS.
+        Devices are named after their board type (e.g. labjack0, labjack1)
+        unless names are given.
+        '''
+
+        from . import DAQ_CONSTRUCTORS
+
+        if names is None:
+            names = []
+            count: Dict[str, int] = {}
+            for board in boards:
+                prefix = str(board.board_type).lower()
+                names.append(f'{prefix}{count.get(prefix, 0)}')
+                count[prefix] = count.get(prefix, 0) + 1
+
+        if len(names) != len(boards):
+            raise ValueError('one name per board is required')
+
+        daqs = {}
+        try:
+            for name, board in zip(names, boards):
+                try:
+                    constructor = DAQ_CONSTRUCTORS[board.board_type]
+                except KeyError:
+                    raise ValueError(f'No driver available for board type {board.board_type}')
+                daqs[name] = constructor(board_id = board.id)
+                logger.info(f'Added {board.board_type} board {board.id} as {name}')
+        except Exception:
+            for daq in daqs.values():
+                daq.close()
+            raise
+
+        return cls(daqs)
+
+    def _device(self, device: str) -> SoftwareTimingDAQ:
+        try:
+            return self.daqs[device]
+        except KeyError:
+            raise ValueError(f'Unknown device {device}. Valid devices are {list(self.daqs)}.')
+
+    def _submit(self, device: str, func, *args) -> Future:
+
+        executor = self._executors[device]
+        stats = self._latency[device]
+
+        def timed_call():
+            start = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                stats.add(time.perf_counter() - start)
+
+        return executor.submit(timed_call)
+
+    def _call(self, channel: GroupChannel, method: str, *args):
+        device, index = channel
+        func = getattr(self._device(device), method)
+        return self._submit(device, func, index, *args).result()
+
+    def digital_read(self, channel: GroupChannel) -> float:
+        return self._call(channel, 'digital_read')
+
+    def digital_write(self, channel: GroupChannel, val: bool) -> None:
+        self._call(channel, 'digital_write', val)
+
+    def pwm_write(self, channel: GroupChannel, duty_cycle: float) -> None:
+        self._call(channel, 'pwm_write', duty_cycle)
+
+    def analog_read(self, channel: GroupChannel) -> float:
+        return self._call(channel, 'analog_read')
+
+    def analog_write(self, channel: GroupChannel, val: float) -> None:
+        self._call(channel, 'analog_write', val)
+
+    def execute(self, operations: Sequence[GroupOperation]) -> List[Optional[float]]:
+        '''
+        Run a batch of operations spanning several devices.
+        Operations on the same device keep their relative order.
+        Results are returned in the order of the operations.
+        '''
+
+        per_device: Dict[str, List[IOOperation]] = {}
+        positions: Dict[str, List[int]] = {}
+        for pos, (method, (device, index), value) in enumerate(operations):
+            self._device(device)
+            per_device.setdefault(device, []).append(IOOperation(method, index, value))
+            positions.setdefault(device, []).append(pos)
+
+        futures = {
+            device: self._submit(device, self.daqs[device].execute, ops)
+            for device, ops in per_device.items()
+        }
+
+        results: List[Optional[float]] = [None] * len(operations)
+        for device, future in futures.items():
+            for pos, res in zip(positions[device], future.result()):
+                results[pos] = res
+        return results
+
+    def latency(self) -> Dict[str, LatencyStats]:
+        """Per device round trip statistics, in seconds."""
+        return {name: replace(stats) for name, stats in self._latency.items()}
+
+    def reset_latency(self) -> None:
+        for stats in self._latency.values():
+            stats.reset()
+
+    def reset_state(self) -> None:
+        futures = [self._submit(name, daq.reset_state) for name, daq in self.daqs.items()]
+        for future in futures:
+            future.result()
+
+    def close(self) -> None:
+        if self._closed:
+            return
+
+        futures = [self._submit(name, daq.close) for name, daq in self.daqs.items()]
+        for name, future in zip(self.daqs, futures):
+            try:
+                future.result()
+            except Exception:
+                logger.warning(f'Failed to close {name}', exc_info=True)
+
+        for executor in self._executors.values():
+            executor.shutdown()
+        self._closed = True
+
+    def _list(self, method: str) -> List[GroupChannel]:
+        return [
+            (name, channel)
+            for name, daq in self.daqs.items()
+            for channel in getattr(daq, method)()
+        ]
+
+    def list_analog_output_channels(self) -> List[GroupChannel]:
+        return self._list('list_analog_output_channels')
+
+    def list_analog_input_channels(self) -> List[GroupChannel]:
+        return self._list('list_analog_input_channels')
+
+    def list_digital_input_channels(self) -> List[GroupChannel]:
+        return self._list('list_digital_input_channels')
+
+    def list_digital_output_channels(self) -> List[GroupChannel]:
+        return self._list('list_digital_output_channels')
+
+    def list_pwm_output_channels(self) -> List[GroupChannel]:
+        return self._list('list_pwm_output_channels')
+
+    def list_pwm_input_channels(self) -> List[GroupChannel]:
+        return self._list('list_pwm_input_channels')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
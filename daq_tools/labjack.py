@@ -1,7 +1,9 @@
-from .core import SoftwareTimingDAQ, BoardInfo, BoardType
+from .core import SoftwareTimingDAQ, BoardInfo, BoardType, IOMethod, IOOperation, serialized, coalesced
+from .calibration import U3Calibration
 import u3
 from LabJackPython import listAll
-from typing import NamedTuple, List
+from typing import NamedTuple, List, Optional, Sequence
+import numpy as np
 
 import logging
 logger = logging.getLogger(__name__)
@@ -78,39 +80,60 @@ class LabJackU3_SoftTiming(SoftwareTimingDAQ):
         '48MHz/Divisor': 6
     }
 
+    # A Feedback packet holds at most 57 command bytes and 55 response bytes
+    FEEDBACK_MAX_COMMAND_BYTES = 57
+    FEEDBACK_MAX_RESPONSE_BYTES = 55
+
+    ANALOG_OUTPUT_RANGE = (0.0, 5.0)
+
     def __init__(self, *args, **kwargs) -> None:
 
         super().__init__(*args, **kwargs)
         
         self.device = u3.U3(serial = self.board_id)
         logger.info(f"Connected to LabJack U3 S/N: {self.device.serialNumber}")
+        # raw counts -> volts (and user units, see U3Calibration.set_scaling)
+        self.calibration = U3Calibration.load(self.device)
         self.pwm_pins = {4, 5}
+        self._fio_analog: Optional[int] = None
+        self._timers_configured = False
         self._closed = False
         self.reset_state()
 
+    def _set_fio_analog(self, bitmask: int) -> None:
+        # the configuration is cached, only talk to the device when it changes
+        if bitmask != self._fio_analog:
+            self.device.writeRegister(self.FIO_ANALOG, bitmask)
+            self._fio_analog = bitmask
+
+    @coalesced
     def analog_write(self, channel: int, val: float) -> None:
-        self.device.writeRegister(self.channels['AnalogOutput'][channel], val)
+        self.channels['AnalogOutput'][channel] # IndexError on invalid channel
+        bits = int(self.calibration.volts_to_dac(val, channel))
+        self.device.getFeedback(u3.DAC16(Dac = channel, Value = bits))
 
+    @serialized
     def analog_read(self, channel: int) -> float:
-        # Set the FIO pin to analog mode using a bitmask
-        bitmask = 1 << channel
-        self.device.writeRegister(self.FIO_ANALOG, bitmask) # set channel as analog
-        return self.device.readRegister(self.channels['AnalogInput'][channel])
+        # Feedback AIN rather than the Modbus register, so that user scaling applies
+        return self.execute([IOOperation(IOMethod.ANALOG_READ, channel)])[0]
     
+    @coalesced
     def digital_write(self, channel: int, val: bool):
         if channel in self.pwm_pins:
             raise ValueError(f'digital write not available on PWM pins {self.pwm_pins}')
 
-        self.device.writeRegister(self.FIO_ANALOG, 0) # set all channels as digital
+        self._set_fio_analog(0) # set all channels as digital
         self.device.writeRegister(self.channels['DigitalInputOutput'][channel], val)
 
+    @serialized
     def digital_read(self, channel: int) -> float:
         if channel in self.pwm_pins:
             raise ValueError(f'digital read not available on PWM pins {self.pwm_pins}')
 
-        self.device.writeRegister(self.FIO_ANALOG, 0) # set channel as digital
+        self._set_fio_analog(0) # set channel as digital
         return self.device.readRegister(self.channels['DigitalInputOutput'][channel])
    
+    @coalesced
     def pwm_write(self, channel: int = 4, duty_cycle: float = 0.5) -> None:
         # PWM on FIO4 and FIO5, PWM frequency fixed in init
 
@@ -118,15 +141,119 @@ class LabJackU3_SoftTiming(SoftwareTimingDAQ):
             raise ValueError(f'PWM only available on pins {self.pwm_pins}')
 
         channel_offset = channel-4
+        value = self._pwm_value(duty_cycle)
+
+        # Configure the timer for 16-bit PWM
+        self.device.writeRegister(self.TIMER_CONFIG + (channel_offset*2), [self.TIMER_MODE_16BIT, value]) 
+
+    def _pwm_value(self, duty_cycle: float) -> int:
 
         if not (0 <= duty_cycle <= 1):
             raise ValueError('duty_cycle should be between 0 and 1')
 
         # 16 bit value for duty cycle (8bit timer mode: LSB is ignored)
-        value = int(65535*(1-duty_cycle))
-
-        # Configure the timer for 16-bit PWM
-        self.device.writeRegister(self.TIMER_CONFIG + (channel_offset*2), [self.TIMER_MODE_16BIT, value]) 
+        return int(65535*(1-duty_cycle))
+
+    def _feedback(self, commands: List) -> List:
+        # split the commands in as few Feedback packets as possible
+        results = []
+        packet = []
+        command_bytes = 0
+        response_bytes = 0
+        for command in commands:
+            if packet and (
+                command_bytes + len(command.cmdBytes) > self.FEEDBACK_MAX_COMMAND_BYTES or
+                response_bytes + command.readLen > self.FEEDBACK_MAX_RESPONSE_BYTES
+            ):
+                results += self.device.getFeedback(*packet)
+                packet = []
+                command_bytes = 0
+                response_bytes = 0
+            packet.append(command)
+            command_bytes += len(command.cmdBytes)
+            response_bytes += command.readLen
+        if packet:
+            results += self.device.getFeedback(*packet)
+        return results
+
+    def can_batch(self, operations: Sequence[IOOperation]) -> bool:
+        # a FIO line is either analog or digital for the whole batch
+        analog = digital = 0
+        for method, channel, _ in operations:
+            if method in (IOMethod.DIGITAL_WRITE, IOMethod.DIGITAL_READ):
+                digital |= 1 << channel
+            elif method == IOMethod.ANALOG_READ:
+                analog |= 1 << channel
+        return not analog & digital
+
+    @serialized
+    def execute(self, operations: Sequence[IOOperation]) -> List[Optional[float]]:
+        """
+        Send the whole batch as Feedback commands, i.e. a single USB round trip
+        for most batches, plus one configuration write when the analog/digital 
+        configuration of the FIO lines changes. 
+        A FIO line can't be used both as analog and digital in the same batch.
+        Analog reads of the batch are converted together by self.calibration.
+        """
+
+        analog = 0
+        digital = 0
+        commands = []
+        decoders = []
+        analog_reads = [] # (result index, channel)
+        for method, channel, value in operations:
+
+            if method in (IOMethod.DIGITAL_WRITE, IOMethod.DIGITAL_READ):
+                self.channels['DigitalInputOutput'][channel] # IndexError on invalid channel
+                if channel in self.pwm_pins:
+                    raise ValueError(f'digital I/O not available on PWM pins {self.pwm_pins}')
+                digital |= 1 << channel
+                if method == IOMethod.DIGITAL_WRITE:
+                    commands += [u3.BitDirWrite(channel, 1), u3.BitStateWrite(channel, int(bool(value)))]
+                    decoders.append(None)
+                else:
+                    commands += [u3.BitDirWrite(channel, 0), u3.BitStateRead(channel)]
+                    decoders.append((len(commands)-1, float))
+
+            elif method == IOMethod.ANALOG_READ:
+                self.channels['AnalogInput'][channel] # IndexError on invalid channel
+                analog |= 1 << channel
+                commands.append(u3.AIN(PositiveChannel = channel, NegativeChannel = 31))
+                analog_reads.append((len(decoders), channel))
+                decoders.append((len(commands)-1, float))
+
+            elif method == IOMethod.ANALOG_WRITE:
+                self.channels['AnalogOutput'][channel] # IndexError on invalid channel
+                bits = int(self.calibration.volts_to_dac(value, channel))
+                commands.append(u3.DAC16(Dac = channel, Value = bits))
+                decoders.append(None)
+
+            elif method == IOMethod.PWM_WRITE:
+                if channel not in self.pwm_pins:
+                    raise ValueError(f'PWM only available on pins {self.pwm_pins}')
+                timer_config = u3.Timer0Config if channel == 4 else u3.Timer1Config
+                commands.append(timer_config(TimerMode = self.TIMER_MODE_16BIT, Value = self._pwm_value(value)))
+                decoders.append(None)
+
+            else:
+                raise NotImplementedError(f'{method} not supported')
+
+        if analog & digital:
+            raise ValueError('a FIO line cannot be used as analog and digital in the same batch')
+
+        if analog or digital:
+            self._set_fio_analog(analog)
+
+        results = self._feedback(commands) if commands else []
+        self._record_outputs(operations)
+        values = [None if decoder is None else decoder[1](results[decoder[0]]) for decoder in decoders]
+
+        if analog_reads:
+            indices, analog_channels = zip(*analog_reads)
+            volts = self.calibration.counts_to_volts(np.array([values[i] for i in indices]), analog_channels)
+            for i, v in zip(indices, volts.tolist()):
+                values[i] = v
+        return values
 
     def pwm_read(self, channel: int) -> float:
         # TODO read duty cycle 
@@ -140,40 +267,30 @@ class LabJackU3_SoftTiming(SoftwareTimingDAQ):
         # TODO send clock at a given frequency
         pass
 
+    @serialized
     def close(self) -> None:
         if self._closed:
             return  
 
         logger.info("Closing LabJack connection, setting outputs off")
+        self.stop_edge_watcher()
         self.reset_state()
         self.device.close()
         self._closed = True
 
+    @serialized
     def reset_state(self):
         
-        logger.info("Configure device: 2 timers @ 48MHz, no prescaler on pins FIO4 and FIO5 ")
+        if not self._timers_configured:
+            logger.info("Configure device: 2 timers @ 48MHz, no prescaler on pins FIO4 and FIO5 ")
 
-        self.device.writeRegister(self.NUM_TIMER_ENABLED, 2) 
-        self.device.writeRegister(self.TIMER_PIN_OFFSET, 4) 
-        self.device.writeRegister(self.TIMER_CLOCK_BASE, self.CLOCK_BASE['48MHz(Default)']) 
-        self.device.writeRegister(self.TIMER_CLOCK_DIVISOR, 0) 
+            self.device.writeRegister(self.NUM_TIMER_ENABLED, 2) 
+            self.device.writeRegister(self.TIMER_PIN_OFFSET, 4) 
+            self.device.writeRegister(self.TIMER_CLOCK_BASE, self.CLOCK_BASE['48MHz(Default)']) 
+            self.device.writeRegister(self.TIMER_CLOCK_DIVISOR, 0) 
+            self._timers_configured = True
 
-        logger.info("Resetting all output pins to LOW")
-        
-        for channel in range(len(self.channels['DigitalInputOutput'])):
-            try:
-                if channel in self.pwm_pins:
-                    self.pwm_write(channel, 0)
-                else:
-                    self.digital_write(channel, False)
-            except Exception as e:
-                logger.warning(f"Failed to reset digital channel {channel}: {e}")
-
-        for channel in range(len(self.channels['AnalogOutput'])):
-            try:
-                self.analog_write(channel, 0)
-            except Exception as e:
-                logger.warning(f"Failed to reset analog channel {channel}: {e}")
+        self.reset_outputs()
 
     @classmethod
     def list_boards(cls) -> List[BoardInfo]:
@@ -0,0 +1,117 @@
+from .core import IOMethod, IOOperation
+from .shared import SeqlockArray
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+import numpy as np
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# one row per input channel, method and channel never change after creation
+LATEST_DTYPE = np.dtype([
+    ('method', np.int32),
+    ('channel', np.int32),
+    ('value', np.float64),
+    ('time', np.float64), # time.monotonic() of the update, nan before the first one
+    ('count', np.uint64), # number of updates of the channel
+])
+
+class Latest(NamedTuple):
+    value: float
+    time: float
+    count: int
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.time
+
+class LatestValues:
+    '''
+    Latest value and timestamp of input channels in shared memory, updated
+    by a single acquisition owner and read by any number of processes (GUI,
+    logger, safety monitor) without locks or queues: readers copy the table
+    under a seqlock and never block the writer. Reading the whole table or
+    one channel costs a few microseconds.
+
+    Writers:
+        software polling: ControlLoop(daq, rate, latest.publish, inputs=latest.inputs)
+        hardware timing: System(..., latest=latest), the DAQ_Reader publishes
+            the last sample of every chunk, the chunk columns being the inputs in order
+
+    Other processes get the table pickled (it attaches to the same memory), or
+    attach by name with LatestValues.attach(name, num_inputs). The creating
+    process owns the memory and frees it on close().
+    '''
+
+    def __init__(
+            self,
+            inputs: Sequence[Union[IOOperation, Tuple[IOMethod, int]]] = (),
+            name: Optional[str] = None,
+            create: bool = True
+        ) -> None:
+
+        self.table = SeqlockArray((len(inputs),), LATEST_DTYPE, name=name, create=create)
+        if create:
+            with self.table.writing() as data:
+                data['method'] = [operation[0] for operation in inputs]
+                data['channel'] = [operation[1] for operation in inputs]
+                data['time'] = np.nan
+        self._index()
+
+    def _index(self) -> None:
+        keys, _ = self.table.read()
+        self._rows: Dict[Tuple[IOMethod, int], int] = {
+            (IOMethod(method), int(channel)): row for row, (method, channel) in enumerate(zip(keys['method'], keys['channel']))
+        }
+
+    @classmethod
+    def attach(cls, name: str, num_inputs: int) -> "LatestValues":
+        return cls([None] * num_inputs, name=name, create=False)
+
+    @property
+    def name(self) -> str:
+        return self.table.name
+
+    @property
+    def inputs(self) -> List[IOOperation]:
+        """Read operations of the table's channels, in row order"""
+        return [IOOperation(method, channel) for method, channel in self._rows]
+
+    def row(self, method: IOMethod, channel: int) -> int:
+        return self._rows[(method, channel)]
+
+    def update(self, values, timestamp: Optional[float] = None, rows = None) -> None:
+        """Writer side: new values for all rows, or for `rows` only"""
+
+        if timestamp is None:
+            timestamp = time.monotonic()
+        if rows is None:
+            rows = slice(None)
+        with self.table.writing() as data:
+            data['value'][rows] = values
+            data['time'][rows] = timestamp
+            data['count'][rows] += 1
+
+    def publish(self, t: float, values: List[float]) -> None:
+        """Update all rows, with the signature of a ControlLoop step"""
+        self.update(values)
+
+    def publish_chunk(self, chunk: np.ndarray, timestamp: Optional[float] = None) -> None:
+        """Update all rows with the last sample of a (samples, channels) chunk"""
+        if len(chunk):
+            self.update(chunk[-1], timestamp)
+
+    def snapshot(self, out: Optional[np.ndarray] = None) -> Tuple[np.ndarray, int]:
+        """Consistent copy of the whole table (a LATEST_DTYPE array) and its version"""
+        return self.table.read(out)
+
+    def get(self, method: IOMethod, channel: int) -> Latest:
+        row, _ = self.table.read(index = self._rows[(method, channel)])
+        return Latest(float(row['value']), float(row['time']), int(row['count']))
+
+    def values(self) -> Dict[Tuple[IOMethod, int], float]:
+        table, _ = self.snapshot()
+        return {key: float(value) for key, value in zip(self._rows, table['value'])}
+
+    def close(self) -> None:
+        self.table.close()
@@ -0,0 +1,89 @@
+from dataclasses import dataclass, field
+from typing import Sequence
+import bisect
+import math
+
+@dataclass
+class LatencyStats:
+    """Running summary of durations (in seconds) for one kind of operation."""
+
+    count: int = 0
+    total: float = 0.0
+    minimum: float = math.inf
+    maximum: float = 0.0
+    last: float = 0.0
+
+    def add(self, duration: float) -> None:
+        self.count += 1
+        self.total += duration
+        self.last = duration
+        if duration < self.minimum:
+            self.minimum = duration
+        if duration > self.maximum:
+            self.maximum = duration
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def reset(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.minimum = math.inf
+        self.maximum = 0.0
+        self.last = 0.0
+
+    def __str__(self) -> str:
+        if not self.count:
+            return 'no samples'
+        return (
+            f'n={self.count} mean={1e3*self.mean:.3f}ms '
+            f'min={1e3*self.minimum:.3f}ms max={1e3*self.maximum:.3f}ms'
+        )
+
+@dataclass
+class AccessStats:
+    """Contention on a device: time spent waiting for the device lock and coalesced writes."""
+
+    lock_wait: LatencyStats = field(default_factory = LatencyStats)
+    writes: int = 0
+    writes_coalesced: int = 0
+
+    def reset(self) -> None:
+        self.lock_wait.reset()
+        self.writes = 0
+        self.writes_coalesced = 0
+
+class Histogram:
+    """Counts of values (e.g. durations in seconds) in bins given by their edges."""
+
+    def __init__(self, edges: Sequence[float]) -> None:
+        self.edges = list(edges)
+        self.counts = [0] * (len(self.edges) + 1) # below first edge ... above last edge
+
+    @classmethod
+    def log(cls, low: float = 1e-6, high: float = 1.0, bins_per_decade: int = 4) -> "Histogram":
+        num_decades = math.log10(high / low)
+        num = int(round(num_decades * bins_per_decade))
+        return cls([low * 10 ** (i / bins_per_decade) for i in range(num + 1)])
+
+    def add(self, value: float) -> None:
+        self.counts[bisect.bisect_right(self.edges, value)] += 1
+
+    def reset(self) -> None:
+        self.counts = [0] * (len(self.edges) + 1)
+
+    def __str__(self) -> str:
+        total = sum(self.counts)
+        if not total:
+            return 'no samples'
+        labels = [f'< {1e3*self.edges[0]:.3g}ms']
+        labels += [f'{1e3*a:.3g} - {1e3*b:.3g}ms' for a, b in zip(self.edges[:-1], self.edges[1:])]
+        labels += [f'>= {1e3*self.edges[-1]:.3g}ms']
+        width = max(len(label) for label in labels)
+        lines = []
+        for label, count in zip(labels, self.counts):
+            if count:
+                bar = '#' * max(1, round(40 * count / total))
+                lines.append(f'{label:>{width}} {count:>8} {bar}')
+        return '\n'.join(lines)
@@ -1,10 +1,11 @@
 import nidaqmx
-from nidaqmx.constants import AcquisitionType, READ_ALL_AVAILABLE
+from nidaqmx.constants import AcquisitionType, READ_ALL_AVAILABLE, LineGrouping, RegenerationMode
 from nidaqmx.stream_readers import AnalogSingleChannelReader, DigitalSingleChannelReader
-from nidaqmx.stream_writers import AnalogSingleChannelWriter, DigitalSingleChannelWriter
+from nidaqmx.stream_writers import AnalogSingleChannelWriter, DigitalSingleChannelWriter, AnalogMultiChannelWriter
 import numpy as np
-from typing import List
-from .core import SoftwareTimingDAQ, BoardInfo, HardwareTimingDAQ, BoardType
+from typing import List, Optional, Sequence
+from .core import SoftwareTimingDAQ, BoardInfo, HardwareTimingDAQ, BoardType, serialized, coalesced
+from .sequence import CompiledSequence, OutputChunk
 import logging
 logger = logging.getLogger(__name__)
 
@@ -28,12 +29,14 @@ class NI_SoftTiming(SoftwareTimingDAQ):
         logger.info(f"Connected to NI: {self.device.name}")
         self.reset_state()
 
+    @coalesced
     def analog_write(self, channel: int, val: float) -> None:
         ao_channel = self.device.ao_physical_chans[channel]
         with nidaqmx.Task() as task:
             task.ao_channels.add_ao_voltage_chan(ao_channel.name) 
             task.write(val)
 
+    @serialized
     def analog_read(self, channel: int) -> float:
         ai_channel = self.device.ai_physical_chans[channel]
         with nidaqmx.Task() as task:
@@ -41,12 +44,14 @@ class NI_SoftTiming(SoftwareTimingDAQ):
             val = task.read()
         return val
 
+    @coalesced
     def digital_write(self, channel: int, val: bool) -> None:
         do_channel = self.device.do_lines[channel]
         with nidaqmx.Task() as task:
             task.do_channels.add_do_chan(do_channel.name)
             task.write(val)
 
+    @serialized
     def digital_read(self, channel: int) -> bool:
         di_channel = self.device.di_lines[channel]
         with nidaqmx.Task() as task:
@@ -54,6 +59,7 @@ class NI_SoftTiming(SoftwareTimingDAQ):
             val = task.read()
         return val
 
+    @coalesced
     def pwm_write(self, channel: int, duty_cycle: float) -> None:
         # TODO check wether duty_cycle in bounds
         duty_cycle = max(0.001, min(duty_cycle, 0.999))
@@ -66,15 +72,18 @@ class NI_SoftTiming(SoftwareTimingDAQ):
             )
             task.start()
 
+    @serialized
     def close(self) -> None:
         if self._closed:
             return 
 
         logger.info("Closing NI card, setting outputs off")
+        self.stop_edge_watcher()
         self.reset_state()
         # TODO close device?
         self._closed = True
     
+    @serialized
     def reset_state(self):
         # TODO
         # reset config 
@@ -135,13 +144,144 @@ class NI_SoftTiming(SoftwareTimingDAQ):
 #    stream.read_many_sample(data, number_of_samples_per_channel=1000)
     
 class NI_HardTiming(HardwareTimingDAQ):
-    
-    def get_chunk(self):
-        pass
+    '''
+    Hardware timed output on the sample clock of the board. Analog outputs
+    run on the AO sample clock and digital lines (one port) follow it, so
+    both stay in sync. Without analog outputs, the DO task uses its own clock.
+    '''
+
+    def __init__(
+            self,
+            board_id: int,
+            sample_rate: float,
+            digital_lines: Sequence[int] = (),
+            analog_channels: Sequence[int] = (),
+            port: int = 0,
+            timeout: float = 10.0
+        ) -> None:
+
+        system = nidaqmx.system.System.local()
+        self.device = system.devices[board_id]
+        self.sample_rate = sample_rate
+        self.digital_lines = sorted(digital_lines)
+        self.analog_channels = sorted(analog_channels)
+        self.port = port
+        self.timeout = timeout
+        self.ao_task = None
+        self.do_task = None
+        logger.info(f"Connected to NI: {self.device.name}")
+
+    def configure_output(self, num_samples: int, buffer_size: int, regenerate: bool, continuous: bool = False) -> None:
+        '''
+        num_samples: number of samples to generate (ignored if continuous)
+        buffer_size: size of the output buffer on the host
+        regenerate: output the buffer over and over instead of streaming new samples
+        '''
+
+        self.close()
+        sample_mode = AcquisitionType.CONTINUOUS if continuous else AcquisitionType.FINITE
+        regen_mode = RegenerationMode.ALLOW_REGENERATION if regenerate else RegenerationMode.DONT_ALLOW_REGENERATION
+
+        if self.analog_channels:
+            self.ao_task = nidaqmx.Task()
+            for channel in self.analog_channels:
+                self.ao_task.ao_channels.add_ao_voltage_chan(self.device.ao_physical_chans[channel].name)
+            self.ao_task.timing.cfg_samp_clk_timing(self.sample_rate, sample_mode=sample_mode, samps_per_chan=num_samples)
+            self.ao_task.out_stream.regen_mode = regen_mode
+            self.ao_task.out_stream.output_buf_size = buffer_size
+            self._ao_writer = AnalogMultiChannelWriter(self.ao_task.out_stream, auto_start=False)
+
+        if self.digital_lines:
+            self.do_task = nidaqmx.Task()
+            lines = ','.join(f'{self.device.name}/port{self.port}/line{line}' for line in self.digital_lines)
+            self.do_task.do_channels.add_do_chan(lines, line_grouping=LineGrouping.CHAN_FOR_ALL_LINES)
+            source = f'/{self.device.name}/ao/SampleClock' if self.ao_task is not None else ''
+            self.do_task.timing.cfg_samp_clk_timing(self.sample_rate, source=source, sample_mode=sample_mode, samps_per_chan=num_samples)
+            self.do_task.out_stream.regen_mode = regen_mode
+            self.do_task.out_stream.output_buf_size = buffer_size
+            self._do_writer = DigitalSingleChannelWriter(self.do_task.out_stream, auto_start=False)
 
-    def put_chunk(self):
+    def get_chunk(self, num_samples: Optional[int] = None):
         pass
 
+    def put_chunk(self, chunk: OutputChunk) -> None:
+        '''Write samples to the output buffer, blocks until there is room'''
+
+        if self.ao_task is not None:
+            self._ao_writer.write_many_sample(np.ascontiguousarray(chunk.analog.T), timeout=self.timeout)
+        if self.do_task is not None:
+            digital = chunk.digital if chunk.digital is not None else np.zeros(len(chunk), dtype=np.uint32)
+            self._do_writer.write_many_sample_port_uint32(np.ascontiguousarray(digital, dtype=np.uint32), timeout=self.timeout)
+
+    def start(self) -> None:
+        # DO follows the AO sample clock: start it first
+        if self.do_task is not None:
+            self.do_task.start()
+        if self.ao_task is not None:
+            self.ao_task.start()
+
+    def wait_until_done(self, timeout: float = -1) -> None:
+        for task in (self.ao_task, self.do_task):
+            if task is not None:
+                task.wait_until_done(timeout)
+
+    def stop(self) -> None:
+        for task in (self.ao_task, self.do_task):
+            if task is not None:
+                task.stop()
+
+    def close(self) -> None:
+        for task in (self.ao_task, self.do_task):
+            if task is not None:
+                task.close()
+        self.ao_task = None
+        self.do_task = None
+
+    def play(
+            self,
+            sequence: CompiledSequence,
+            loop: bool = False,
+            chunk_size: int = 10_000,
+            buffered_chunks: int = 4,
+            min_buffer: int = 1000
+        ) -> None:
+        '''
+        Output a compiled pulse sequence. Periodic sequences, and looped ones,
+        are uploaded once and regenerated by the board. Others are streamed
+        chunk by chunk, this returns when the last chunk has been written.
+        '''
+
+        if sequence.digital_lines and not set(sequence.digital_lines) <= set(self.digital_lines):
+            raise ValueError(f'Sequence uses digital lines {sequence.digital_lines}, task has {self.digital_lines}')
+        if sequence.analog_channels != self.analog_channels:
+            raise ValueError(f'Sequence uses analog channels {sequence.analog_channels}, task has {self.analog_channels}')
+
+        report = sequence.report
+        if sequence.periodic or loop:
+            period = sequence.period(min_buffer)
+            self.configure_output(sequence.num_samples, len(period), regenerate=True, continuous=loop)
+            self.put_chunk(period)
+            self.start()
+            report.buffer_bytes = period.nbytes
+            logger.info(f'Regenerating {len(period)} samples: {report}')
+            return
+
+        buffer_size = min(chunk_size * buffered_chunks, sequence.num_samples)
+        self.configure_output(sequence.num_samples, buffer_size, regenerate=False)
+        chunks = sequence.chunks(chunk_size)
+        written = 0
+        # fill the buffer before starting, then keep it filled
+        for chunk in chunks:
+            self.put_chunk(chunk)
+            written += len(chunk)
+            if written >= buffer_size:
+                break
+        self.start()
+        report.buffer_bytes = buffer_size * (4 * bool(self.digital_lines) + 8 * len(self.analog_channels))
+        logger.info(f'Streaming in chunks of {chunk_size} samples: {report}')
+        for chunk in chunks:
+            self.put_chunk(chunk)
+
 # ----- Work in progress
 
 if __name__ == "__main__":
@@ -0,0 +1,448 @@
+from .core import PipelineProcess, empty_queue
+from .clock import ChunkHeader, TimestampedChunk
+from .digital import PackedDigital
+from .realtime import RealtimeConfig
+from multiprocessing import Queue, Event, shared_memory
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+import queue
+import time
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+# metadata of the chunk in a slot
+SLOT_DTYPE = np.dtype([
+    ('num_samples', np.int64),
+    ('first_sample', np.int64), # -1: no header
+    ('host_time', np.float64),
+    ('num_lines', np.int64), # -1: array, otherwise PackedDigital words
+])
+
+class ChunkRing:
+    '''
+    Ring of `num_slots` chunks of at most (max_samples, width) in shared memory,
+    written by one producer and read by `num_consumers` consumers, without copies
+    on the consumer side: each consumer gets read-only views of the slots.
+
+    Every consumer has its own cursors: `read`, the next chunk it will get, and
+    `released`, the chunks it is done with (a chunk is released when the
+    consumer asks for the next one, or calls release). A slot is held by the
+    consumers that have not released it yet (its reference count, computed from
+    the cursors so that no atomic operation is shared between processes), and
+    the producer reuses it once that count drops to zero. A slow consumer thus
+    blocks the producer once it is num_slots chunks behind, like a full queue.
+
+    Plain arrays, TimestampedChunk and PackedDigital chunks round-trip.
+    '''
+
+    def __init__(
+            self,
+            max_samples: int,
+            width: int,
+            dtype = np.float64,
+            num_slots: int = 8,
+            num_consumers: int = 1,
+            name: Optional[str] = None,
+            create: bool = True
+        ) -> None:
+
+        self.max_samples = max_samples
+        self.width = width
+        self.dtype = np.dtype(dtype)
+        self.num_slots = num_slots
+        self.num_consumers = num_consumers
+
+        control_size = 8 * (1 + 2 * num_consumers)
+        meta_size = SLOT_DTYPE.itemsize * num_slots
+        data_size = num_slots * max_samples * width * self.dtype.itemsize
+        self._shm = shared_memory.SharedMemory(name=name, create=create, size=control_size + meta_size + data_size)
+        self._owner = create
+
+        buffer = self._shm.buf
+        self._written = np.ndarray((1,), dtype=np.int64, buffer=buffer, offset=0)
+        self._read = np.ndarray((num_consumers,), dtype=np.int64, buffer=buffer, offset=8)
+        self._released = np.ndarray((num_consumers,), dtype=np.int64, buffer=buffer, offset=8 * (1 + num_consumers))
+        self._meta = np.ndarray((num_slots,), dtype=SLOT_DTYPE, buffer=buffer, offset=control_size)
+        self._data = np.ndarray((num_slots, max_samples, width), dtype=self.dtype, buffer=buffer, offset=control_size + meta_size)
+        if create:
+            self._written[:] = 0
+            self._read[:] = 0
+            self._released[:] = 0
+
+    def __getstate__(self):
+        # other processes attach to the same memory instead of getting a copy
+        return (self.max_samples, self.width, self.dtype, self.num_slots, self.num_consumers, self.name)
+
+    def __setstate__(self, state):
+        max_samples, width, dtype, num_slots, num_consumers, name = state
+        self.__init__(max_samples, width, dtype, num_slots, num_consumers, name=name, create=False)
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    # producer ----------------------------------------------------------------
+
+    def full(self) -> bool:
+        return int(self._written[0]) - int(self._released.min()) >= self.num_slots
+
+    def put(self, chunk, stop_event = None, timeout: Optional[float] = None, poll: float = 1e-4) -> bool:
+        '''
+        Copy a chunk in the next slot, waiting for the consumers to release it.
+        Returns False if stop_event was set or timeout expired while waiting.
+        '''
+
+        header = None
+        num_lines = -1
+        if isinstance(chunk, TimestampedChunk):
+            header, chunk = chunk
+        if isinstance(chunk, PackedDigital):
+            num_lines = chunk.num_lines
+            chunk = chunk.words
+        data = np.asarray(chunk)
+        if data.ndim == 1:
+            data = data[:, np.newaxis]
+        num_samples = len(data)
+        if num_samples > self.max_samples or data.shape[1] != self.width:
+            raise ValueError(f'chunk of shape {data.shape} does not fit in slots of ({self.max_samples}, {self.width})')
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.full():
+            if stop_event is not None and stop_event.is_set():
+                return False
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(poll)
+
+        written = int(self._written[0])
+        slot = written % self.num_slots
+        self._data[slot, :num_samples] = data
+        self._meta[slot] = (
+            num_samples,
+            -1 if header is None else header.first_sample,
+            0.0 if header is None else header.host_time,
+            num_lines
+        )
+        # publish the chunk only once it is complete
+        self._written[0] = written + 1
+        return True
+
+    # consumers ---------------------------------------------------------------
+
+    def release(self, consumer: int) -> None:
+        """Done with every chunk got so far"""
+        self._released[consumer] = self._read[consumer]
+
+    def get(self, consumer: int):
+        '''
+        Next chunk for a consumer (releasing the previous one), or None if there
+        is none yet. The chunk is a read-only view of shared memory, valid until
+        the consumer's next get or release: copy what must be kept longer.
+        '''
+
+        self.release(consumer)
+        read = int(self._read[consumer])
+        if read >= int(self._written[0]):
+            return None
+
+        slot = read % self.num_slots
+        num_samples, first_sample, host_time, num_lines = self._meta[slot].tolist()
+        data = self._data[slot, :num_samples]
+        data.flags.writeable = False
+        self._read[consumer] = read + 1
+
+        if num_lines >= 0:
+            data = PackedDigital(data, num_lines)
+        if first_sample >= 0:
+            data = TimestampedChunk(ChunkHeader(first_sample, num_samples, host_time), data)
+        return data
+
+    def lag(self, consumer: int) -> int:
+        """Chunks written but not yet got by a consumer"""
+        return int(self._written[0]) - int(self._read[consumer])
+
+    def refcount(self, index: int) -> int:
+        """Number of consumers still holding chunk `index` (0 once released by all, or not written yet)"""
+        if index >= int(self._written[0]):
+            return 0
+        return int(np.count_nonzero(self._released <= index))
+
+    def drained(self) -> bool:
+        """Every consumer got every chunk"""
+        return bool((self._read == self._written[0]).all())
+
+    def close(self) -> None:
+        # drop our views before closing the mapping
+        del self._written, self._read, self._released, self._meta, self._data
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+class RingWriter:
+    '''Producer end of a ChunkRing, with the put / qsize interface of a queue'''
+
+    def __init__(self, ring: ChunkRing, abandon_event = None) -> None:
+        self.ring = ring
+        self.abandon_event = abandon_event
+        self.dropped = 0
+
+    def put(self, chunk, block: bool = True, timeout: Optional[float] = None) -> None:
+        # a full ring is abandoned when abandon_event is set, the chunk is dropped
+        if not self.ring.put(chunk, self.abandon_event, timeout if block else 0.0):
+            if self.abandon_event is None or not self.abandon_event.is_set():
+                raise queue.Full
+            self.dropped += 1
+            logger.warning(f'Gave up on the full ring {self.ring.name}, dropped a chunk ({self.dropped} in total)')
+
+    def put_nowait(self, chunk) -> None:
+        self.put(chunk, block=False)
+
+    def qsize(self) -> int:
+        return max(self.ring.lag(consumer) for consumer in range(self.ring.num_consumers))
+
+class RingReader:
+    '''One consumer's end of a ChunkRing, with the get / qsize interface of a queue'''
+
+    def __init__(self, ring: ChunkRing, consumer: int) -> None:
+        self.ring = ring
+        self.consumer = consumer
+
+    def get_nowait(self):
+        chunk = self.ring.get(self.consumer)
+        if chunk is None:
+            raise queue.Empty
+        return chunk
+
+    def get(self, block: bool = True, timeout: Optional[float] = None, poll: float = 1e-4):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            chunk = self.ring.get(self.consumer)
+            if chunk is not None:
+                return chunk
+            if not block or (deadline is not None and time.monotonic() > deadline):
+                raise queue.Empty
+            time.sleep(poll)
+
+    def release(self) -> None:
+        self.ring.release(self.consumer)
+
+    def qsize(self) -> int:
+        return self.ring.lag(self.consumer)
+
+    def empty(self) -> bool:
+        return self.qsize() == 0
+
+# a stage's parameter receiving an endpoint: 'stage' (parameter 'queue'),
+# ('stage', 'parameter') or ('stage', 'parameter', key) for a dict of endpoints
+Port = Union[str, Tuple[str, str], Tuple[str, str, object]]
+
+def _port(port: Port) -> Tuple[str, str, object]:
+    if isinstance(port, str):
+        return (port, 'queue', None)
+    if len(port) == 2:
+        return (port[0], port[1], None)
+    return tuple(port)
+
+class Connection:
+    '''
+    Data path from one stage to others: a multiprocessing Queue (any picklable
+    data, one consumer) or, when the chunk shape is known, a ChunkRing (arrays,
+    any number of consumers reading the same shared memory)
+    '''
+
+    def __init__(
+            self,
+            source: Port,
+            targets: Sequence[Port],
+            shape: Optional[Tuple[int, int]] = None,
+            dtype = np.float64,
+            num_slots: int = 8,
+            maxsize: int = 2
+        ) -> None:
+
+        self.source = _port(source)
+        self.targets = [_port(target) for target in targets]
+        self.ring: Optional[ChunkRing] = None
+        self.queue: Optional[Queue] = None
+
+        if shape is None:
+            if len(self.targets) != 1:
+                raise ValueError('several consumers need a shared memory connection, give the chunk shape')
+            self.queue = Queue(maxsize=maxsize)
+        else:
+            self.ring = ChunkRing(shape[0], shape[1], dtype, num_slots, len(self.targets))
+
+    def writer(self, abandon_event = None):
+        return self.queue if self.ring is None else RingWriter(self.ring, abandon_event)
+
+    def reader(self, index: int):
+        return self.queue if self.ring is None else RingReader(self.ring, index)
+
+    def drained(self) -> bool:
+        return self.queue.empty() if self.ring is None else self.ring.drained()
+
+    def discard(self) -> None:
+        if self.queue is not None:
+            empty_queue(self.queue)
+
+    def close(self) -> None:
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+class Pipeline:
+    '''
+    Graph of pipeline stages (PipelineProcess) linked by connections.
+
+        pipeline = Pipeline()
+        pipeline.add('reader', DigitizerReader(), daq=daq)
+        pipeline.add('recorder', RecordingHandler(...))
+        pipeline.add('display', DecimationStage(), num_channels=8, queues_out=...)
+        pipeline.add('trigger', TriggerHandler(...))
+        pipeline.connect('reader', ['recorder', ('display', 'queue_in'), 'trigger'], shape=(1000, 8))
+        pipeline.start()
+        ...
+        pipeline.stop()
+
+    Every stage is configured with its own stop_event, its connection
+    endpoints passed as the named parameters, and the keyword arguments given
+    to add. Stages start consumers first and stop in dependency order:
+    producers first, then each consumer once everything its producers sent
+    has been handed to it, so in-flight chunks are processed instead of dropped.
+    A producer waiting for room in a full ring when it is stopped finishes its
+    put (its consumers are still running), the chunk is only dropped if the
+    producer has not stopped after the timeout.
+    '''
+
+    def __init__(self) -> None:
+        self.stages: Dict[str, PipelineProcess] = {}
+        self.stop_events: Dict[str, Event] = {}
+        self._abandon_events: Dict[str, Event] = {}
+        self.connections: List[Connection] = []
+        self._configure_kwargs: Dict[str, dict] = {}
+        self._built = False
+
+    def add(self, name: str, stage: PipelineProcess, realtime: Optional[RealtimeConfig] = None, **configure_kwargs) -> PipelineProcess:
+        if name in self.stages:
+            raise ValueError(f'Stage {name} already exists')
+        self.stages[name] = stage
+        self.stop_events[name] = Event()
+        self._abandon_events[name] = Event()
+        self._configure_kwargs[name] = configure_kwargs
+        if realtime is not None:
+            stage.set_realtime(realtime)
+        return stage
+
+    def connect(
+            self,
+            source: Port,
+            targets: Union[Port, Sequence[Port]],
+            shape: Optional[Tuple[int, int]] = None,
+            dtype = np.float64,
+            num_slots: int = 8,
+            maxsize: int = 2
+        ) -> Connection:
+        '''
+        shape: (max samples per chunk, channels) for a shared memory connection,
+        None for a queue of at most maxsize items. The chunking of the source
+        stage, if any, is limited to max samples per chunk.
+        '''
+
+        if isinstance(targets, (str, tuple)):
+            targets = [targets]
+        for name in [_port(source)[0]] + [_port(target)[0] for target in targets]:
+            if name not in self.stages:
+                raise ValueError(f'Unknown stage {name}')
+        connection = Connection(source, targets, shape, dtype, num_slots, maxsize)
+        self.connections.append(connection)
+
+        # adaptive chunk sizes of the producer must fit in the slots
+        chunking = self._configure_kwargs[connection.source[0]].get('chunking')
+        if shape is not None and chunking is not None:
+            chunking.controller.limit(shape[0])
+        return connection
+
+    def inputs(self, name: str) -> List[Connection]:
+        return [connection for connection in self.connections if any(target[0] == name for target in connection.targets)]
+
+    def order(self) -> List[str]:
+        """Stage names, producers before their consumers"""
+
+        consumers: Dict[str, set] = {name: set() for name in self.stages}
+        num_producers: Dict[str, int] = {name: 0 for name in self.stages}
+        for connection in self.connections:
+            for target in {target[0] for target in connection.targets} - consumers[connection.source[0]]:
+                consumers[connection.source[0]].add(target)
+                num_producers[target] += 1
+
+        ready = [name for name in self.stages if num_producers[name] == 0]
+        order = []
+        while ready:
+            name = ready.pop(0)
+            order.append(name)
+            for target in self.stages:
+                if target in consumers[name]:
+                    num_producers[target] -= 1
+                    if num_producers[target] == 0:
+                        ready.append(target)
+
+        if len(order) != len(self.stages):
+            raise ValueError(f'Pipeline has a cycle between {sorted(set(self.stages) - set(order))}')
+        return order
+
+    def build(self) -> None:
+        """Configure every stage, done by start if needed"""
+
+        if self._built:
+            return
+        self.order() # refuse cycles before configuring anything
+
+        endpoints: Dict[str, dict] = {name: {} for name in self.stages}
+        def assign(port, endpoint):
+            name, parameter, key = port
+            if key is None:
+                endpoints[name][parameter] = endpoint
+            else:
+                endpoints[name].setdefault(parameter, {})[key] = endpoint
+
+        for connection in self.connections:
+            assign(connection.source, connection.writer(self._abandon_events[connection.source[0]]))
+            for index, target in enumerate(connection.targets):
+                assign(target, connection.reader(index))
+
+        for name, stage in self.stages.items():
+            stage.configure(stop_event = self.stop_events[name], **endpoints[name], **self._configure_kwargs[name])
+        self._built = True
+
+    def start(self) -> None:
+        self.build()
+        for name in reversed(self.order()):
+            self.stages[name].start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+
+        for name in self.order():
+            inputs = self.inputs(name)
+            deadline = time.monotonic() + timeout
+            while not all(connection.drained() for connection in inputs) and time.monotonic() < deadline:
+                time.sleep(1e-3)
+            if not all(connection.drained() for connection in inputs):
+                logger.warning(f'{name} did not consume its input within {timeout}s, dropping the rest')
+
+            self.stop_events[name].set()
+            for connection in inputs:
+                # unblock a feeder thread of a stopped producer
+                connection.discard()
+            self.stages[name].join(timeout)
+            if self.stages[name].is_alive():
+                # blocked on a ring whose consumers don't keep up
+                self._abandon_events[name].set()
+                self.stages[name].join(timeout)
+            if self.stages[name].is_alive():
+                logger.warning(f'{name} did not stop within {timeout}s')
+
+    def close(self) -> None:
+        """Free the shared memory of the connections, after stop"""
+        for connection in self.connections:
+            connection.close()
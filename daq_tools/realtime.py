@@ -0,0 +1,147 @@
+from .metrics import LatencyStats
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import List, Optional
+import ctypes
+import ctypes.util
+import os
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Linux only. Elsewhere, or without the permissions (CAP_SYS_NICE /
+# RLIMIT_RTPRIO for priorities, CAP_IPC_LOCK / RLIMIT_MEMLOCK for memory
+# locking), settings that cannot be applied are skipped with a warning.
+
+MCL_CURRENT = 1
+MCL_FUTURE = 2
+
+class Policy(IntEnum):
+    OTHER = 0
+    FIFO = 1
+    RR = 2
+
+    def __str__(self) -> str:
+        return self.name
+
+def _sched_policy(policy: Policy) -> int:
+    return getattr(os, f'SCHED_{policy.name}')
+
+def _lock_memory() -> None:
+    libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    if libc.mlockall(MCL_CURRENT | MCL_FUTURE) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+
+def _involuntary_switches() -> int:
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_THREAD).ru_nivcsw
+    except (ImportError, AttributeError, OSError):
+        return 0
+
+def measure_scheduling_latency(duration: float = 0.2, period: float = 1e-3) -> LatencyStats:
+    '''
+    Sleep `period` over and over for `duration` seconds and record how late
+    the calling thread wakes up each time, i.e. how long it waits to be
+    scheduled once it is runnable (like cyclictest).
+    '''
+
+    stats = LatencyStats()
+    start = time.perf_counter()
+    deadline = start
+    while deadline - start < duration:
+        deadline += period
+        remaining = deadline - time.perf_counter()
+        if remaining > 0:
+            time.sleep(remaining)
+        stats.add(max(time.perf_counter() - deadline, 0.0))
+    return stats
+
+@dataclass
+class RealtimeConfig:
+    '''
+    Scheduling settings for one pipeline process, applied by the process
+    itself when it starts.
+
+    cpus: CPUs the process may run on (None: any)
+    policy, priority: SCHED_FIFO / SCHED_RR with priority 1 to 99 keep the
+        process from being preempted by normal processes. Use with care, a
+        busy-polling stage at real-time priority can starve the CPU it runs on.
+    lock_memory: lock current and future pages in RAM (no page faults)
+    probe_duration: measure scheduling latency for that long once settings
+        are applied (0 to skip)
+    '''
+
+    cpus: Optional[List[int]] = None
+    policy: Policy = Policy.OTHER
+    priority: int = 0
+    lock_memory: bool = False
+    probe_duration: float = 0.2
+    probe_period: float = 1e-3
+
+    def apply(self) -> List[str]:
+        """Apply to the calling process, returns the settings that could not be applied"""
+
+        failed = []
+
+        if self.cpus is not None:
+            try:
+                os.sched_setaffinity(0, self.cpus)
+            except (AttributeError, OSError) as e:
+                logger.warning(f'Could not set CPU affinity to {self.cpus}: {e}')
+                failed.append('cpus')
+
+        if self.policy != Policy.OTHER or self.priority:
+            try:
+                os.sched_setscheduler(0, _sched_policy(self.policy), os.sched_param(self.priority))
+            except (AttributeError, OSError) as e:
+                logger.warning(f'Could not set scheduling policy {self.policy} priority {self.priority}: {e}')
+                failed.append('policy')
+
+        if self.lock_memory:
+            try:
+                _lock_memory()
+            except (AttributeError, OSError) as e:
+                logger.warning(f'Could not lock memory: {e}')
+                failed.append('lock_memory')
+
+        return failed
+
+    def enter(self, name: str) -> "RealtimeSession":
+        return RealtimeSession(name, self)
+
+class RealtimeSession:
+    '''
+    Real-time settings in effect for a running process: applies them,
+    measures the scheduling latency they give, and counts how many times
+    the process got preempted until close().
+    '''
+
+    def __init__(self, name: str, config: RealtimeConfig) -> None:
+
+        self.name = name
+        self.config = config
+        self.failed = config.apply()
+        self.latency = LatencyStats()
+
+        if config.probe_duration > 0:
+            self.latency = measure_scheduling_latency(config.probe_duration, config.probe_period)
+
+        logger.info(
+            f'{name}: cpus={config.cpus} policy={config.policy} priority={config.priority} '
+            f'lock_memory={config.lock_memory} failed={self.failed}, '
+            f'scheduling latency {self.latency}'
+        )
+
+        self._start = time.monotonic()
+        self._switches = _involuntary_switches()
+
+    @property
+    def preemptions(self) -> int:
+        return _involuntary_switches() - self._switches
+
+    def close(self) -> None:
+        duration = time.monotonic() - self._start
+        logger.info(f'{self.name}: {self.preemptions} involuntary context switches in {duration:.1f}s')
@@ -0,0 +1,318 @@
+from .core import DataHandler
+from .digital import PackedDigital, pack, unpack, num_bytes
+from typing import List, NamedTuple, Optional
+import json
+import os
+import time
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+# A recording named `path` is stored as:
+#   path.json          metadata
+#   path.dat           raw samples, (num_samples, num_channels), C order,
+#                      or packed digital words (num_samples, ceil(num_channels/8))
+#                      uint8 for digital recordings, see digital.py
+#   path.env<k>.dat    min/max/mean envelope over bins of 2**k samples,
+#                      (num_bins, 3, num_channels) float64, for k in levels
+# Envelopes are built while recording, a bin is written once all its
+# samples have been recorded.
+
+MIN, MAX, MEAN = 0, 1, 2
+
+class Envelope(NamedTuple):
+    index: np.ndarray # first sample of each bin
+    minimum: np.ndarray # (num_bins, num_channels)
+    maximum: np.ndarray
+    mean: np.ndarray
+
+def _reduce(bins: np.ndarray, group: int) -> np.ndarray:
+    # combine `group` consecutive envelope bins of equal size
+    bins = bins.reshape(-1, group, 3, bins.shape[-1])
+    out = np.empty((bins.shape[0], 3, bins.shape[-1]))
+    out[:, MIN] = bins[:, :, MIN].min(axis=1)
+    out[:, MAX] = bins[:, :, MAX].max(axis=1)
+    out[:, MEAN] = bins[:, :, MEAN].mean(axis=1)
+    return out
+
+class Recorder:
+    '''
+    Append streamed chunks to disk and maintain a pyramid of min/max/mean
+    envelopes at power-of-two decimation levels, so that any part of a long
+    recording can be drawn at any zoom without reading the raw samples.
+
+    Files are flushed (made visible to a RecordingReader) every
+    `flush_interval` seconds and on close. flush_interval = 0 flushes after
+    every chunk, None only on close.
+    '''
+
+    def __init__(
+            self,
+            path: str,
+            num_channels: int,
+            sample_rate: float,
+            dtype = np.float64,
+            base_level: int = 6,
+            top_level: int = 24,
+            packed: bool = False,
+            flush_interval: Optional[float] = 1.0
+        ) -> None:
+
+        self.path = path
+        self.num_channels = num_channels
+        # digital lines are stored 8 per byte and enveloped as 0/1 values
+        self.packed = packed
+        self.dtype = np.dtype(np.uint8 if packed else dtype)
+        self.levels = list(range(base_level, top_level + 1))
+        self.num_samples = 0
+        self.flush_interval = flush_interval
+        self._last_flush = time.monotonic()
+
+        with open(path + '.json', 'w') as f:
+            json.dump({
+                'num_channels': num_channels,
+                'sample_rate': sample_rate,
+                'dtype': self.dtype.str,
+                'levels': self.levels,
+                'packed': packed
+            }, f)
+
+        self.data_file = open(path + '.dat', 'wb')
+        self.envelope_files = {level: open(f'{path}.env{level}.dat', 'wb') for level in self.levels}
+
+        # samples (or bins) not yet forming a complete bin, per level
+        self._pending_samples = np.empty((0, num_channels), dtype=self.dtype)
+        self._pending_bins = {level: np.empty((0, 3, num_channels)) for level in self.levels[1:]}
+
+    def write(self, chunk) -> None:
+        """Append a (num_samples, num_channels) array, or a PackedDigital chunk for digital recordings"""
+
+        if self.packed:
+            if not isinstance(chunk, PackedDigital):
+                chunk = pack(np.asarray(chunk))
+            self.data_file.write(np.ascontiguousarray(chunk.words).tobytes())
+            chunk = unpack(chunk, np.uint8)
+        else:
+            if chunk.ndim == 1:
+                chunk = chunk[:, np.newaxis]
+            chunk = np.ascontiguousarray(chunk, dtype=self.dtype)
+            self.data_file.write(chunk.tobytes())
+
+        self.num_samples += len(chunk)
+
+        # base level from raw samples
+        bin_size = 1 << self.levels[0]
+        samples = np.concatenate((self._pending_samples, chunk)) if len(self._pending_samples) else chunk
+        num_full = len(samples) // bin_size * bin_size
+        self._pending_samples = samples[num_full:].copy()
+
+        full = samples[:num_full].reshape(-1, bin_size, self.num_channels)
+        bins = np.empty((len(full), 3, self.num_channels))
+        bins[:, MIN] = full.min(axis=1)
+        bins[:, MAX] = full.max(axis=1)
+        bins[:, MEAN] = full.mean(axis=1)
+        self._append(self.levels[0], bins)
+
+        # each level from pairs of bins of the level below
+        for level in self.levels[1:]:
+            if not len(bins):
+                break
+            bins = np.concatenate((self._pending_bins[level], bins))
+            num_full = len(bins) // 2 * 2
+            self._pending_bins[level] = bins[num_full:]
+            bins = _reduce(bins[:num_full], 2)
+            self._append(level, bins)
+
+        if self.flush_interval is not None and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def _append(self, level: int, bins: np.ndarray) -> None:
+        if len(bins):
+            self.envelope_files[level].write(bins.tobytes())
+
+    def flush(self) -> None:
+        self.data_file.flush()
+        for f in self.envelope_files.values():
+            f.flush()
+        self._last_flush = time.monotonic()
+
+    def close(self) -> None:
+        self.data_file.close()
+        for f in self.envelope_files.values():
+            f.close()
+        logger.info(f"Recorded {self.num_samples} samples to {self.path}")
+
+class RecordingReader:
+    '''
+    Read a recording, possibly while it is still being written.
+    `envelope` returns about `num_bins` to 2*`num_bins` bins for any range,
+    reading a number of values proportional to num_bins, not to the length
+    of the range.
+    '''
+
+    def __init__(self, path: str) -> None:
+
+        self.path = path
+        with open(path + '.json') as f:
+            meta = json.load(f)
+
+        self.num_channels = meta['num_channels']
+        self.sample_rate = meta['sample_rate']
+        self.dtype = np.dtype(meta['dtype'])
+        self.levels = meta['levels']
+        self.packed = meta.get('packed', False)
+        self._bin_bytes = 3 * self.num_channels * 8
+        self._sample_bytes = num_bytes(self.num_channels) if self.packed else self.num_channels * self.dtype.itemsize
+
+    @property
+    def num_samples(self) -> int:
+        return os.path.getsize(self.path + '.dat') // self._sample_bytes
+
+    def _num_bins(self, level: int) -> int:
+        return os.path.getsize(f'{self.path}.env{level}.dat') // self._bin_bytes
+
+    def samples(self, start: int, stop: int) -> np.ndarray:
+        start = max(start, 0)
+        stop = min(stop, self.num_samples)
+        count = max(stop - start, 0)
+        if self.packed:
+            return unpack(self.packed_samples(start, stop), np.uint8)
+        data = np.fromfile(
+            self.path + '.dat',
+            dtype=self.dtype,
+            count=count * self.num_channels,
+            offset=start * self._sample_bytes
+        )
+        return data.reshape(-1, self.num_channels)
+
+    def packed_samples(self, start: int, stop: int) -> PackedDigital:
+        """Digital recordings only: samples as stored, e.g. to find transitions without unpacking"""
+
+        if not self.packed:
+            raise ValueError(f'{self.path} is not a digital recording')
+        start = max(start, 0)
+        stop = min(stop, self.num_samples)
+        count = max(stop - start, 0)
+        data = np.fromfile(
+            self.path + '.dat',
+            dtype=np.uint8,
+            count=count * self._sample_bytes,
+            offset=start * self._sample_bytes
+        )
+        return PackedDigital(data.reshape(-1, self._sample_bytes), self.num_channels)
+
+    def _bins(self, level: int, start: int, stop: int) -> np.ndarray:
+        data = np.fromfile(
+            f'{self.path}.env{level}.dat',
+            dtype=np.float64,
+            count=(stop - start) * 3 * self.num_channels,
+            offset=start * self._bin_bytes
+        )
+        return data.reshape(-1, 3, self.num_channels)
+
+    def _summary(self, start: int, stop: int) -> np.ndarray:
+        # min/max/mean over any range from the coarsest complete bins, like a segment tree:
+        # O(number of levels) reads plus less than one base bin of raw samples
+        parts: List[np.ndarray] = []
+        counts: List[int] = []
+        self._decompose(start, stop, len(self.levels) - 1, parts, counts)
+
+        stacked = np.stack(parts)
+        out = np.empty((3, self.num_channels))
+        out[MIN] = stacked[:, MIN].min(axis=0)
+        out[MAX] = stacked[:, MAX].max(axis=0)
+        out[MEAN] = np.average(stacked[:, MEAN], axis=0, weights=counts)
+        return out
+
+    def _decompose(self, start: int, stop: int, i: int, parts: List[np.ndarray], counts: List[int]) -> None:
+
+        if start >= stop:
+            return
+
+        if i < 0:
+            data = self.samples(start, stop)
+            if len(data):
+                parts.append(np.stack((data.min(axis=0), data.max(axis=0), data.mean(axis=0))))
+                counts.append(len(data))
+            return
+
+        level = self.levels[i]
+        size = 1 << level
+        first = -(-start // size)
+        last = min(stop // size, self._num_bins(level))
+        if first >= last:
+            self._decompose(start, stop, i - 1, parts, counts)
+            return
+
+        self._decompose(start, first * size, i - 1, parts, counts)
+        parts.append(_reduce(self._bins(level, first, last), last - first)[0])
+        counts.append((last - first) * size)
+        self._decompose(last * size, stop, i - 1, parts, counts)
+
+    def envelope(self, start: int, stop: int, num_bins: int) -> Envelope:
+        '''
+        Envelope of samples [start, stop) with at least num_bins bins
+        (typically the width of the plot in pixels). When zoomed in below
+        the finest level, raw samples are returned (min = max = mean).
+        '''
+
+        start = max(start, 0)
+        stop = min(stop, self.num_samples)
+        if stop <= start:
+            empty = np.empty((0, self.num_channels))
+            return Envelope(np.empty(0, dtype=np.int64), empty, empty, empty)
+
+        samples_per_bin = (stop - start) / num_bins
+        usable = [level for level in self.levels if (1 << level) <= samples_per_bin]
+
+        if not usable:
+            data = self.samples(start, stop).astype(np.float64)
+            return Envelope(np.arange(start, stop), data, data, data)
+
+        level = usable[-1]
+        size = 1 << level
+        first = -(-start // size)
+        last = max(min(stop // size, self._num_bins(level)), first)
+
+        index = [np.arange(first, last) * size]
+        bins = [self._bins(level, first, last)]
+
+        # partial bins at both ends, and the end of the range that has not reached this level yet
+        if start < first * size:
+            index.insert(0, [start])
+            bins.insert(0, self._summary(start, min(first * size, stop))[np.newaxis])
+        if last * size < stop and last * size >= start:
+            index.append([last * size])
+            bins.append(self._summary(last * size, stop)[np.newaxis])
+
+        index = np.concatenate(index).astype(np.int64)
+        bins = np.concatenate(bins)
+        return Envelope(index, bins[:, MIN], bins[:, MAX], bins[:, MEAN])
+
+class RecordingHandler(DataHandler):
+    """ Record data read from DAQ to disk, with envelopes for fast display """
+
+    def __init__(
+            self,
+            path: str,
+            num_channels: int,
+            sample_rate: float,
+            *args,
+            recorder_kwargs: Optional[dict] = None,
+            **kwargs
+        ):
+        super().__init__(*args, **kwargs)
+        self.path = path
+        self.num_channels = num_channels
+        self.sample_rate = sample_rate
+        self.recorder_kwargs = recorder_kwargs or {}
+
+    def initialize(self):
+        self.recorder = Recorder(self.path, self.num_channels, self.sample_rate, **self.recorder_kwargs)
+
+    def handle_data(self, data):
+        self.recorder.write(data)
+
+    def cleanup(self):
+        self.recorder.close()
@@ -0,0 +1,339 @@
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+import time
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+# A pulse sequence is compiled into sample-clock output buffers:
+#   digital   (num_samples,) uint32 port words, line i is bit i
+#   analog    (num_samples, num_analog_channels) float64 volts
+# The sequence is kept as runs of constant output (a table of distinct
+# output states plus run lengths) and runs that repeat back to back are
+# grouped in segments (block of runs x count), so samples are only rendered
+# chunk by chunk when they are output, or once per period when the whole
+# sequence is periodic and can be regenerated by the device.
+
+class OutputChunk(NamedTuple):
+    digital: Optional[np.ndarray] # (num_samples,) uint32
+    analog: Optional[np.ndarray] # (num_samples, num_analog_channels)
+
+    def __len__(self) -> int:
+        return len(self.digital) if self.digital is not None else len(self.analog)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(x.nbytes for x in self if x is not None)
+
+class Segment(NamedTuple):
+    start: int # first sample
+    ids: np.ndarray # output state of each run of the block
+    lengths: np.ndarray # length of each run of the block, in samples
+    count: int # number of times the block is repeated
+    extra: int = 0 # samples of a last, incomplete repetition
+
+    @property
+    def block_size(self) -> int:
+        return int(self.lengths.sum())
+
+    @property
+    def num_samples(self) -> int:
+        return self.block_size * self.count + self.extra
+
+@dataclass
+class CompileReport:
+    compile_time: float = 0.0
+    num_samples: int = 0
+    num_runs: int = 0
+    num_segments: int = 0
+    periodic_samples: int = 0 # samples in repeated blocks
+    table_bytes: int = 0 # compiled representation
+    full_bytes: int = 0 # size of the fully rendered buffers
+    buffer_bytes: int = 0 # memory used by the output buffers, set when output
+
+    def __str__(self) -> str:
+        buffers = f', output buffers {self.buffer_bytes/1e3:.1f}kB' if self.buffer_bytes else ''
+        return (
+            f'{self.num_samples} samples compiled in {1e3*self.compile_time:.1f}ms: '
+            f'{self.num_runs} runs, {self.num_segments} segment(s), '
+            f'{100*self.periodic_samples/max(self.num_samples, 1):.1f}% periodic, '
+            f'compiled {self.table_bytes/1e3:.1f}kB{buffers} '
+            f'(fully rendered {self.full_bytes/1e6:.1f}MB)'
+        )
+
+class CompiledSequence:
+
+    def __init__(
+            self,
+            sample_rate: float,
+            digital_lines: List[int],
+            analog_channels: List[int],
+            words: np.ndarray,
+            levels: np.ndarray,
+            segments: List[Segment],
+            report: CompileReport
+        ) -> None:
+
+        self.sample_rate = sample_rate
+        self.digital_lines = digital_lines
+        self.analog_channels = analog_channels
+        self.words = words # port word of each output state
+        self.levels = levels # analog levels of each output state
+        self.segments = segments
+        self.report = report
+        self._segment_starts = np.array([s.start for s in segments], dtype=np.int64)
+        # start of each run within its block
+        self._run_starts = [np.concatenate(([0], np.cumsum(s.lengths)[:-1])) for s in segments]
+
+    @property
+    def num_samples(self) -> int:
+        return self.report.num_samples
+
+    @property
+    def periodic(self) -> bool:
+        """The whole sequence is one block repeated: one period can be uploaded and regenerated"""
+        return len(self.segments) == 1 and self.segments[0].count > 1
+
+    def _states(self, start: int, stop: int) -> np.ndarray:
+        # output state id of samples [start, stop)
+        ids = np.empty(stop - start, dtype=np.intp)
+        first = max(np.searchsorted(self._segment_starts, start, 'right') - 1, 0)
+        for i in range(first, len(self.segments)):
+            segment = self.segments[i]
+            if segment.start >= stop:
+                break
+            a = max(start, segment.start)
+            b = min(stop, segment.start + segment.num_samples)
+            position = np.arange(a - segment.start, b - segment.start) % segment.block_size
+            run = np.searchsorted(self._run_starts[i], position, 'right') - 1
+            ids[a - start:b - start] = segment.ids[run]
+        return ids
+
+    def render(self, start: int, stop: int) -> OutputChunk:
+        """Output samples [start, stop)"""
+
+        start = max(start, 0)
+        stop = min(stop, self.num_samples)
+        ids = self._states(start, max(start, stop))
+        return OutputChunk(
+            self.words[ids] if self.digital_lines else None,
+            self.levels[ids] if self.analog_channels else None
+        )
+
+    def chunks(self, chunk_size: int) -> Iterator[OutputChunk]:
+        for start in range(0, self.num_samples, chunk_size):
+            yield self.render(start, start + chunk_size)
+
+    def period(self, min_size: int = 0) -> OutputChunk:
+        '''
+        One block of a periodic sequence (the whole sequence otherwise), repeated
+        to at least min_size samples: a buffer to upload once and regenerate.
+        '''
+
+        block = self.segments[0].block_size if self.periodic else self.num_samples
+        repeats = max(-(-min_size // block), 1)
+        ids = self._states(0, block)
+        ids = np.tile(ids, repeats)
+        return OutputChunk(
+            self.words[ids] if self.digital_lines else None,
+            self.levels[ids] if self.analog_channels else None
+        )
+
+def _unique_rows(a: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # np.unique(a, axis=0, return_inverse=True), much faster for many rows and few columns
+    order = np.lexsort(a.T[::-1])
+    ordered = a[order]
+    new = np.concatenate(([True], np.any(ordered[1:] != ordered[:-1], axis=1)))
+    inverse = np.empty(len(a), dtype=np.intp)
+    inverse[order] = np.cumsum(new) - 1
+    return ordered[new], inverse
+
+def _find_repeats(symbols: np.ndarray, lengths: np.ndarray, max_block: int, min_repeats: int) -> List[Tuple[int, int, int]]:
+    '''
+    Split a sequence of runs in (first run, runs per block, count), preferring
+    blocks of up to max_block runs repeated back to back that cover the most samples.
+    '''
+
+    num_runs = len(symbols)
+    cumulative = np.concatenate(([0], np.cumsum(lengths)))
+
+    candidates = []
+    for k in range(1, min(max_block, num_runs // 2) + 1):
+        # runs of symbols equal to the symbol k further are k-periodic stretches
+        same = np.concatenate(([False], symbols[k:] == symbols[:-k], [False])).astype(np.int8)
+        change = np.diff(same)
+        starts = np.flatnonzero(change == 1)
+        stops = np.flatnonzero(change == -1)
+        counts = (stops - starts + k) // k
+        keep = counts >= min_repeats
+        starts, counts = starts[keep], counts[keep]
+        coverage = cumulative[starts + counts * k] - cumulative[starts]
+        candidates.extend(zip(coverage.tolist(), [k] * len(starts), starts.tolist(), counts.tolist()))
+
+    taken = np.zeros(num_runs, dtype=bool)
+    chosen = []
+    for coverage, k, first, count in sorted(candidates, key=lambda c: (-c[0], c[1])):
+        if not taken[first:first + k * count].any():
+            taken[first:first + k * count] = True
+            chosen.append((first, k, count))
+    chosen.sort()
+
+    # runs in between are not repeated
+    parts = []
+    position = 0
+    for first, k, count in chosen + [(num_runs, 0, 0)]:
+        if first > position:
+            parts.append((position, first - position, 1))
+        if count:
+            parts.append((first, k, count))
+        position = first + k * count
+    return parts
+
+def _merge_tails(segments: List[Segment]) -> List[Segment]:
+    # runs after a repeated block that are the beginning of the block
+    # (e.g. a pulse train cut after its last pulse) become part of it
+    merged: List[Segment] = []
+    for segment in segments:
+        if merged and merged[-1].count > 1 and not merged[-1].extra and segment.count == 1:
+            block = merged[-1]
+            k = len(segment.ids)
+            if (
+                k <= len(block.ids)
+                and np.array_equal(segment.ids, block.ids[:k])
+                and np.array_equal(segment.lengths[:-1], block.lengths[:k - 1])
+                and segment.lengths[-1] <= block.lengths[k - 1]
+            ):
+                merged[-1] = block._replace(extra=int(segment.lengths.sum()))
+                continue
+        merged.append(segment)
+    return merged
+
+class PulseSequence:
+    '''
+    Digital and analog output described channel by channel, with times in
+    seconds from the start of the sequence. Outputs start LOW / at 0V and keep
+    their value until the next change. When several changes of a channel fall
+    on the same sample, the last one added wins.
+
+        seq = PulseSequence(sample_rate=100_000)
+        seq.digital_pulse(0, start=0.1, width=1e-3, period=10e-3, count=1000)
+        seq.analog(0, time=0.05, value=2.5)
+        compiled = seq.compile(duration=12)
+    '''
+
+    def __init__(self, sample_rate: float) -> None:
+        self.sample_rate = sample_rate
+        self._digital: Dict[int, List[Tuple[np.ndarray, np.ndarray]]] = {}
+        self._analog: Dict[int, List[Tuple[np.ndarray, np.ndarray]]] = {}
+
+    def _add(self, table, channel: int, times, values) -> None:
+        times = np.atleast_1d(np.asarray(times, dtype=np.float64))
+        values = np.broadcast_to(np.asarray(values, dtype=np.float64), times.shape)
+        table.setdefault(channel, []).append((times, values))
+
+    def digital(self, line: int, time: float, value: bool) -> None:
+        """Set a digital line at an absolute time (times can be an array)"""
+        self._add(self._digital, line, time, float(bool(value)) if np.isscalar(value) else np.asarray(value, dtype=bool))
+
+    def analog(self, channel: int, time: float, value: float) -> None:
+        """Set an analog output at an absolute time (times and values can be arrays)"""
+        self._add(self._analog, channel, time, value)
+
+    @staticmethod
+    def _train(start: float, width: float, period: Optional[float], count: int) -> Tuple[np.ndarray, np.ndarray]:
+        if count > 1 and (period is None or width >= period):
+            raise ValueError('repeated pulses need a period longer than the pulse width')
+        starts = start + np.arange(count) * (period or 0)
+        return starts, starts + width
+
+    def digital_pulse(self, line: int, start: float, width: float, period: Optional[float] = None, count: int = 1) -> None:
+        """HIGH for `width` seconds from `start`, repeated `count` times every `period` seconds"""
+        rising, falling = self._train(start, width, period, count)
+        self.digital(line, np.stack((rising, falling), axis=1).ravel(), np.tile([True, False], count))
+
+    def analog_pulse(
+            self,
+            channel: int,
+            start: float,
+            width: float,
+            value: float,
+            baseline: float = 0.0,
+            period: Optional[float] = None,
+            count: int = 1
+        ) -> None:
+        rising, falling = self._train(start, width, period, count)
+        self.analog(channel, np.stack((rising, falling), axis=1).ravel(), np.tile([value, baseline], count))
+
+    def compile(self, duration: Optional[float] = None, max_block: int = 64, min_repeats: int = 2) -> CompiledSequence:
+        '''
+        duration: length of the sequence, by default up to the last change.
+        max_block: longest repeated block searched, in runs of constant output.
+        '''
+
+        start_time = time.perf_counter()
+        rate = self.sample_rate
+        if not self._digital and not self._analog:
+            raise ValueError('empty sequence')
+
+        columns = [(self._digital, line) for line in sorted(self._digital)] + [(self._analog, ch) for ch in sorted(self._analog)]
+        samples, values = [], []
+        for table, channel in columns:
+            times = np.concatenate([t for t, v in table[channel]])
+            vals = np.concatenate([v for t, v in table[channel]])
+            s = np.round(times * rate).astype(np.int64)
+            order = np.argsort(s, kind='stable') # keeps the order of addition on the same sample
+            s, vals = s[order], vals[order]
+            last = np.append(s[1:] != s[:-1], True)
+            samples.append(s[last])
+            values.append(vals[last])
+
+        end = max((s[-1] + 1 for s in samples if len(s)), default=1)
+        if duration is not None:
+            end = int(round(duration * rate))
+        if end < 1:
+            raise ValueError('empty sequence')
+
+        # output state on every change
+        changes = np.unique(np.concatenate([[0]] + [s[(s >= 0) & (s < end)] for s in samples]))
+        state = np.zeros((len(changes), len(columns)))
+        for i, (s, v) in enumerate(zip(samples, values)):
+            index = np.searchsorted(s, changes, 'right') - 1
+            state[:, i] = np.where(index >= 0, v[np.maximum(index, 0)], 0.0)
+
+        # merge changes that leave the output as it was
+        keep = np.concatenate(([True], np.any(state[1:] != state[:-1], axis=1)))
+        changes, state = changes[keep], state[keep]
+        lengths = np.diff(np.append(changes, end))
+
+        table, ids = _unique_rows(state)
+        digital_lines = sorted(self._digital)
+        analog_channels = sorted(self._analog)
+        words = np.zeros(len(table), dtype=np.uint32)
+        for i, line in enumerate(digital_lines):
+            words |= (table[:, i] > 0.5).astype(np.uint32) << np.uint32(line)
+        levels = np.ascontiguousarray(table[:, len(digital_lines):])
+
+        # one symbol per distinct (state, length) run
+        symbols = ids.astype(np.int64) * (int(lengths.max()) + 1) + lengths
+        segments = []
+        for first, k, count in _find_repeats(symbols, lengths, max_block, min_repeats):
+            segments.append(Segment(
+                int(changes[first]),
+                ids[first:first + k].copy(),
+                lengths[first:first + k].copy(),
+                count
+            ))
+        segments = _merge_tails(segments)
+
+        report = CompileReport(
+            compile_time = time.perf_counter() - start_time,
+            num_samples = end,
+            num_runs = len(lengths),
+            num_segments = len(segments),
+            periodic_samples = sum(s.num_samples for s in segments if s.count > 1),
+            table_bytes = words.nbytes + levels.nbytes + sum(s.ids.nbytes + s.lengths.nbytes for s in segments),
+            full_bytes = end * (4 * bool(digital_lines) + 8 * len(analog_channels))
+        )
+        logger.info(f'Pulse sequence: {report}')
+        return CompiledSequence(rate, digital_lines, analog_channels, words, levels, segments, report)
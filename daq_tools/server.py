@@ -0,0 +1,405 @@
+from .core import SoftwareTimingDAQ, BoardInfo, IOMethod, IOOperation, serialized, coalesced
+from .metrics import LatencyStats
+from enum import IntEnum
+from typing import Dict, List, NamedTuple, Optional, Sequence, Set, Tuple
+import json
+import math
+import os
+import selectors
+import socket
+import struct
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Binary protocol, little endian, over a Unix domain stream socket.
+# request:  header (message type, request id, count) + count operations
+# response: header (status, request id, count) + count float64 results,
+#           or count bytes of utf-8 text (error message, board info as json)
+HEADER = struct.Struct('<BIH')
+OPERATION = struct.Struct('<BHd')
+RESULT = struct.Struct('<d')
+
+class MessageType(IntEnum):
+    EXECUTE = 0
+    INFO = 1
+    RESET = 2
+
+class Status(IntEnum):
+    OK = 0
+    ERROR = 1
+
+class DeviceServerError(Exception):
+    """Exception raised when the device server could not run a request."""
+    pass
+
+class _Request(NamedTuple):
+    conn: socket.socket
+    message_type: MessageType
+    request_id: int
+    operations: List[IOOperation]
+
+class DeviceServer:
+    '''
+    Own a SoftwareTimingDAQ and share it with other processes.
+
+    Clients (see DeviceClient) connect to a Unix domain socket. Every time
+    the device is free, all the requests received from all clients in the
+    meantime are merged in a single `execute` call on the board, so that
+    concurrent clients share device transactions instead of queueing
+    behind each other.
+
+    Operations on channels the board does not list, or with values it can't
+    output (`check_operation`), are rejected when they are received.
+    Requests the board can't run together (`can_batch`) go in separate calls.
+    If a merged batch still fails, its requests are run again one at a time,
+    in the order they came, so that each client gets its own outcome: writes
+    that were already applied are written again with the same value.
+
+    The server does not close the board, this is left to the owner.
+    '''
+
+    def __init__(
+            self,
+            daq: SoftwareTimingDAQ,
+            address: str,
+            poll_interval: float = 0.1
+        ) -> None:
+
+        self.daq = daq
+        self.address = address
+        self.poll_interval = poll_interval
+
+        self.num_transactions = 0
+        self.num_commands = 0
+        self.transaction_time = LatencyStats()
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._buffers: Dict[socket.socket, bytearray] = {}
+        self._channels: Dict[IOMethod, Set[int]] = {}
+
+    def start(self) -> None:
+        """Serve from a background thread"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+
+    def shutdown(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def serve_forever(self) -> None:
+
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self.address)
+        listener.listen()
+        logger.info(f"Device server for board {self.daq.board_id} listening on {self.address}")
+
+        info = self._info()
+        self._channels = {
+            IOMethod.DIGITAL_READ: set(info['digital_input']),
+            IOMethod.DIGITAL_WRITE: set(info['digital_output']),
+            IOMethod.ANALOG_READ: set(info['analog_input']),
+            IOMethod.ANALOG_WRITE: set(info['analog_output']),
+            IOMethod.PWM_READ: set(info['pwm_input']),
+            IOMethod.PWM_WRITE: set(info['pwm_output']),
+        }
+
+        selector = selectors.DefaultSelector()
+        selector.register(listener, selectors.EVENT_READ)
+        self._stop.clear()
+
+        try:
+            while not self._stop.is_set():
+                pending: List[_Request] = []
+                for key, _ in selector.select(timeout=self.poll_interval):
+                    if key.fileobj is listener:
+                        conn, _ = listener.accept()
+                        selector.register(conn, selectors.EVENT_READ)
+                        self._buffers[conn] = bytearray()
+                        logger.debug("Client connected")
+                    else:
+                        pending.extend(self._receive(key.fileobj, selector))
+
+                if pending:
+                    self._process(pending)
+
+        finally:
+            for conn in list(self._buffers):
+                selector.unregister(conn)
+                conn.close()
+            self._buffers.clear()
+            selector.close()
+            listener.close()
+            os.unlink(self.address)
+            logger.info(f"Device server on {self.address} stopped")
+
+    def _receive(self, conn: socket.socket, selector: selectors.BaseSelector) -> List[_Request]:
+
+        try:
+            data = conn.recv(65536)
+        except OSError as e:
+            # e.g. connection reset, only this client is affected
+            logger.warning(f"Receive failed ({e}), dropping client")
+            data = b''
+        if not data:
+            selector.unregister(conn)
+            del self._buffers[conn]
+            conn.close()
+            logger.debug("Client disconnected")
+            return []
+
+        buffer = self._buffers[conn]
+        buffer.extend(data)
+
+        requests = []
+        offset = 0
+        while len(buffer) - offset >= HEADER.size:
+            message_type, request_id, count = HEADER.unpack_from(buffer, offset)
+            if message_type not in MessageType._value2member_map_:
+                # the size of the message is unknown, the stream can't be resynchronized
+                logger.warning(f"Unknown message type {message_type}, dropping client")
+                selector.unregister(conn)
+                del self._buffers[conn]
+                conn.close()
+                return requests
+            message_type = MessageType(message_type)
+
+            payload_size = count * OPERATION.size if message_type == MessageType.EXECUTE else 0
+            end = offset + HEADER.size + payload_size
+            if len(buffer) < end:
+                break
+
+            req = _Request(conn, message_type, request_id, [])
+            try:
+                for method, channel, value in OPERATION.iter_unpack(buffer[offset + HEADER.size:end]):
+                    req.operations.append(self._check(method, channel, value))
+                requests.append(req)
+            except ValueError as e:
+                logger.warning(f"Invalid request: {e}")
+                self._reply_text(req, Status.ERROR, str(e))
+            offset = end
+
+        del buffer[:offset]
+        return requests
+
+    def _check(self, method: int, channel: int, value: float) -> IOOperation:
+        """Reject what the board can't do before it reaches a batch"""
+
+        if method not in IOMethod._value2member_map_:
+            raise ValueError(f"Unknown method {method}")
+        method = IOMethod(method)
+        if channel not in self._channels[method]:
+            raise ValueError(f"{method} not supported on channel {channel}")
+        operation = IOOperation(method, channel, value)
+        self.daq.check_operation(operation)
+        return operation
+
+    def _execute(self, operations: List[IOOperation]) -> List[Optional[float]]:
+        start = time.perf_counter()
+        results = self.daq.execute(operations)
+        self.transaction_time.add(time.perf_counter() - start)
+        self.num_transactions += 1
+        self.num_commands += len(operations)
+        return results
+
+    def _process(self, requests: List[_Request]) -> None:
+
+        group: List[_Request] = []
+        for req in requests:
+            if req.message_type != MessageType.EXECUTE:
+                continue
+            if group and not self.daq.can_batch([op for r in group + [req] for op in r.operations]):
+                self._run(group)
+                group = []
+            group.append(req)
+        if group:
+            self._run(group)
+
+        for req in requests:
+            try:
+                if req.message_type == MessageType.INFO:
+                    self._reply_text(req, Status.OK, json.dumps(self._info()))
+                elif req.message_type == MessageType.RESET:
+                    self.daq.reset_state()
+                    self._reply_results(req, [])
+            except Exception as e:
+                self._reply_text(req, Status.ERROR, str(e))
+
+    def _run(self, group: List[_Request]) -> None:
+
+        try:
+            results = self._execute([op for req in group for op in req.operations])
+        except Exception as e:
+            if len(group) == 1:
+                logger.warning(f"Request failed: {e}")
+                self._reply_text(group[0], Status.ERROR, str(e))
+                return
+            # part of the batch may have been applied, find out which requests
+            # fail instead of failing them all
+            logger.warning(f"Batch of {len(group)} requests failed ({e}), running them one at a time")
+            for req in group:
+                self._run([req])
+            return
+
+        start = 0
+        for req in group:
+            stop = start + len(req.operations)
+            self._reply_results(req, results[start:stop])
+            start = stop
+
+    def _info(self) -> Dict:
+        return {
+            'id': self.daq.board_id,
+            'analog_input': self.daq.list_analog_input_channels(),
+            'analog_output': self.daq.list_analog_output_channels(),
+            'digital_input': self.daq.list_digital_input_channels(),
+            'digital_output': self.daq.list_digital_output_channels(),
+            'pwm_input': self.daq.list_pwm_input_channels(),
+            'pwm_output': self.daq.list_pwm_output_channels(),
+        }
+
+    def _send(self, conn: socket.socket, data: bytes) -> None:
+        try:
+            conn.sendall(data)
+        except OSError:
+            logger.debug("Could not reply, client gone")
+
+    def _reply_results(self, req: _Request, results: Sequence[Optional[float]]) -> None:
+        data = bytearray(HEADER.pack(Status.OK, req.request_id, len(results)))
+        for res in results:
+            data += RESULT.pack(math.nan if res is None else float(res))
+        self._send(req.conn, data)
+
+    def _reply_text(self, req: _Request, status: Status, text: str) -> None:
+        payload = text.encode()[:65535]
+        self._send(req.conn, HEADER.pack(status, req.request_id, len(payload)) + payload)
+
+class DeviceClient(SoftwareTimingDAQ):
+    '''
+    Use a board owned by a DeviceServer in another process.
+    The board id is the address of the server socket.
+    Closing the client only closes the connection, the board stays
+    under the control of the server.
+    '''
+
+    def __init__(self, *args, **kwargs) -> None:
+
+        super().__init__(*args, **kwargs)
+
+        self._socket_lock = threading.Lock() # one request in flight, the device lock is separate
+        self._request_id = 0
+        self._info: Optional[Dict] = None
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.board_id)
+        self._closed = False
+        logger.info(f"Connected to device server {self.board_id}")
+
+    def _recv_exactly(self, size: int) -> bytes:
+        data = bytearray()
+        while len(data) < size:
+            chunk = self.sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("Device server closed the connection")
+            data += chunk
+        return bytes(data)
+
+    def _request(
+            self,
+            message_type: MessageType,
+            operations: Sequence[IOOperation] = ()
+        ) -> Tuple[int, bytes]:
+
+        with self._socket_lock:
+            self._request_id = (self._request_id + 1) & 0xFFFFFFFF
+            data = bytearray(HEADER.pack(message_type, self._request_id, len(operations)))
+            for method, channel, value in operations:
+                data += OPERATION.pack(method, channel, value)
+            self.sock.sendall(data)
+
+            status, request_id, count = HEADER.unpack(self._recv_exactly(HEADER.size))
+            if status == Status.OK and message_type != MessageType.INFO:
+                payload = self._recv_exactly(count * RESULT.size)
+            else:
+                payload = self._recv_exactly(count)
+
+        if request_id != self._request_id:
+            raise DeviceServerError(f"Unexpected reply {request_id} to request {self._request_id}")
+        if status != Status.OK:
+            raise DeviceServerError(payload.decode())
+        return count, payload
+
+    @serialized
+    def execute(self, operations: Sequence[IOOperation]) -> List[Optional[float]]:
+        _, payload = self._request(MessageType.EXECUTE, operations)
+        self._record_outputs(operations)
+        return [
+            None if method.is_write else res
+            for (method, _, _), (res,) in zip(operations, RESULT.iter_unpack(payload))
+        ]
+
+    def digital_read(self, channel: int) -> float:
+        return self.execute([IOOperation(IOMethod.DIGITAL_READ, channel)])[0]
+
+    @coalesced
+    def digital_write(self, channel: int, val: bool) -> None:
+        self.execute([IOOperation(IOMethod.DIGITAL_WRITE, channel, val)])
+
+    @coalesced
+    def pwm_write(self, channel: int, duty_cycle: float) -> None:
+        self.execute([IOOperation(IOMethod.PWM_WRITE, channel, duty_cycle)])
+
+    def analog_read(self, channel: int) -> float:
+        return self.execute([IOOperation(IOMethod.ANALOG_READ, channel)])[0]
+
+    @coalesced
+    def analog_write(self, channel: int, val: float) -> None:
+        self.execute([IOOperation(IOMethod.ANALOG_WRITE, channel, val)])
+
+    def close(self) -> None:
+        if self._closed:
+            return
+
+        logger.info(f"Disconnecting from device server {self.board_id}")
+        self.stop_edge_watcher()
+        self.sock.close()
+        self._closed = True
+
+    def reset_state(self) -> None:
+        self._request(MessageType.RESET)
+
+    def info(self) -> Dict:
+        if self._info is None:
+            _, payload = self._request(MessageType.INFO)
+            self._info = json.loads(payload.decode())
+        return self._info
+
+    @classmethod
+    def list_boards(cls) -> List[BoardInfo]:
+        # servers are not discoverable, connect to a known address
+        return []
+
+    def list_analog_output_channels(self) -> List[int]:
+        return self.info()['analog_output']
+
+    def list_analog_input_channels(self) -> List[int]:
+        return self.info()['analog_input']
+
+    def list_digital_input_channels(self) -> List[int]:
+        return self.info()['digital_input']
+
+    def list_digital_output_channels(self) -> List[int]:
+        return self.info()['digital_output']
+
+    def list_pwm_output_channels(self) -> List[int]:
+        return self.info()['pwm_output']
+
+    def list_pwm_input_channels(self) -> List[int]:
+        return self.info()['pwm_input']
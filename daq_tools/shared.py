@@ -0,0 +1,87 @@
+from multiprocessing import shared_memory
+from contextlib import contextmanager
+from typing import Optional, Tuple
+import numpy as np
+import os
+
+class SeqlockArray:
+    '''
+    NumPy array in shared memory with a single writer and any number of
+    lock-free readers. The writer bumps a sequence counter before and after
+    each update (odd while writing), readers retry until they copied the
+    array between two identical even counter values, so they always get a
+    consistent snapshot and never block the writer.
+
+    Relies on stores and loads not being reordered (x86, and numpy copies
+    being plain memory copies).
+    '''
+
+    def __init__(
+            self,
+            shape: Tuple[int, ...],
+            dtype = np.float64,
+            name: Optional[str] = None,
+            create: bool = True
+        ) -> None:
+
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        data_size = int(np.prod(self.shape)) * self.dtype.itemsize
+        self._shm = shared_memory.SharedMemory(name=name, create=create, size=8 + data_size)
+        # a forked child inherits this object but does not own the memory
+        self._owner = os.getpid() if create else None
+
+        self._sequence = np.ndarray((1,), dtype=np.uint64, buffer=self._shm.buf, offset=0)
+        self._data = np.ndarray(self.shape, dtype=self.dtype, buffer=self._shm.buf, offset=8)
+        if create:
+            self._sequence[0] = 0
+            self._data[:] = 0
+
+    def __getstate__(self):
+        # other processes attach to the same memory instead of getting a copy
+        return (self.shape, self.dtype, self.name)
+
+    def __setstate__(self, state):
+        shape, dtype, name = state
+        self.__init__(shape, dtype, name=name, create=False)
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    @classmethod
+    def attach(cls, name: str, shape: Tuple[int, ...], dtype = np.float64) -> "SeqlockArray":
+        return cls(shape, dtype, name=name, create=False)
+
+    @contextmanager
+    def writing(self):
+        """Update the array in place, e.g. only some of its elements: with shared.writing() as data: ..."""
+        self._sequence[0] += 1
+        try:
+            yield self._data
+        finally:
+            self._sequence[0] += 1
+
+    def write(self, values: np.ndarray) -> None:
+        with self.writing() as data:
+            data[...] = values
+
+    def read(self, out: Optional[np.ndarray] = None, index = ...) -> Tuple[np.ndarray, int]:
+        """Return a consistent copy of the array (or of array[index]) and its version (number of writes)"""
+
+        if out is None:
+            out = np.empty(self._data[index].shape, dtype=self.dtype)
+        while True:
+            before = int(self._sequence[0])
+            if before & 1:
+                continue
+            out[...] = self._data[index]
+            if int(self._sequence[0]) == before:
+                return out, before >> 1
+
+    def close(self) -> None:
+        # drop our views before closing the mapping
+        del self._sequence, self._data
+        self._shm.close()
+        if self._owner == os.getpid():
+            self._shm.unlink()
@@ -0,0 +1,177 @@
+from .core import SoftwareTimingDAQ, BoardInfo, BoardType, IOMethod, IOOperation, serialized, coalesced
+from typing import Dict, List, Optional, Sequence
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Simulated_SoftTiming(SoftwareTimingDAQ):
+    '''
+    Board without hardware, useful for tests and benchmarks.
+    Every device transaction (a single call or a whole `execute` batch)
+    costs `latency` seconds, to mimic a USB round trip.
+    Inputs can be driven from the outside with `set_digital_input` and
+    `set_analog_input`.
+    '''
+
+    def __init__(
+            self,
+            *args,
+            latency: float = 0.0,
+            num_digital: int = 8,
+            num_analog_input: int = 8,
+            num_analog_output: int = 2,
+            num_pwm: int = 2,
+            **kwargs
+        ) -> None:
+
+        super().__init__(*args, **kwargs)
+
+        self.latency = latency
+        self.num_digital = num_digital
+        self.num_analog_input = num_analog_input
+        self.num_analog_output = num_analog_output
+        self.num_pwm = num_pwm
+
+        self.digital_input: Dict[int, bool] = {}
+        self.analog_input: Dict[int, float] = {}
+        self.digital_output: Dict[int, bool] = {}
+        self.analog_output: Dict[int, float] = {}
+        self.pwm_output: Dict[int, float] = {}
+        self.num_transactions = 0
+
+        self._closed = False
+        logger.info(f"Connected to simulated board {self.board_id}")
+        self.reset_state()
+
+    def _transaction(self) -> None:
+        self.num_transactions += 1
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+    def _check(self, channel: int, num: int) -> None:
+        if not (0 <= channel < num):
+            raise ValueError(f"Invalid channel {channel}. Valid channels are 0 to {num - 1}.")
+
+    def set_digital_input(self, channel: int, val: bool) -> None:
+        self._check(channel, self.num_digital)
+        self.digital_input[channel] = bool(val)
+
+    def set_analog_input(self, channel: int, val: float) -> None:
+        self._check(channel, self.num_analog_input)
+        self.analog_input[channel] = val
+
+    def _digital_read(self, channel: int) -> bool:
+        self._check(channel, self.num_digital)
+        return self.digital_input.get(channel, False)
+
+    def _digital_write(self, channel: int, val: bool) -> None:
+        self._check(channel, self.num_digital)
+        self.digital_output[channel] = bool(val)
+
+    def _pwm_write(self, channel: int, duty_cycle: float) -> None:
+        self._check(channel, self.num_pwm)
+        if not (0 <= duty_cycle <= 1):
+            raise ValueError('duty_cycle should be between 0 and 1')
+        self.pwm_output[channel] = duty_cycle
+
+    def _analog_read(self, channel: int) -> float:
+        self._check(channel, self.num_analog_input)
+        return self.analog_input.get(channel, 0.0)
+
+    def _analog_write(self, channel: int, val: float) -> None:
+        self._check(channel, self.num_analog_output)
+        self.analog_output[channel] = val
+
+    @serialized
+    def digital_read(self, channel: int) -> bool:
+        self._transaction()
+        return self._digital_read(channel)
+
+    @coalesced
+    def digital_write(self, channel: int, val: bool) -> None:
+        self._transaction()
+        self._digital_write(channel, val)
+
+    @coalesced
+    def pwm_write(self, channel: int, duty_cycle: float) -> None:
+        self._transaction()
+        self._pwm_write(channel, duty_cycle)
+
+    @serialized
+    def analog_read(self, channel: int) -> float:
+        self._transaction()
+        return self._analog_read(channel)
+
+    @coalesced
+    def analog_write(self, channel: int, val: float) -> None:
+        self._transaction()
+        self._analog_write(channel, val)
+
+    @serialized
+    def execute(self, operations: Sequence[IOOperation]) -> List[Optional[float]]:
+        # the whole batch is a single transaction
+        self._transaction()
+        results = []
+        for method, channel, value in operations:
+            if method == IOMethod.DIGITAL_READ:
+                results.append(self._digital_read(channel))
+            elif method == IOMethod.ANALOG_READ:
+                results.append(self._analog_read(channel))
+            elif method == IOMethod.DIGITAL_WRITE:
+                results.append(self._digital_write(channel, value))
+            elif method == IOMethod.ANALOG_WRITE:
+                results.append(self._analog_write(channel, value))
+            elif method == IOMethod.PWM_WRITE:
+                results.append(self._pwm_write(channel, value))
+            else:
+                raise NotImplementedError(f'{method} not supported')
+        self._record_outputs(operations)
+        return results
+
+    @serialized
+    def close(self) -> None:
+        if self._closed:
+            return
+
+        logger.info("Closing simulated board, setting outputs off")
+        self.stop_edge_watcher()
+        self.reset_state()
+        self._closed = True
+
+    @serialized
+    def reset_state(self) -> None:
+        self.reset_outputs()
+
+    @classmethod
+    def list_boards(cls) -> List[BoardInfo]:
+        with cls(0) as sim:
+            return [BoardInfo(
+                id = 0,
+                name = 'Simulated board',
+                board_type = BoardType.SIMULATED,
+                analog_input = sim.list_analog_input_channels(),
+                analog_output = sim.list_analog_output_channels(),
+                digital_input = sim.list_digital_input_channels(),
+                digital_output = sim.list_digital_output_channels(),
+                pwm_input = sim.list_pwm_input_channels(),
+                pwm_output = sim.list_pwm_output_channels()
+            )]
+
+    def list_analog_output_channels(self) -> List[int]:
+        return list(range(self.num_analog_output))
+
+    def list_analog_input_channels(self) -> List[int]:
+        return list(range(self.num_analog_input))
+
+    def list_digital_input_channels(self) -> List[int]:
+        return list(range(self.num_digital))
+
+    def list_digital_output_channels(self) -> List[int]:
+        return list(range(self.num_digital))
+
+    def list_pwm_output_channels(self) -> List[int]:
+        return list(range(self.num_pwm))
+
+    def list_pwm_input_channels(self) -> List[int]:
+        return []
@@ -0,0 +1,263 @@
+from .core import DataHandler
+from .shared import SeqlockArray
+from typing import Optional
+import time
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Streamed data comes in chunks of shape (num_samples, num_channels)
+
+# rows of a statistics snapshot, one column per channel
+(
+    COUNT, MEAN, VARIANCE, MINIMUM, MAXIMUM, RMS, SATURATED,
+    EXP_MEAN, EXP_VARIANCE, WINDOW_MEAN, WINDOW_VARIANCE
+) = range(11)
+NUM_STATISTICS = 11
+
+class RunningStatistics:
+    '''
+    Per channel statistics of a stream, updated chunk by chunk without a
+    second pass over the data:
+
+    - mean, variance (Welford, combined per chunk with Chan's update),
+      min/max, RMS and number of saturated samples since the start
+    - exponentially weighted mean and variance with time constant `tau` samples
+    - mean and variance over a sliding window of the last `window` samples
+
+    Buffers are allocated up front: an update costs O(chunk) and creates no
+    new arrays as long as chunks are at most `max_chunk` samples long (longer
+    chunks are processed in parts).
+    '''
+
+    def __init__(
+            self,
+            num_channels: int,
+            saturation_low: float = -np.inf,
+            saturation_high: float = np.inf,
+            tau: float = 1000,
+            window: int = 1000,
+            max_chunk: int = 4096
+        ) -> None:
+
+        self.num_channels = num_channels
+        self.saturation_low = saturation_low
+        self.saturation_high = saturation_high
+        self.alpha = 1 - np.exp(-1 / tau)
+        self.window = window
+        self.max_chunk = max_chunk
+
+        self.snapshot = np.zeros((NUM_STATISTICS, num_channels))
+
+        # scratch buffers
+        self._scratch = np.empty((max(max_chunk, window), num_channels))
+        self._row = np.empty(num_channels)
+        self._row2 = np.empty(num_channels)
+        self._ones = np.ones(max(max_chunk, window))
+        # (1-alpha)^k, weights of the exponential average, and the same in reverse order
+        self._decay = (1 - self.alpha) ** np.arange(max_chunk + 1)
+        self._weights = self._decay[::-1].copy()
+
+        self._m2 = np.zeros(num_channels)
+        self._sum_squares = np.zeros(num_channels)
+        self._exp_mean_squares = np.zeros(num_channels)
+        self._ring = np.zeros((window, num_channels))
+        self._ring_sum = np.zeros(num_channels)
+        self._ring_sum_squares = np.zeros(num_channels)
+
+        self.reset()
+
+    def reset(self) -> None:
+        self.count = 0
+        self._m2[:] = 0
+        self._sum_squares[:] = 0
+        self._exp_mean_squares[:] = 0
+        self._ring[:] = 0
+        self._ring_pos = 0
+        self._ring_sum[:] = 0
+        self._ring_sum_squares[:] = 0
+        self._since_resum = 0
+        self.snapshot[:] = 0
+        self.snapshot[MINIMUM] = np.inf
+        self.snapshot[MAXIMUM] = -np.inf
+
+    def update(self, chunk: np.ndarray) -> np.ndarray:
+        """Add a chunk and return the snapshot (updated in place)"""
+
+        if chunk.ndim == 1:
+            chunk = chunk[:, np.newaxis]
+
+        for start in range(0, len(chunk), self.max_chunk):
+            part = chunk[start:start + self.max_chunk]
+            if len(part):
+                self._update_cumulative(part)
+                self._update_exponential(part)
+                self._update_window(part)
+                self.count += len(part)
+                self.snapshot[COUNT] = self.count
+
+        return self.snapshot
+
+    def _sum(self, x: np.ndarray, out: np.ndarray) -> np.ndarray:
+        # column sums as a matrix product, much faster than x.sum(axis=0) on (samples, channels) arrays
+        return np.dot(self._ones[:len(x)], x, out=out)
+
+    def _update_cumulative(self, x: np.ndarray) -> None:
+
+        s = self.snapshot
+        n = len(x)
+        total = self.count + n
+        scratch = self._scratch[:n]
+        chunk_mean = self._row
+        tmp = self._row2
+
+        # chunk mean and sum of squared deviations, then Chan's parallel update
+        self._sum(x, chunk_mean)
+        chunk_mean /= n
+        np.subtract(x, chunk_mean, out=scratch)
+        np.square(scratch, out=scratch)
+        self._m2 += self._sum(scratch, tmp)
+        np.subtract(chunk_mean, s[MEAN], out=chunk_mean) # now the difference of means
+        np.square(chunk_mean, out=tmp)
+        tmp *= self.count * n / total
+        self._m2 += tmp
+        chunk_mean *= n / total
+        s[MEAN] += chunk_mean
+        np.divide(self._m2, max(total - 1, 1), out=s[VARIANCE])
+
+        np.minimum(s[MINIMUM], x.min(axis=0, out=tmp), out=s[MINIMUM])
+        np.maximum(s[MAXIMUM], x.max(axis=0, out=tmp), out=s[MAXIMUM])
+
+        np.square(x, out=scratch)
+        self._sum_squares += self._sum(scratch, tmp)
+        np.divide(self._sum_squares, total, out=s[RMS])
+        np.sqrt(s[RMS], out=s[RMS])
+
+        np.less_equal(x, self.saturation_low, out=scratch)
+        s[SATURATED] += self._sum(scratch, tmp)
+        np.greater_equal(x, self.saturation_high, out=scratch)
+        s[SATURATED] += self._sum(scratch, tmp)
+
+    def _update_exponential(self, x: np.ndarray) -> None:
+        # n steps of m <- (1-a) m + a x in closed form:
+        # m_n = (1-a)^n m_0 + a sum_i (1-a)^(n-1-i) x_i, same for the mean of squares
+        s = self.snapshot
+        n = len(x)
+        a = self.alpha
+        tmp = self._row
+
+        if self.count == 0:
+            s[EXP_MEAN] = x[0]
+            np.square(x[0], out=self._exp_mean_squares)
+
+        weights = self._weights[len(self._weights) - n:]
+        s[EXP_MEAN] *= self._decay[n]
+        np.dot(weights, x, out=tmp)
+        tmp *= a
+        s[EXP_MEAN] += tmp
+
+        scratch = self._scratch[:n]
+        np.square(x, out=scratch)
+        self._exp_mean_squares *= self._decay[n]
+        np.dot(weights, scratch, out=tmp)
+        tmp *= a
+        self._exp_mean_squares += tmp
+
+        np.square(s[EXP_MEAN], out=tmp)
+        np.subtract(self._exp_mean_squares, tmp, out=s[EXP_VARIANCE])
+        np.maximum(s[EXP_VARIANCE], 0, out=s[EXP_VARIANCE])
+
+    def _update_window(self, x: np.ndarray) -> None:
+        # running sums over a circular buffer: add the new samples, subtract the ones they replace
+        s = self.snapshot
+        w = self.window
+        tmp = self._row
+
+        if len(x) > w:
+            x = x[len(x) - w:]
+        n = len(x)
+
+        first = min(n, w - self._ring_pos)
+        for dst, src in ((slice(self._ring_pos, self._ring_pos + first), x[:first]), (slice(0, n - first), x[first:])):
+            old = self._ring[dst]
+            if not len(old):
+                continue
+            self._ring_sum += self._sum(src, tmp)
+            self._ring_sum -= self._sum(old, tmp)
+            scratch = self._scratch[:len(old)]
+            self._ring_sum_squares += self._sum(np.square(src, out=scratch), tmp)
+            self._ring_sum_squares -= self._sum(np.square(old, out=scratch), tmp)
+            old[...] = src
+        self._ring_pos = (self._ring_pos + n) % w
+
+        # recompute the sums from scratch once in a while to stop rounding errors from accumulating
+        self._since_resum += n
+        if self._since_resum >= w:
+            self._sum(self._ring, self._ring_sum)
+            self._sum(np.square(self._ring, out=self._scratch[:w]), self._ring_sum_squares)
+            self._since_resum = 0
+
+        count = min(self.count + n, w)
+        np.divide(self._ring_sum, count, out=s[WINDOW_MEAN])
+        np.square(s[WINDOW_MEAN], out=tmp)
+        tmp *= count
+        np.subtract(self._ring_sum_squares, tmp, out=s[WINDOW_VARIANCE])
+        s[WINDOW_VARIANCE] /= max(count - 1, 1)
+        np.maximum(s[WINDOW_VARIANCE], 0, out=s[WINDOW_VARIANCE])
+
+class StatisticsHandler(DataHandler):
+    '''
+    Compute running statistics on the data read from the DAQ and publish
+    snapshots to shared memory at most every `publish_interval` seconds.
+    Other processes read them with `read_statistics(name, num_channels)`.
+    The shared memory belongs to the process that created the handler, which
+    frees it with `close_shared()` once the handler stopped.
+    '''
+
+    def __init__(
+            self,
+            num_channels: int,
+            *args,
+            publish_interval: float = 0.1,
+            statistics_kwargs: Optional[dict] = None,
+            **kwargs
+        ):
+        super().__init__(*args, **kwargs)
+        self.num_channels = num_channels
+        self.publish_interval = publish_interval
+        self.statistics_kwargs = statistics_kwargs or {}
+        # created here so that the name is known to other processes before start
+        self.shared = SeqlockArray((NUM_STATISTICS, num_channels))
+
+    @property
+    def shared_name(self) -> str:
+        return self.shared.name
+
+    def initialize(self):
+        self.statistics = RunningStatistics(self.num_channels, **self.statistics_kwargs)
+        self.last_publish = 0.0
+
+    def handle_data(self, data):
+        snapshot = self.statistics.update(data)
+        now = time.monotonic()
+        if now - self.last_publish >= self.publish_interval:
+            self.shared.write(snapshot)
+            self.last_publish = now
+
+    def cleanup(self):
+        self.shared.write(self.statistics.snapshot)
+        # the handler's process only attached, the memory stays for the owner
+        self.shared.close()
+
+    def close_shared(self) -> None:
+        """In the creating process, after the handler stopped: free the shared memory"""
+        self.shared.close()
+
+def read_statistics(name: str, num_channels: int) -> np.ndarray:
+    """Read the latest snapshot published by a StatisticsHandler"""
+    shared = SeqlockArray.attach(name, (NUM_STATISTICS, num_channels))
+    try:
+        return shared.read()[0]
+    finally:
+        shared.close()
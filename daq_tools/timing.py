@@ -0,0 +1,21 @@
+import time
+
+# time.sleep routinely overshoots by up to a scheduler tick,
+# busy-wait for the last part of the wait instead
+SPIN_DURATION = 1e-3
+
+def sleep_until(deadline: float, spin: float = SPIN_DURATION) -> float:
+    """
+    Wait until time.perf_counter() reaches deadline.
+    Returns how late we woke up, in seconds.
+    """
+
+    remaining = deadline - time.perf_counter()
+    if remaining > spin:
+        time.sleep(remaining - spin)
+
+    now = time.perf_counter()
+    while now < deadline:
+        now = time.perf_counter()
+
+    return now - deadline
@@ -0,0 +1,302 @@
+from .core import SoftwareTimingDAQ, BoardInfo, IOMethod, IOOperation, OutputState, IO_METHOD_NAMES
+from .metrics import LatencyStats
+from .timing import sleep_until
+from dataclasses import dataclass, field
+from typing import BinaryIO, Dict, Iterator, List, NamedTuple, Optional, Sequence
+import math
+import struct
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Trace file: header (magic, version, wall clock time at start) followed by
+# fixed size records (method, flags, channel, value, start, duration).
+# Timestamps are nanoseconds since the start of the trace. For reads, value
+# holds the value that was read. The records of an execute call are written
+# together, all flagged FLAG_BATCH, the first one also FLAG_BATCH_START.
+FILE_HEADER = struct.Struct('<8sHd')
+RECORD = struct.Struct('<BBHdqI')
+MAGIC = b'DAQTRACE'
+VERSION = 2
+
+RESET = 0xFF # method code for reset_state
+FLAG_BATCH = 1 # record of an execute call
+FLAG_ERROR = 2 # the call raised an exception
+FLAG_BATCH_START = 4 # first record of an execute call
+
+class TraceRecord(NamedTuple):
+    method: int
+    flags: int
+    channel: int
+    value: float
+    timestamp: float
+    duration: float
+
+class TraceWriter:
+    """Append-only binary trace, records are buffered in memory and written in blocks"""
+
+    def __init__(self, path: str, buffer_size: int = 1 << 16) -> None:
+
+        self.file: BinaryIO = open(path, 'wb')
+        self.start_ns = time.perf_counter_ns()
+        self.file.write(FILE_HEADER.pack(MAGIC, VERSION, time.time()))
+
+        self._buffer = bytearray(buffer_size - buffer_size % RECORD.size)
+        self._offset = 0
+        self._lock = threading.Lock()
+        self.num_records = 0
+
+    def write(
+            self,
+            method: int,
+            flags: int,
+            channel: int,
+            value: float,
+            start_ns: int,
+            duration_ns: int
+        ) -> None:
+
+        with self._lock:
+            self._pack(method, flags, channel, value, start_ns, duration_ns)
+
+    def write_many(self, records: Sequence[tuple]) -> None:
+        """Write (method, flags, channel, value, start_ns, duration_ns) records with nothing in between"""
+        with self._lock:
+            for record in records:
+                self._pack(*record)
+
+    def _pack(self, method, flags, channel, value, start_ns, duration_ns) -> None:
+        RECORD.pack_into(
+            self._buffer, self._offset,
+            method, flags, channel, value,
+            start_ns - self.start_ns, min(duration_ns, 0xFFFFFFFF)
+        )
+        self._offset += RECORD.size
+        self.num_records += 1
+        if self._offset == len(self._buffer):
+            self._flush()
+
+    def _flush(self) -> None:
+        self.file.write(memoryview(self._buffer)[:self._offset])
+        self._offset = 0
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush()
+            self.file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self.file.closed:
+                return
+            self._flush()
+            self.file.close()
+
+def read_trace(path: str) -> Iterator[TraceRecord]:
+
+    with open(path, 'rb') as f:
+        magic, version, _ = FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a version {VERSION} daq_tools trace')
+
+        while True:
+            block = f.read(RECORD.size * 4096)
+            usable = len(block) - len(block) % RECORD.size
+            for method, flags, channel, value, start, duration in RECORD.iter_unpack(block[:usable]):
+                yield TraceRecord(method, flags, channel, value, 1e-9*start, 1e-9*duration)
+            if len(block) < RECORD.size * 4096:
+                break
+
+class TracingDAQ(SoftwareTimingDAQ):
+    '''
+    Wrap a board and record every call made on it to a binary trace file.
+    Recording a call costs a couple of microseconds.
+    Closing the TracingDAQ closes the wrapped board and the trace.
+    '''
+
+    def __init__(self, daq: SoftwareTimingDAQ, path: str) -> None:
+
+        super().__init__(daq.board_id)
+        self.daq = daq
+        self.trace = TraceWriter(path)
+        self._closed = False
+        logger.info(f"Recording calls to board {daq.board_id} in {path}")
+
+    def _call(self, method: IOMethod, channel: int, value: float, func, *args):
+
+        flags = 0
+        res = None
+        start = time.perf_counter_ns()
+        try:
+            res = func(*args)
+            return res
+        except Exception:
+            flags = FLAG_ERROR
+            raise
+        finally:
+            duration = time.perf_counter_ns() - start
+            if not method.is_write:
+                value = math.nan if res is None else res
+            self.trace.write(method, flags, channel, value, start, duration)
+
+    def digital_read(self, channel: int) -> float:
+        return self._call(IOMethod.DIGITAL_READ, channel, 0, self.daq.digital_read, channel)
+
+    def digital_write(self, channel: int, val: bool) -> None:
+        self._call(IOMethod.DIGITAL_WRITE, channel, val, self.daq.digital_write, channel, val)
+
+    def pwm_write(self, channel: int, duty_cycle: float) -> None:
+        self._call(IOMethod.PWM_WRITE, channel, duty_cycle, self.daq.pwm_write, channel, duty_cycle)
+
+    def analog_read(self, channel: int) -> float:
+        return self._call(IOMethod.ANALOG_READ, channel, 0, self.daq.analog_read, channel)
+
+    def analog_write(self, channel: int, val: float) -> None:
+        self._call(IOMethod.ANALOG_WRITE, channel, val, self.daq.analog_write, channel, val)
+
+    def execute(self, operations: Sequence[IOOperation]) -> List[Optional[float]]:
+
+        flags = 0
+        results: List[Optional[float]] = [None] * len(operations)
+        start = time.perf_counter_ns()
+        try:
+            results = self.daq.execute(operations)
+            return results
+        except Exception:
+            flags = FLAG_ERROR
+            raise
+        finally:
+            duration = time.perf_counter_ns() - start
+            records = []
+            for i, ((method, channel, value), res) in enumerate(zip(operations, results)):
+                if not method.is_write:
+                    value = math.nan if res is None else res
+                records.append((method, flags | FLAG_BATCH | (0 if i else FLAG_BATCH_START), channel, value, start, duration))
+            # other threads' calls must not end up between the records of the batch
+            self.trace.write_many(records)
+
+    def reset_state(self) -> None:
+        flags = 0
+        start = time.perf_counter_ns()
+        try:
+            self.daq.reset_state()
+        except Exception:
+            flags = FLAG_ERROR
+            raise
+        finally:
+            self.trace.write(RESET, flags, 0, 0, start, time.perf_counter_ns() - start)
+
+    def close(self) -> None:
+        if self._closed:
+            return
+
+        self.stop_edge_watcher()
+        self.daq.close()
+        self.trace.close()
+        logger.info(f"Recorded {self.trace.num_records} calls")
+        self._closed = True
+
+    def get_output_state(self) -> OutputState:
+        return self.daq.get_output_state()
+
+    @classmethod
+    def list_boards(cls) -> List[BoardInfo]:
+        # wrap an open board instead
+        return []
+
+    def list_analog_output_channels(self) -> List[int]:
+        return self.daq.list_analog_output_channels()
+
+    def list_analog_input_channels(self) -> List[int]:
+        return self.daq.list_analog_input_channels()
+
+    def list_digital_input_channels(self) -> List[int]:
+        return self.daq.list_digital_input_channels()
+
+    def list_digital_output_channels(self) -> List[int]:
+        return self.daq.list_digital_output_channels()
+
+    def list_pwm_output_channels(self) -> List[int]:
+        return self.daq.list_pwm_output_channels()
+
+    def list_pwm_input_channels(self) -> List[int]:
+        return self.daq.list_pwm_input_channels()
+
+@dataclass
+class ReplayReport:
+    num_calls: int = 0
+    num_errors: int = 0
+    lateness: LatencyStats = field(default_factory = LatencyStats)
+    durations: Dict[str, LatencyStats] = field(default_factory = dict)
+    recorded_durations: Dict[str, LatencyStats] = field(default_factory = dict)
+
+def _single_call(daq: SoftwareTimingDAQ, operation: IOOperation) -> Optional[float]:
+    method, channel, value = operation
+    func = getattr(daq, IO_METHOD_NAMES[method])
+    if method == IOMethod.DIGITAL_WRITE:
+        return func(channel, bool(value))
+    elif method.is_write:
+        return func(channel, value)
+    return func(channel)
+
+def _batches(records: Iterator[TraceRecord]) -> Iterator[List[TraceRecord]]:
+    """Records grouped by call"""
+    batch: List[TraceRecord] = []
+    for record in records:
+        if batch and (record.flags & FLAG_BATCH_START or not record.flags & FLAG_BATCH):
+            yield batch
+            batch = []
+        batch.append(record)
+    if batch:
+        yield batch
+
+def replay_trace(
+        path: str,
+        daq: SoftwareTimingDAQ,
+        speed: Optional[float] = 1.0
+    ) -> ReplayReport:
+    '''
+    Run the calls of a trace against a board, e.g. a Simulated_SoftTiming.
+    speed = 1 replays in real time, speed = N replays N times faster,
+    and speed = None replays as fast as possible.
+    Calls that failed during recording are replayed too, errors are counted.
+    '''
+
+    report = ReplayReport()
+    start = time.perf_counter()
+
+    for batch in _batches(read_trace(path)):
+
+        first = batch[0]
+        if first.method == RESET:
+            name = 'reset_state'
+        else:
+            name = 'execute' if first.flags & FLAG_BATCH else str(IOMethod(first.method))
+        report.recorded_durations.setdefault(name, LatencyStats()).add(first.duration)
+
+        if speed:
+            report.lateness.add(sleep_until(start + first.timestamp / speed))
+
+        call_start = time.perf_counter()
+        try:
+            if first.method == RESET:
+                daq.reset_state()
+            else:
+                operations = [
+                    IOOperation(IOMethod(r.method), r.channel, r.value if IOMethod(r.method).is_write else 0)
+                    for r in batch
+                ]
+                if first.flags & FLAG_BATCH:
+                    daq.execute(operations)
+                else:
+                    _single_call(daq, operations[0])
+        except Exception as e:
+            report.num_errors += 1
+            logger.debug(f"Replayed call failed: {e}")
+
+        report.durations.setdefault(name, LatencyStats()).add(time.perf_counter() - call_start)
+        report.num_calls += 1
+
+    return report
@@ -0,0 +1,238 @@
+from .core import DataHandler, Edge
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import List, NamedTuple, Optional
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Streamed data comes in chunks of shape (num_samples, num_channels)
+
+class Trigger(ABC):
+    """Find trigger positions in consecutive chunks, state is kept across chunks"""
+
+    @abstractmethod
+    def find(self, chunk: np.ndarray) -> np.ndarray:
+        """Return the indices (within the chunk) of the samples where the trigger fires"""
+        pass
+
+    @abstractmethod
+    def reset(self) -> None:
+        pass
+
+    @staticmethod
+    def _edges(state: np.ndarray, previous: bool, edge: Edge) -> np.ndarray:
+        # state is a boolean array, previous the last state of the previous chunk
+        before = np.empty_like(state)
+        before[0] = previous
+        before[1:] = state[:-1]
+        if edge == Edge.RISING:
+            return np.flatnonzero(state & ~before)
+        elif edge == Edge.FALLING:
+            return np.flatnonzero(~state & before)
+        return np.flatnonzero(state ^ before)
+
+class EdgeTrigger(Trigger):
+    """Edges of a digital line (values above `level` are HIGH)"""
+
+    def __init__(self, channel: int, edge: Edge = Edge.RISING, level: float = 0.5) -> None:
+        self.channel = channel
+        self.edge = edge
+        self.level = level
+        self.reset()
+
+    def reset(self) -> None:
+        self._previous = None
+
+    def find(self, chunk: np.ndarray) -> np.ndarray:
+        state = chunk[:, self.channel] > self.level
+        if len(state) == 0:
+            return np.empty(0, dtype=np.intp)
+        previous = state[0] if self._previous is None else self._previous
+        self._previous = state[-1]
+        return self._edges(state, previous, self.edge)
+
+class ThresholdTrigger(Trigger):
+    '''
+    Threshold crossing with hysteresis (Schmitt trigger): the signal is HIGH
+    once it reaches `level` and only goes back LOW below `level - hysteresis`,
+    so noise around the threshold does not fire multiple times.
+    '''
+
+    def __init__(
+            self,
+            channel: int,
+            level: float,
+            hysteresis: float = 0.0,
+            edge: Edge = Edge.RISING
+        ) -> None:
+
+        if hysteresis < 0:
+            raise ValueError('hysteresis should be positive')
+
+        self.channel = channel
+        self.level = level
+        self.hysteresis = hysteresis
+        self.edge = edge
+        self.reset()
+
+    def reset(self) -> None:
+        self._previous = None
+
+    def find(self, chunk: np.ndarray) -> np.ndarray:
+
+        x = chunk[:, self.channel]
+        if len(x) == 0:
+            return np.empty(0, dtype=np.intp)
+
+        high = x >= self.level
+        low = x < self.level - self.hysteresis
+
+        # carry the last decided state forward over the samples in the hysteresis band
+        decided = high | low
+        last = np.where(decided, np.arange(len(x)), -1)
+        np.maximum.accumulate(last, out=last)
+        state = high[last]
+
+        if self._previous is None:
+            self._previous = bool(state[np.argmax(last >= 0)]) if decided.any() else False
+        state[last < 0] = self._previous
+
+        previous = self._previous
+        self._previous = bool(state[-1])
+        return self._edges(state, previous, self.edge)
+
+class EventWindow(NamedTuple):
+    trigger_index: int # absolute sample index of the trigger
+    data: np.ndarray # (pre_samples + post_samples, num_channels)
+
+@dataclass
+class CaptureStats:
+    num_samples: int = 0
+    num_triggers: int = 0
+    num_events: int = 0
+    dropped_dead_time: int = 0 # triggers within the dead time of a previous event
+    dropped_no_history: int = 0 # triggers too early in the stream to fill the pre-trigger window
+    dead_samples: int = 0 # samples during which triggers were ignored
+
+class TriggeredCapture:
+    '''
+    Keep the last samples of a stream in a circular buffer and cut
+    fixed-length windows around trigger events, e.g. 200 ms before and
+    800 ms after a TTL edge.
+
+    Triggers arriving less than `dead_time` samples after an accepted
+    trigger are dropped (defaults to post_samples, i.e. windows do not
+    overlap). Windows are emitted as soon as their last sample arrived.
+    '''
+
+    def __init__(
+            self,
+            num_channels: int,
+            pre_samples: int,
+            post_samples: int,
+            trigger: Trigger,
+            dead_time: Optional[int] = None,
+            max_chunk: int = 4096,
+            dtype = np.float64
+        ) -> None:
+
+        if post_samples < 1 or pre_samples < 0:
+            raise ValueError('a window needs at least one post-trigger sample')
+
+        self.num_channels = num_channels
+        self.pre_samples = pre_samples
+        self.post_samples = post_samples
+        self.trigger = trigger
+        self.dead_time = post_samples if dead_time is None else dead_time
+        self.max_chunk = max_chunk
+
+        self.capacity = pre_samples + post_samples + max_chunk
+        self.buffer = np.zeros((self.capacity, num_channels), dtype=dtype)
+        self.stats = CaptureStats()
+
+        self._total = 0 # number of samples written so far
+        self._pending: List[int] = [] # accepted triggers waiting for their post-trigger samples
+        self._dead_until = 0
+
+    def reset(self) -> None:
+        self.trigger.reset()
+        self.stats = CaptureStats()
+        self._total = 0
+        self._pending.clear()
+        self._dead_until = 0
+
+    def _write(self, chunk: np.ndarray) -> None:
+        start = self._total % self.capacity
+        stop = start + len(chunk)
+        if stop <= self.capacity:
+            self.buffer[start:stop] = chunk
+        else:
+            split = self.capacity - start
+            self.buffer[start:] = chunk[:split]
+            self.buffer[:stop - self.capacity] = chunk[split:]
+        self._total += len(chunk)
+
+    def _window(self, trigger_index: int) -> np.ndarray:
+        length = self.pre_samples + self.post_samples
+        start = (trigger_index - self.pre_samples) % self.capacity
+        stop = start + length
+        if stop <= self.capacity:
+            return self.buffer[start:stop].copy()
+        return np.concatenate((self.buffer[start:], self.buffer[:stop - self.capacity]))
+
+    def _accept(self, triggers: np.ndarray) -> None:
+
+        self.stats.num_triggers += len(triggers)
+        for index in triggers.tolist():
+            if index < self._dead_until:
+                self.stats.dropped_dead_time += 1
+            elif index < self.pre_samples:
+                self.stats.dropped_no_history += 1
+            else:
+                self._pending.append(index)
+                self._dead_until = index + self.dead_time
+                self.stats.dead_samples += self.dead_time
+
+    def process(self, chunk: np.ndarray) -> List[EventWindow]:
+        """Add a chunk of samples and return the windows completed by it"""
+
+        if chunk.ndim == 1:
+            chunk = chunk[:, np.newaxis]
+
+        events = []
+        for start in range(0, len(chunk), self.max_chunk):
+            part = chunk[start:start + self.max_chunk]
+            offset = self._total
+            self._accept(self.trigger.find(part) + offset)
+            self._write(part)
+            self.stats.num_samples += len(part)
+
+            while self._pending and self._pending[0] + self.post_samples <= self._total:
+                index = self._pending.pop(0)
+                events.append(EventWindow(index, self._window(index)))
+
+        self.stats.num_events += len(events)
+        return events
+
+class TriggeredCaptureHandler(DataHandler):
+    """ Cut event windows out of the stream read from the DAQ and handle them """
+
+    def __init__(self, capture: TriggeredCapture, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.capture = capture
+
+    def initialize(self):
+        self.capture.reset()
+
+    def handle_data(self, data):
+        for event in self.capture.process(data):
+            self.handle_event(event)
+
+    @abstractmethod
+    def handle_event(self, event: EventWindow):
+        pass
+
+    def cleanup(self):
+        logger.info(f"Triggered capture: {self.capture.stats}")
@@ -0,0 +1,71 @@
+from daq_tools.core import HardwareTimingDAQ, DAQ_Reader, DataHandler, SignalGenerator, DAQ_Writer, System
+from daq_tools.chunking import AdaptiveChunking
+import numpy as np
+import logging
+import time
+
+# A simulated hardware timed input at SAMPLE_RATE and a consumer with a fixed
+# overhead per chunk plus a cost per sample: the chunk size settles at the
+# largest value meeting the target latency.
+
+SAMPLE_RATE = 100_000
+NUM_CHANNELS = 4
+TARGET_LATENCY = 20e-3
+PER_CHUNK = 2e-3
+PER_SAMPLE = 1e-6
+
+class SimulatedInput(HardwareTimingDAQ):
+
+    def __init__(self):
+        self.next_chunk = None
+
+    def get_chunk(self, num_samples = None):
+        num_samples = num_samples or 1000
+        now = time.perf_counter()
+        if self.next_chunk is None:
+            self.next_chunk = now
+        # wait until the hardware has acquired the samples
+        self.next_chunk += num_samples / SAMPLE_RATE
+        if self.next_chunk > now:
+            time.sleep(self.next_chunk - now)
+        return np.random.randn(num_samples, NUM_CHANNELS)
+
+    def put_chunk(self, data):
+        pass
+
+class Reader(DAQ_Reader):
+
+    def initialize(self):
+        pass
+
+    def cleanup(self):
+        pass
+
+class SlowHandler(DataHandler):
+
+    def initialize(self):
+        pass
+
+    def handle_data(self, data):
+        deadline = time.perf_counter() + PER_CHUNK + PER_SAMPLE * len(data)
+        while time.perf_counter() < deadline:
+            pass
+
+    def cleanup(self):
+        pass
+
+class Idle(SignalGenerator):
+
+    def run(self):
+        self.stop_event.wait()
+
+if __name__ == '__main__':
+
+    logging.basicConfig(level=logging.INFO, format='%(processName)s %(message)s')
+
+    chunking = AdaptiveChunking(SAMPLE_RATE, TARGET_LATENCY, initial=100, buffer_size=100_000)
+    system = System(SimulatedInput(), Reader(), SlowHandler(), Idle(), DAQ_Writer(), chunking=chunking)
+    system.start()
+    time.sleep(5)
+    system.stop()
+    chunking.close()
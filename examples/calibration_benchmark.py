@@ -0,0 +1,34 @@
+from daq_tools.calibration import U3Calibration
+import numpy as np
+import time
+
+# Convert a second of raw U3 counts to volts per sample (like LabJackPython's
+# binaryToCalibratedAnalogVoltage) and with one vectorized call, with user
+# scaling on one channel. Uses nominal constants, no device needed; on a
+# real board use U3Calibration.load(daq.device) or daq.calibration.
+
+SAMPLE_RATE = 50_000
+CHANNELS = [0, 1, 2, 3]
+
+if __name__ == '__main__':
+
+    calibration = U3Calibration.nominal()
+    # e.g. a thermistor on AIN3: 10 mV/K around 25 C, slightly non linear
+    calibration.set_scaling(3, gain = 100, offset = -273.15, polynomial = [0, 1, 1e-4])
+
+    counts = np.random.randint(0, 1 << 16, (SAMPLE_RATE // len(CHANNELS), len(CHANNELS)), dtype = np.uint16)
+    slope = calibration.cal_data['lvSESlope']
+    offset = calibration.cal_data['lvSEOffset']
+
+    start = time.perf_counter()
+    per_sample = [[bits * slope + offset for bits in row] for row in counts.tolist()]
+    per_sample_time = time.perf_counter() - start
+
+    out = np.empty(counts.shape)
+    start = time.perf_counter()
+    calibration.counts_to_volts(counts, CHANNELS, out = out)
+    vectorized_time = time.perf_counter() - start
+
+    same = np.allclose(np.array(per_sample)[:, :3], out[:, :3])
+    print(f'{counts.size} samples: per sample {1e3*per_sample_time:.2f} ms, vectorized {1e3*vectorized_time:.3f} ms '
+          f'({per_sample_time/vectorized_time:.0f}x), same volts: {same}')
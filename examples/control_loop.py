@@ -0,0 +1,53 @@
+from daq_tools.simulated import Simulated_SoftTiming
+from daq_tools.control import ControlLoop
+from daq_tools.core import IOMethod, IOOperation
+import logging
+import math
+import time
+
+# PI control of a simulated first order plant (e.g. a heater) at 500 Hz:
+# analog output 0 drives the plant, analog input 0 measures it.
+# Replace the simulated board by a real one to run the same loop on hardware.
+
+RATE = 500
+SETPOINT = 2.0
+TIME_CONSTANT = 0.05
+KP = 2.0
+KI = 40.0
+
+class Plant(Simulated_SoftTiming):
+    """Simulated board whose analog input 0 follows analog output 0 with a first order lag"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.state = 0.0
+        self.last_update = time.perf_counter()
+
+    def _analog_read(self, channel):
+        now = time.perf_counter()
+        drive = self.analog_output.get(0, 0.0)
+        self.state += (drive - self.state) * (1 - math.exp(-(now - self.last_update) / TIME_CONSTANT))
+        self.last_update = now
+        self.analog_input[0] = self.state
+        return super()._analog_read(channel)
+
+class PI:
+
+    def __init__(self):
+        self.integral = 0.0
+
+    def __call__(self, t, inputs):
+        error = SETPOINT - inputs[0]
+        self.integral += error / RATE
+        command = max(0.0, min(5.0, KP * error + KI * self.integral))
+        return [IOOperation(IOMethod.ANALOG_WRITE, 0, command)]
+
+if __name__ == '__main__':
+
+    logging.basicConfig(level=logging.INFO)
+
+    with Plant(0, latency=0.5e-3) as daq:
+        loop = ControlLoop(daq, RATE, PI(), inputs=[IOOperation(IOMethod.ANALOG_READ, 0)])
+        loop.run(duration=2)
+        print(f'measured {daq.analog_input[0]:.3f} for a setpoint of {SETPOINT}')
+        print(f'{daq.num_transactions} device transactions')
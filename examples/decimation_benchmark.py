@@ -0,0 +1,24 @@
+from daq_tools.decimation import DecimatorBank
+import numpy as np
+import time
+
+NUM_CHANNELS = [1, 8]
+CHUNK_SIZE = 1000
+NUM_CHUNKS = 500
+FACTORS = [[10], [100], [10, 100, 1000]]
+
+if __name__ == '__main__':
+
+    for num_channels in NUM_CHANNELS:
+        data = np.random.randn(CHUNK_SIZE, num_channels)
+        for factors in FACTORS:
+            bank = DecimatorBank(factors, num_channels)
+            start = time.process_time()
+            for i in range(NUM_CHUNKS):
+                bank.process(data)
+            duration = time.process_time() - start
+            rate = NUM_CHUNKS * CHUNK_SIZE / duration
+            print(
+                f'{num_channels} channel(s), factors {factors}: '
+                f'{rate/1e6:.2f} Msamples/s/core ({rate*num_channels/1e6:.2f} M channel-samples/s/core)'
+            )
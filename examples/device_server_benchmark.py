@@ -0,0 +1,60 @@
+from daq_tools import Simulated_SoftTiming, DeviceServer, DeviceClient, IOMethod, IOOperation
+from multiprocessing import Process, Queue
+import os
+import tempfile
+import time
+import logging
+
+ADDRESS = os.path.join(tempfile.gettempdir(), 'daq_tools_benchmark.sock')
+DEVICE_LATENCY = 1e-3 # simulated USB round trip
+NUM_CLIENTS = [1, 2, 4, 8]
+NUM_REQUESTS = 500
+
+def run_client(results: Queue):
+    with DeviceClient(ADDRESS) as daq:
+        latency = []
+        for i in range(NUM_REQUESTS):
+            start = time.perf_counter()
+            daq.execute([
+                IOOperation(IOMethod.DIGITAL_WRITE, 0, i % 2),
+                IOOperation(IOMethod.ANALOG_READ, 0)
+            ])
+            latency.append(time.perf_counter() - start)
+    results.put(latency)
+
+if __name__ == '__main__':
+
+    logging.basicConfig(
+        level=logging.WARNING,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    with Simulated_SoftTiming(0, latency=DEVICE_LATENCY) as board:
+
+        server = DeviceServer(board, ADDRESS)
+        server.start()
+        time.sleep(0.5)
+
+        for num_clients in NUM_CLIENTS:
+            server.num_transactions = 0
+            server.num_commands = 0
+
+            results = Queue()
+            clients = [Process(target=run_client, args=(results,)) for i in range(num_clients)]
+            start = time.perf_counter()
+            for client in clients:
+                client.start()
+            latency = sorted(l for i in range(num_clients) for l in results.get())
+            duration = time.perf_counter() - start
+            for client in clients:
+                client.join()
+
+            print(
+                f'{num_clients} client(s): '
+                f'{server.num_commands/duration:.0f} commands/s, '
+                f'{server.num_commands/server.num_transactions:.1f} commands/transaction, '
+                f'round trip median {1e3*latency[len(latency)//2]:.2f}ms, '
+                f'p99 {1e3*latency[int(0.99*len(latency))]:.2f}ms'
+            )
+
+        server.shutdown()
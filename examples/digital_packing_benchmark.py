@@ -0,0 +1,56 @@
+from daq_tools.digital import pack, unpack, transitions
+from multiprocessing import Process, Queue
+import numpy as np
+import pickle
+import time
+
+NUM_LINES = [8, 32]
+CHUNK_SIZE = 10_000
+NUM_CHUNKS = 200
+EDGE_PROBABILITY = 1e-3
+
+def random_lines(num_samples, num_lines):
+    toggles = np.random.random((num_samples, num_lines)) < EDGE_PROBABILITY
+    return np.cumsum(toggles, axis=0) % 2 == 1
+
+def consume(q, num_chunks):
+    for i in range(num_chunks):
+        q.get()
+
+def queue_throughput(chunk, num_chunks):
+    q = Queue(maxsize=8)
+    consumer = Process(target=consume, args=(q, num_chunks))
+    consumer.start()
+    start = time.perf_counter()
+    for i in range(num_chunks):
+        q.put(chunk)
+    consumer.join()
+    return num_chunks * CHUNK_SIZE / (time.perf_counter() - start)
+
+def timed(fun, *args):
+    start = time.perf_counter()
+    for i in range(NUM_CHUNKS):
+        fun(*args)
+    return NUM_CHUNKS * CHUNK_SIZE / (time.perf_counter() - start)
+
+def unpacked_edges(lines):
+    return np.nonzero(np.diff(lines, axis=0))
+
+if __name__ == '__main__':
+
+    for num_lines in NUM_LINES:
+        lines = random_lines(CHUNK_SIZE, num_lines)
+        as_float = lines.astype(np.float64)
+        packed = pack(lines)
+
+        print(f'{num_lines} lines, {CHUNK_SIZE} samples per chunk')
+        for name, chunk in (('float64', as_float), ('bool', lines), ('packed', packed)):
+            size = len(pickle.dumps(chunk, protocol=pickle.HIGHEST_PROTOCOL))
+            rate = queue_throughput(chunk, NUM_CHUNKS)
+            print(f'    {name:>8}: {size/1e3:8.1f} kB per chunk, queue {rate/1e6:6.2f} Msamples/s')
+
+        print(f'    pack {timed(pack, lines)/1e6:.1f} Msamples/s, unpack {timed(unpack, packed)/1e6:.1f} Msamples/s')
+        print(
+            f'    edges: packed {timed(transitions, packed)/1e6:.1f} Msamples/s, '
+            f'unpacked {timed(unpacked_edges, lines)/1e6:.1f} Msamples/s'
+        )
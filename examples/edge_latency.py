@@ -0,0 +1,57 @@
+from daq_tools.simulated import Simulated_SoftTiming
+from daq_tools.core import Edge
+import logging
+import random
+import threading
+import time
+
+# Measure how fast edges on a digital input are detected, compared to the
+# latency bound reported with every event, and how much bus time watching
+# costs while the input is idle and while it toggles.
+# Replace the simulated board by a real one (and toggle the input with a
+# function generator) to measure a real backend.
+
+CHANNEL = 2
+NUM_EDGES = 50
+MIN_GAP = 25e-3 # above the poller max_interval, so no edge is missed
+MAX_GAP = 80e-3
+IDLE_TIME = 1.0
+
+if __name__ == '__main__':
+
+    logging.basicConfig(level=logging.INFO)
+
+    with Simulated_SoftTiming(0, latency=0.2e-3) as daq:
+
+        toggles = []
+        events = []
+
+        def toggle():
+            for i in range(NUM_EDGES):
+                time.sleep(random.uniform(MIN_GAP, MAX_GAP))
+                toggles.append(time.perf_counter())
+                daq.set_digital_input(CHANNEL, i % 2 == 0)
+
+        handle = daq.on_edge(CHANNEL, events.append, Edge.BOTH)
+
+        start = daq.get_edge_stats().transactions
+        time.sleep(IDLE_TIME)
+        idle = (daq.get_edge_stats().transactions - start) / IDLE_TIME
+
+        start = daq.get_edge_stats().transactions
+        toggle_start = time.perf_counter()
+        toggler = threading.Thread(target=toggle)
+        toggler.start()
+        toggler.join()
+        time.sleep(MAX_GAP)
+        active = (daq.get_edge_stats().transactions - start) / (time.perf_counter() - toggle_start)
+
+        daq.remove_edge_callback(handle)
+
+        delays = [event.time - t for event, t in zip(events, toggles)]
+        within = sum(delay <= event.latency for delay, event in zip(delays, events))
+        print(f'{len(events)}/{len(toggles)} edges detected')
+        print(f'actual delay: mean {1e3*sum(delays)/len(delays):.2f} ms, max {1e3*max(delays):.2f} ms')
+        print(f'within the reported bound: {within}/{len(events)}')
+        print(f'transactions/s: {idle:.1f} idle, {active:.1f} while toggling')
+        print(daq.get_edge_stats())
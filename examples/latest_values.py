@@ -0,0 +1,51 @@
+from daq_tools.simulated import Simulated_SoftTiming
+from daq_tools.control import ControlLoop
+from daq_tools.latest import LatestValues
+from daq_tools.core import IOMethod, IOOperation
+from multiprocessing import Process
+import logging
+import time
+
+# One process polls a (simulated) board and publishes the latest inputs in
+# shared memory, several others (think GUI, logger, safety monitor) read
+# them whenever they want, without queues or their own polling.
+
+RATE = 200
+DURATION = 2.0
+NUM_READERS = 3
+INPUTS = [IOOperation(IOMethod.ANALOG_READ, channel) for channel in range(4)] + \
+    [IOOperation(IOMethod.DIGITAL_READ, channel) for channel in range(2, 6)]
+
+def acquire(latest: LatestValues):
+    with Simulated_SoftTiming(0, latency=0.2e-3) as daq:
+        ControlLoop(daq, RATE, latest.publish, inputs=latest.inputs).run(duration=DURATION)
+
+def monitor(name: str, index: int):
+    # attach by name, as an unrelated process would
+    latest = LatestValues.attach(name, len(INPUTS))
+    reads = 0
+    cost = 0.0
+    start = time.monotonic()
+    while time.monotonic() - start < DURATION:
+        t = time.perf_counter()
+        table, version = latest.snapshot()
+        cost += time.perf_counter() - t
+        reads += 1
+        time.sleep(1e-3)
+    ain0 = latest.get(IOMethod.ANALOG_READ, 0)
+    print(f'reader {index}: {reads} snapshots, {1e6*cost/reads:.1f} us each, '
+          f'AIN0 updated {ain0.count} times, last one {1e3*ain0.age:.1f} ms ago')
+    latest.close()
+
+if __name__ == '__main__':
+
+    logging.basicConfig(level=logging.INFO)
+
+    latest = LatestValues(INPUTS)
+    readers = [Process(target=monitor, args=(latest.name, i)) for i in range(NUM_READERS)]
+    for reader in readers:
+        reader.start()
+    acquire(latest)
+    for reader in readers:
+        reader.join()
+    latest.close()
@@ -0,0 +1,74 @@
+from daq_tools.core import DataHandler, PipelineProcess
+from daq_tools.pipeline import Pipeline
+from multiprocessing import Queue
+import numpy as np
+import logging
+import time
+
+# One producer feeding a recorder, a display and a trigger detector at once:
+# through one shared memory connection (every consumer reads the same slots)
+# or through one queue per consumer (every chunk pickled once per consumer).
+
+CHUNK = (10_000, 16)
+NUM_CONSUMERS = 3
+DURATION = 2.0
+
+class Producer(PipelineProcess):
+    """Puts the same chunk as fast as the consumers allow, on one or several connections"""
+
+    def configure(self, stop_event, queue = None, queues = None):
+        self.stop_event = stop_event
+        self.outputs = [queue] if queue is not None else list(queues.values())
+
+    def run(self):
+        chunk = np.random.randn(*CHUNK)
+        while not self.stop_event.is_set():
+            for output in self.outputs:
+                output.put(chunk)
+
+class Consumer(DataHandler):
+
+    def __init__(self, results: Queue):
+        super().__init__()
+        self.results = results
+
+    def initialize(self):
+        self.chunks = 0
+        self.start = time.perf_counter()
+
+    def handle_data(self, data):
+        data.sum() # touch the data once, as a light consumer would
+        self.chunks += 1
+
+    def cleanup(self):
+        self.results.put(self.chunks / (time.perf_counter() - self.start))
+
+def run(shared_memory: bool) -> None:
+
+    results = Queue()
+    pipeline = Pipeline()
+    pipeline.add('producer', Producer())
+    consumers = [f'consumer{i}' for i in range(NUM_CONSUMERS)]
+    for name in consumers:
+        pipeline.add(name, Consumer(results))
+
+    if shared_memory:
+        pipeline.connect('producer', consumers, shape=CHUNK, num_slots=8)
+    else:
+        for i, name in enumerate(consumers):
+            pipeline.connect(('producer', 'queues', i), name, maxsize=8)
+
+    pipeline.start()
+    time.sleep(DURATION)
+    pipeline.stop()
+    pipeline.close()
+
+    rates = [results.get() for _ in consumers]
+    mb = np.prod(CHUNK) * 8 / 1e6
+    print(f'{"shared memory" if shared_memory else "queues":<14}: {min(rates):7.1f} chunks/s per consumer ({min(rates)*mb:.0f} MB/s)')
+
+if __name__ == '__main__':
+
+    logging.basicConfig(level=logging.INFO)
+    run(shared_memory=False)
+    run(shared_memory=True)
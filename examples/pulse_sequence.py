@@ -0,0 +1,36 @@
+from daq_tools.sequence import PulseSequence
+import logging
+
+# Gating protocol: 10 s of 1 ms camera triggers at 100 Hz on line 0, a laser
+# gate on line 1 around every 10th trigger, and an analog stimulus ramping
+# up in 5 steps. Compiling prints the compile time and the memory used
+# compared to rendering the whole sequence. Set PLAY to output it.
+
+SAMPLE_RATE = 100_000
+PLAY = False
+
+if __name__ == '__main__':
+
+    logging.basicConfig(level=logging.INFO)
+
+    seq = PulseSequence(SAMPLE_RATE)
+    seq.digital_pulse(0, start=0, width=1e-3, period=10e-3, count=1000)
+    seq.digital_pulse(1, start=-1e-3, width=3e-3, period=100e-3, count=100)
+    for step in range(5):
+        seq.analog(0, time=2*step, value=0.5*step)
+    compiled = seq.compile(duration=10)
+    for segment in compiled.segments:
+        print(f'from sample {segment.start}: {len(segment.ids)} run(s) x {segment.count} (+{segment.extra} samples)')
+
+    # a purely periodic sequence is regenerated by the board from one period
+    trigger = PulseSequence(SAMPLE_RATE)
+    trigger.digital_pulse(0, start=0, width=1e-3, period=10e-3, count=1000)
+    periodic = trigger.compile(duration=10)
+    print(f'periodic: {periodic.periodic}, period of {len(periodic.period())} samples')
+
+    if PLAY:
+        from daq_tools.national_instruments import NI_HardTiming
+        daq = NI_HardTiming(0, SAMPLE_RATE, digital_lines=[0, 1], analog_channels=[0])
+        daq.play(compiled)
+        daq.wait_until_done()
+        daq.close()
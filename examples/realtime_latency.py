@@ -0,0 +1,43 @@
+from daq_tools.realtime import RealtimeConfig, Policy, measure_scheduling_latency
+from multiprocessing import Process, Event, Queue
+import os
+
+# Scheduling latency of a process with and without real-time settings, while
+# other processes keep every CPU busy. Real-time priorities need root or
+# CAP_SYS_NICE, otherwise the settings are skipped with a warning.
+
+DURATION = 2.0
+
+def load(stop_event):
+    while not stop_event.is_set():
+        pass
+
+def probe(config, results):
+    failed = config.apply()
+    results.put((failed, measure_scheduling_latency(DURATION)))
+
+if __name__ == '__main__':
+
+    stop_event = Event()
+    loads = [Process(target=load, args=(stop_event,)) for i in range(2 * os.cpu_count())]
+    for p in loads:
+        p.start()
+
+    configs = {
+        'default': RealtimeConfig(),
+        'pinned': RealtimeConfig(cpus=[0]),
+        'SCHED_FIFO 80, pinned, locked': RealtimeConfig(cpus=[0], policy=Policy.FIFO, priority=80, lock_memory=True)
+    }
+
+    try:
+        for name, config in configs.items():
+            results = Queue()
+            p = Process(target=probe, args=(config, results))
+            p.start()
+            failed, latency = results.get()
+            p.join()
+            print(f'{name:>30}: {latency}' + (f' (not applied: {failed})' if failed else ''))
+    finally:
+        stop_event.set()
+        for p in loads:
+            p.join()
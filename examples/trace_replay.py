@@ -0,0 +1,51 @@
+from daq_tools import Simulated_SoftTiming, TracingDAQ, replay_trace, IOMethod, IOOperation
+import os
+import tempfile
+import time
+import logging
+
+TRACE = os.path.join(tempfile.gettempdir(), 'daq_tools_session.trace')
+DEVICE_LATENCY = 1e-3 # simulated USB round trip
+NUM_CYCLES = 200
+
+if __name__ == '__main__':
+
+    logging.basicConfig(
+        level=logging.WARNING,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    # record a session
+    with TracingDAQ(Simulated_SoftTiming(0, latency=DEVICE_LATENCY), TRACE) as daq:
+        for i in range(NUM_CYCLES):
+            daq.digital_write(0, True)
+            daq.analog_read(0)
+            daq.execute([
+                IOOperation(IOMethod.ANALOG_WRITE, 0, i/NUM_CYCLES),
+                IOOperation(IOMethod.DIGITAL_WRITE, 0, False)
+            ])
+            time.sleep(2e-3)
+
+    # tracing overhead, without device latency
+    with Simulated_SoftTiming(0) as sim:
+        start = time.perf_counter()
+        for i in range(10_000):
+            sim.digital_write(0, i % 2)
+        plain = (time.perf_counter() - start) / 10_000
+    with TracingDAQ(Simulated_SoftTiming(0), TRACE + '.overhead') as traced:
+        start = time.perf_counter()
+        for i in range(10_000):
+            traced.digital_write(0, i % 2)
+        overhead = (time.perf_counter() - start) / 10_000 - plain
+    os.unlink(TRACE + '.overhead')
+    print(f'tracing overhead: {1e6*overhead:.2f}us per call')
+
+    # replay
+    for speed in [1, 10, None]:
+        with Simulated_SoftTiming(0, latency=DEVICE_LATENCY) as sim:
+            start = time.perf_counter()
+            report = replay_trace(TRACE, sim, speed)
+            duration = time.perf_counter() - start
+        print(f'speed {speed}: {report.num_calls} calls in {duration:.3f}s, lateness {report.lateness}')
+        for name, stats in report.durations.items():
+            print(f'    {name}: replayed {stats}, recorded {report.recorded_durations[name]}')
@@ -1,4 +1,4 @@
-from distutils.core import setup
+from setuptools import setup
 
 setup(
     name='daq_tools',
@@ -13,6 +13,10 @@ setup(
         "labjackpython",
         "pyFirmata @ git+https://github.com/tino/pyFirmata.git",
         "pyserial",
-        "nidaqmx"
-    ]
+        "nidaqmx",
+        "numpy"
+    ],
+    entry_points={
+        'console_scripts': ['daq-tools = daq_tools.cli:main']
+    }
 )
\ No newline at end of file
@@ -0,0 +1,102 @@
+from daq_tools.calibration import U3Calibration, NOMINAL
+import numpy as np
+import pytest
+
+def cal_data(seed = 0):
+    # distinct constants per channel, around the nominal ones
+    rng = np.random.default_rng(seed)
+    return {key: value * (1 + 0.01 * rng.standard_normal()) + 0.001 * rng.standard_normal() for key, value in NOMINAL.items()}
+
+# scalar conversions as LabJackPython does them (u3.U3.binaryToCalibratedAnalogVoltage, voltageToDACBits)
+def scalar_volts(data, counts, channel, is_hv = False, differential = False):
+    if differential:
+        return data['lvDiffSlope'] * counts + data['lvDiffOffset']
+    if is_hv and channel < 4:
+        return data[f'hvAIN{channel}Slope'] * counts + data[f'hvAIN{channel}Offset']
+    return data['lvSESlope'] * counts + data['lvSEOffset']
+
+def scalar_dac(data, volts, channel):
+    bits = (volts * data[f'dac{channel}Slope'] + data[f'dac{channel}Offset']) * 256
+    return int(min(max(bits, 0), 0xFFFF))
+
+COUNTS = np.random.default_rng(1).integers(0, 1 << 16, (50, 6)).astype(np.float64)
+CHANNELS = [0, 3, 4, 7, 15, 2]
+
+@pytest.mark.parametrize('is_hv', [False, True])
+@pytest.mark.parametrize('differential', [False, True])
+def test_counts_to_volts(is_hv, differential):
+    data = cal_data()
+    calibration = U3Calibration(1234, data, is_hv)
+    volts = calibration.counts_to_volts(COUNTS, CHANNELS, differential)
+    expected = [[scalar_volts(data, c, ch, is_hv, differential) for c, ch in zip(row, CHANNELS)] for row in COUNTS]
+    np.testing.assert_allclose(volts, expected, rtol = 1e-12, atol = 1e-12)
+
+    # single channel, into a preallocated buffer
+    out = np.empty(50)
+    calibration.counts_to_volts(COUNTS[:, 1], 3, differential, out = out)
+    np.testing.assert_allclose(out, [scalar_volts(data, c, 3, is_hv, differential) for c in COUNTS[:, 1]])
+
+def test_volts_to_dac():
+    data = cal_data()
+    calibration = U3Calibration(1234, data)
+    volts = np.array([[-1, -1], [0, 0], [0.3, 1.7], [2.5, 4.99], [5, 5], [6, 100]])
+    expected = [[scalar_dac(data, v, ch) for ch, v in enumerate(row)] for row in volts]
+    bits = calibration.volts_to_dac(volts, [0, 1])
+    assert bits.dtype == np.uint16
+    np.testing.assert_array_equal(bits, expected)
+
+    in_range = volts[2:4]
+    np.testing.assert_allclose(calibration.dac_to_volts(calibration.volts_to_dac(in_range, [0, 1]), [0, 1]), in_range, atol = 1e-3)
+
+def test_scaling():
+    data = cal_data()
+    calibration = U3Calibration(1234, data)
+    calibration.set_scaling(3, gain = 2.0, offset = -1.0)
+    calibration.set_scaling(4, gain = 0.5, polynomial = [1.0, 0.0, 3.0])
+    with pytest.raises(IndexError):
+        calibration.set_scaling(16, gain = 2)
+
+    values = calibration.counts_to_volts(COUNTS, CHANNELS)
+    raw = calibration.counts_to_volts(COUNTS, CHANNELS, scaling = False)
+    volts = np.array([[scalar_volts(data, c, ch) for c, ch in zip(row, CHANNELS)] for row in COUNTS])
+    np.testing.assert_allclose(raw, volts)
+    np.testing.assert_allclose(values[:, 1], 2 * volts[:, 1] - 1)
+    np.testing.assert_allclose(values[:, 2], 1 + 3 * (0.5 * volts[:, 2]) ** 2)
+    np.testing.assert_allclose(values[:, [0, 3, 4, 5]], volts[:, [0, 3, 4, 5]])
+
+    calibration.set_scaling(4) # back to volts
+    np.testing.assert_allclose(calibration.counts_to_volts(COUNTS[:, 2], 4), volts[:, 2])
+
+def test_nominal():
+    calibration = U3Calibration.nominal(serial = 7, is_hv = True)
+    assert calibration.counts_to_volts(np.array([0.0]), 0)[0] == pytest.approx(-10.3)
+    assert calibration.counts_to_volts(np.array([65535.0]), 5)[0] == pytest.approx(65535 * 0.000037231)
+
+class FakeU3:
+    serialNumber = 320012345
+    isHV = True
+
+    def __init__(self, data):
+        self.data = data
+        self.reads = 0
+
+    def getCalibrationData(self):
+        self.reads += 1
+        return self.data
+
+def test_load_from_cache(tmp_path):
+    device = FakeU3(cal_data())
+    first = U3Calibration.load(device, str(tmp_path))
+    second = U3Calibration.load(device, str(tmp_path))
+    assert device.reads == 1
+    assert second.cal_data == first.cal_data and second.is_hv
+    assert device.calData == first.cal_data
+
+    U3Calibration.load(device, str(tmp_path), refresh = True)
+    assert device.reads == 2
+    U3Calibration.load(FakeU3(cal_data(1)), None)
+
+    # a cache of another device is ignored
+    (tmp_path / f'u3_{FakeU3.serialNumber}.json').write_text('{"serial": 1, "is_hv": true, "cal_data": {}}')
+    assert U3Calibration.load(device, str(tmp_path)).serial == FakeU3.serialNumber
+    assert device.reads == 3
@@ -0,0 +1,70 @@
+from daq_tools.chunking import ChunkCostModel, ChunkSizeController, AdaptiveChunking
+import math
+import pytest
+
+RATE = 10_000
+
+def test_cost_model_fit():
+    model = ChunkCostModel()
+    for n in [100, 400, 50, 1000, 250] * 4:
+        model.add(n, 1e-4 + 2e-7 * n)
+    per_chunk, per_sample = model.coefficients
+    assert per_chunk == pytest.approx(1e-4)
+    assert per_sample == pytest.approx(2e-7)
+    assert model.predict(2000) == pytest.approx(1e-4 + 2e-7 * 2000)
+
+def test_cost_model_same_size_counts_as_overhead():
+    model = ChunkCostModel()
+    assert model.coefficients == (0.0, 0.0)
+    for _ in range(10):
+        model.add(500, 1e-3)
+    assert model.coefficients == pytest.approx((1e-3, 0.0))
+
+def test_controller_bounds():
+    controller = ChunkSizeController(RATE, 0.1, max_chunk = 100_000, buffer_size = 600, granularity = 64)
+    assert controller.max_chunk == 300
+    assert controller.chunk_size == 320 # half of the latency budget, clipped to max_chunk, rounded to 64
+
+    controller.limit(200)
+    assert (controller.max_chunk, controller.chunk_size) == (192, 192)
+    with pytest.raises(ValueError):
+        controller.limit(10)
+    with pytest.raises(ValueError):
+        ChunkSizeController(RATE, 0.1, min_chunk = 100, max_chunk = 10)
+
+def test_controller_meets_target():
+    controller = ChunkSizeController(RATE, 0.01, initial = 10, hysteresis = 0)
+    per_chunk, per_sample = 1e-3, 1e-6
+    size = controller.update(per_chunk, per_sample, 0)
+    expected = (0.01 - per_chunk) / (1 / RATE + per_sample)
+    assert size == round(expected)
+    assert controller.predicted_latency(size, per_chunk, per_sample, 0) == pytest.approx(0.01, abs = 1 / RATE)
+    assert controller.decisions[-1].previous == 10
+
+def test_controller_keeps_up_with_the_stream():
+    controller = ChunkSizeController(RATE, 1e-3, hysteresis = 0)
+    # 10 ms per chunk cannot meet 1 ms, chunks must hold at least per_chunk / (0.8 / RATE - per_sample) samples
+    size = controller.update(1e-2, 1e-5, 0)
+    assert size == math.ceil(1e-2 / (0.8 / RATE - 1e-5))
+    assert 'not reachable' in controller.decisions[-1].reason
+
+    # slower than the sample rate at any chunk size
+    assert controller.update(0, 1 / RATE, 0) == controller.max_chunk
+
+def test_controller_hysteresis():
+    controller = ChunkSizeController(RATE, 0.01, initial = 80, hysteresis = 0.1)
+    assert controller.update(0, 0, 0) == 100 # largest = 0.01 * RATE
+    controller = ChunkSizeController(RATE, 0.01, initial = 95, hysteresis = 0.1)
+    assert controller.update(0, 0, 0) == 95
+    assert not controller.decisions
+
+def test_adaptive_chunking():
+    chunking = AdaptiveChunking(RATE, 0.01, initial = 10, hysteresis = 0)
+    try:
+        assert chunking.next_chunk_size() == 10 # nothing reported yet
+        for n in [10, 20, 40, 80]:
+            chunking.report(n, 1e-3 + 1e-6 * n)
+        assert chunking.next_chunk_size() == round((0.01 - 1e-3) / (1 / RATE + 1e-6))
+        assert chunking.chunk_size == chunking.controller.chunk_size
+    finally:
+        chunking.close()
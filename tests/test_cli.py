@@ -0,0 +1,75 @@
+from daq_tools import cli, backends, BoardType, Simulated_SoftTiming
+from daq_tools.backends import BackendRegistry
+import functools
+import subprocess
+import sys
+import pytest
+
+def imported_modules(statement):
+    code = f'import sys; {statement}; print(" ".join(sys.modules))'
+    return subprocess.run([sys.executable, '-c', code], capture_output = True, text = True, check = True).stdout.split()
+
+@pytest.mark.parametrize('statement', ['import daq_tools', 'import daq_tools.cli', 'from daq_tools import Simulated_SoftTiming'])
+def test_light_imports(statement):
+    modules = imported_modules(statement)
+    assert 'numpy' not in modules
+    assert not [m for m in modules if m in ('daq_tools.pipeline', 'daq_tools.arduino', 'daq_tools.labjack', 'daq_tools.national_instruments')]
+
+def test_lazy_attributes():
+    modules = imported_modules('import daq_tools; daq_tools.RunningStatistics')
+    assert 'daq_tools.statistics' in modules and 'daq_tools.recording' not in modules
+    import daq_tools
+    assert 'ClockEstimator' in dir(daq_tools)
+    with pytest.raises(AttributeError):
+        daq_tools.NoSuchThing
+
+def test_registry_missing_backend(monkeypatch):
+    monkeypatch.setitem(backends.BACKENDS, BoardType.ARDUINO, ('no_such_backend', 'Missing', 'install nothing'))
+    registry = BackendRegistry()
+    with pytest.raises(KeyError):
+        registry[BoardType.ARDUINO]
+    assert isinstance(registry.errors()[BoardType.ARDUINO], ImportError)
+    assert BoardType.ARDUINO not in registry
+    assert registry[BoardType.SIMULATED] is Simulated_SoftTiming
+
+    registry[BoardType.ARDUINO] = Simulated_SoftTiming
+    assert registry[BoardType.ARDUINO] is Simulated_SoftTiming and not registry.errors()
+
+def test_parse_board():
+    assert cli.parse_board('sim') == (BoardType.SIMULATED, None)
+    assert cli.parse_board('labjack:320012345') == (BoardType.LABJACK, 320012345)
+    assert cli.parse_board('arduino:/dev/ttyACM0') == (BoardType.ARDUINO, '/dev/ttyACM0')
+    with pytest.raises(cli.CommandError):
+        cli.parse_board('picoscope')
+
+@pytest.fixture
+def cache_file(tmp_path, monkeypatch):
+    path = str(tmp_path / 'boards.json')
+    monkeypatch.setattr(cli, 'discover', functools.partial(cli.discover, cache_file = path))
+    return path
+
+def test_list(cache_file, capsys):
+    assert cli.main(['list', 'simulated']) == 0
+    out = capsys.readouterr().out
+    assert '1 board(s) (just now)' in out
+    assert 'Simulated board' in out
+
+    assert cli.main(['list', 'sim']) == 0
+    assert 'cached' in capsys.readouterr().out
+    assert cli.main(['list', 'sim', '--refresh']) == 0
+    assert 'just now' in capsys.readouterr().out
+
+def test_unknown_board_type(capsys):
+    assert cli.main(['bench', 'picoscope']) == 1
+    assert 'unknown board type' in capsys.readouterr().err
+
+def test_bench(capsys):
+    assert cli.main(['bench', 'simulated', '-n', '20', '--batch', '4', '--ops', 'digital_read', 'pwm_write']) == 0
+    out = capsys.readouterr().out
+    assert 'digital_read' in out and 'pwm_write' in out and 'batch of 4' in out
+
+def test_monitor(capsys):
+    assert cli.main(['monitor', 'simulated', '--analog', '0', '--digital', '1', '--rate', '200', '--duration', '0.1']) == 0
+    out = capsys.readouterr().out
+    assert 'AI0' in out and 'DI1' in out
+    assert 'overrun(s)' in out and 'skipped' in out
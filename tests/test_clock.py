@@ -0,0 +1,58 @@
+from daq_tools.clock import ClockEstimator, ChunkHeader
+import numpy as np
+import pytest
+
+NOMINAL = 1000.0
+DRIFT = 50e-6 # device runs 50 ppm fast
+START = 12345.0 # time.monotonic() of the first sample
+DELAY = 2e-3 # smallest transfer delay
+
+def headers(num_chunks, chunk_size = 100, outliers = 17, seed = 0):
+    rng = np.random.default_rng(seed)
+    rate = NOMINAL * (1 + DRIFT)
+    for i in range(num_chunks):
+        header = ChunkHeader(i * chunk_size, chunk_size, 0.0)
+        delay = DELAY + rng.uniform(0, 50e-6)
+        if i % outliers == 5:
+            delay += rng.uniform(5e-3, 20e-3) # process descheduled while reading
+        yield header._replace(host_time = START + header.last_sample / rate + delay)
+
+def test_drift_with_outliers():
+    clock = ClockEstimator(NOMINAL, window = 128)
+    for header in headers(300):
+        clock.add(header)
+
+    assert clock.drift_ppm == pytest.approx(DRIFT * 1e6, abs = 2)
+    assert clock.num_rejected >= 128 // 17
+    assert clock.jitter < 50e-6
+    # moved down onto the earliest timestamps: within the spread of the delays
+    samples = np.array([0, 15_000, 29_999])
+    expected = START + samples / (NOMINAL * (1 + DRIFT)) + DELAY
+    np.testing.assert_allclose(clock.host_time(samples), expected, atol = 60e-6, rtol = 0)
+    np.testing.assert_allclose(clock.sample_index(expected), samples, atol = 0.06)
+
+def test_chunk_times():
+    clock = ClockEstimator(NOMINAL)
+    for header in headers(20):
+        clock.add(header)
+    header = ChunkHeader(500, 10, 0.0)
+    times = clock.chunk_times(header)
+    assert len(times) == 10
+    np.testing.assert_allclose(np.diff(times), clock.period)
+    assert times[0] == pytest.approx(clock.host_time(500))
+
+def test_few_points_use_nominal_rate():
+    clock = ClockEstimator(NOMINAL)
+    clock.add(ChunkHeader(0, 0, 1.0)) # empty chunks are ignored
+    first, second = list(headers(2, outliers = 1000))
+    clock.add(second)
+    clock.add(first)
+    assert clock.period == 1 / NOMINAL
+    # through the point with the smallest delay, below the other one
+    late = [h.host_time - clock.host_time(h.last_sample) for h in (first, second)]
+    assert min(late) == pytest.approx(0, abs = 1e-9) and max(late) > 0
+
+def test_header_bytes():
+    header = ChunkHeader(2 ** 40, 512, 12345.678)
+    assert ChunkHeader.from_bytes(header.to_bytes()) == header
+    assert header.last_sample == 2 ** 40 + 511
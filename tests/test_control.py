@@ -0,0 +1,40 @@
+from daq_tools import Simulated_SoftTiming, ControlLoop, IOMethod, IOOperation
+import time
+import pytest
+
+RATE = 100
+PERIOD = 1 / RATE
+
+def slow_step(slow_iterations):
+    calls = []
+    def step(t, inputs):
+        calls.append((t, inputs))
+        if len(calls) - 1 in slow_iterations:
+            time.sleep(2.5 * PERIOD)
+        return [IOOperation(IOMethod.DIGITAL_WRITE, 0, len(calls) % 2)]
+    return step, calls
+
+@pytest.mark.parametrize('skip_missed', [True, False])
+def test_overrun_accounting(skip_missed):
+    with Simulated_SoftTiming(0) as daq:
+        step, calls = slow_step({2})
+        loop = ControlLoop(daq, RATE, step, inputs=[IOOperation(IOMethod.ANALOG_READ, 0)], skip_missed=skip_missed)
+        stats = loop.run(iterations=8)
+
+    assert stats.iterations == len(calls) == 8
+    assert stats.overruns >= 1
+    if skip_missed:
+        # iteration 2 ended between deadlines 4 and 5: deadlines 3 and 4 are dropped
+        assert stats.skipped == 2
+        assert [round(t / PERIOD) for t, _ in calls][:4] == [0, 1, 2, 5]
+    else:
+        assert stats.skipped == 0
+        assert [round(t / PERIOD) for t, _ in calls] == list(range(8))
+    assert all(inputs == [0.0] for _, inputs in calls)
+
+def test_no_overrun():
+    with Simulated_SoftTiming(0) as daq:
+        loop = ControlLoop(daq, RATE, lambda t, inputs: None)
+        stats = loop.run(duration=10 * PERIOD)
+    assert stats.iterations == 10
+    assert stats.overruns == stats.skipped == 0
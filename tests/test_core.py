@@ -0,0 +1,95 @@
+from daq_tools import Simulated_SoftTiming, IOMethod, IOOperation
+import threading
+import time
+import pytest
+
+class ArduinoLike(Simulated_SoftTiming):
+    """PWM is a mode of some digital pins, which are not listed as digital outputs"""
+
+    PWM_ON_DIGITAL_PINS = True
+    PWM_PINS = [3, 5, 6]
+
+    def __init__(self):
+        super().__init__(0, num_digital=8, num_pwm=8, num_analog_output=0)
+
+    def list_digital_output_channels(self):
+        return [c for c in range(8) if c not in self.PWM_PINS]
+
+    def list_pwm_output_channels(self):
+        return self.PWM_PINS
+
+def resets(daq):
+    return {(op.method, op.channel) for op in daq._reset_operations()}
+
+def test_reset_separate_pwm_channels():
+    with Simulated_SoftTiming(0, num_digital=2, num_analog_output=1, num_pwm=2) as daq:
+        assert resets(daq) == set() # reset when opened
+
+        daq.forget_output_state()
+        assert resets(daq) == {
+            (IOMethod.DIGITAL_WRITE, 0), (IOMethod.DIGITAL_WRITE, 1),
+            (IOMethod.ANALOG_WRITE, 0),
+            (IOMethod.PWM_WRITE, 0), (IOMethod.PWM_WRITE, 1),
+        }
+        daq.reset_state()
+        daq.digital_write(1, True)
+        daq.pwm_write(0, 0.5)
+        assert resets(daq) == {(IOMethod.DIGITAL_WRITE, 1), (IOMethod.PWM_WRITE, 0)}
+
+def test_reset_pwm_on_digital_pins():
+    with ArduinoLike() as daq:
+        daq.forget_output_state()
+        # every pin, as a digital output: no pin is switched to PWM mode
+        assert resets(daq) == {(IOMethod.DIGITAL_WRITE, c) for c in range(8)}
+        daq.reset_state()
+        assert resets(daq) == set()
+        assert daq.pwm_output == {}
+
+        daq.pwm_write(5, 0.5)
+        daq.digital_write(3, True)
+        assert resets(daq) == {(IOMethod.PWM_WRITE, 5), (IOMethod.DIGITAL_WRITE, 3)}
+
+        # pin 5 back to a digital output
+        daq.digital_write(5, True)
+        assert resets(daq) == {(IOMethod.DIGITAL_WRITE, 5), (IOMethod.DIGITAL_WRITE, 3)}
+
+def test_reset_after_failed_batch():
+    with Simulated_SoftTiming(0) as daq:
+        with pytest.raises(ValueError):
+            daq.execute([
+                IOOperation(IOMethod.DIGITAL_WRITE, 0, 1), # applied
+                IOOperation(IOMethod.PWM_WRITE, 0, 5.0), # fails
+            ])
+        assert daq.digital_output[0] is True
+        assert (IOMethod.DIGITAL_WRITE, 0) in resets(daq)
+        daq.reset_state()
+        assert daq.digital_output[0] is False
+
+def test_reset_after_failed_write():
+    with Simulated_SoftTiming(0) as daq:
+        daq.pwm_write(1, 0.5)
+        with pytest.raises(ValueError):
+            daq.pwm_write(1, 2.0)
+        assert 1 not in daq.get_output_state().pwm
+        assert (IOMethod.PWM_WRITE, 1) in resets(daq)
+
+def test_coalesced_last_write_wins():
+    with Simulated_SoftTiming(0) as daq:
+        transactions = daq.num_transactions
+        first = threading.Thread(target=daq.analog_write, args=(0, 1.0))
+        with daq.device_access():
+            first.start()
+            while ('analog_write', 0) not in daq._pending_writes: # first write waits for the device
+                time.sleep(1e-3)
+            # later writes from other threads replace the pending value and return
+            others = [threading.Thread(target=daq.analog_write, args=(0, v)) for v in (2.0, 3.0, 4.0)]
+            for thread in others:
+                thread.start()
+                thread.join()
+            daq.analog_write(1, 5.0) # another channel is not merged
+        first.join()
+
+        assert daq.analog_output == {0: 4.0, 1: 5.0}
+        assert daq.get_output_state().analog == {0: 4.0, 1: 5.0}
+        assert daq.num_transactions - transactions == 2
+        assert daq.access_stats.writes_coalesced == 3
@@ -0,0 +1,30 @@
+from daq_tools.decimation import FIRDecimator, MultiStageDecimator, DecimatorBank
+import numpy as np
+import pytest
+
+def chunked(process, x, chunk_size):
+    outputs = [process(x[start:start + chunk_size]) for start in range(0, len(x), chunk_size)]
+    return np.concatenate(outputs)
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 7, 50])
+def test_fir_chunks_shorter_than_filter(chunk_size):
+    x = np.random.default_rng(0).standard_normal((1000, 2))
+    decimator = FIRDecimator(5, 2)
+    assert chunk_size < len(decimator.taps)
+
+    expected = decimator.process(x)
+    decimator.reset()
+    np.testing.assert_allclose(chunked(decimator.process, x, chunk_size), expected)
+
+def test_fir_empty_chunk():
+    decimator = FIRDecimator(4, 3)
+    y = decimator.process(np.empty((0, 3)))
+    assert y.shape == (0, 3)
+
+@pytest.mark.parametrize('chunk_size', [10, 1000])
+def test_bank_large_factor(chunk_size):
+    x = np.random.default_rng(1).standard_normal((40000, 1))
+
+    expected = MultiStageDecimator(10000, 1).process(x)
+    bank = DecimatorBank([10000], 1)
+    np.testing.assert_allclose(chunked(lambda chunk: bank.process(chunk)[10000], x, chunk_size), expected)
@@ -0,0 +1,66 @@
+from daq_tools.digital import pack, unpack, from_port_words, to_port_words, transitions, TransitionFinder, num_bytes
+import numpy as np
+import pytest
+
+def random_lines(num_samples, num_lines, seed = 0):
+    # few changes per line, like real TTL signals
+    rng = np.random.default_rng(seed)
+    return np.cumsum(rng.random((num_samples, num_lines)) < 0.1, axis=0) % 2 == 1
+
+def brute_force(lines, previous = None):
+    before = np.vstack((lines[:1] if previous is None else previous[np.newaxis], lines[:-1]))
+    index, line = np.nonzero(lines != before) # sorted by index, then line
+    return index, line, lines[index, line]
+
+@pytest.mark.parametrize('num_lines', [1, 7, 8, 13, 32])
+def test_round_trip(num_lines):
+    lines = random_lines(200, num_lines)
+    packed = pack(lines)
+    assert packed.words.shape == (200, num_bytes(num_lines)) and packed.num_lines == num_lines
+    np.testing.assert_array_equal(unpack(packed), lines)
+    np.testing.assert_array_equal(unpack(packed, np.uint8), lines.astype(np.uint8))
+    # analog levels
+    np.testing.assert_array_equal(unpack(pack(lines * 3.3, level = 1.5)), lines)
+
+def test_bit_order():
+    lines = np.zeros((1, 10), dtype=bool)
+    lines[0, [0, 3, 9]] = True
+    np.testing.assert_array_equal(pack(lines).words, [[0b1001, 0b10]])
+    np.testing.assert_array_equal(to_port_words(pack(lines)), [(1 << 0) | (1 << 3) | (1 << 9)])
+
+@pytest.mark.parametrize('num_lines', [5, 8, 12, 24])
+def test_port_words(num_lines):
+    rng = np.random.default_rng(1)
+    words = rng.integers(0, 1 << 32, 100, dtype=np.uint32)
+    packed = from_port_words(words, num_lines)
+    # bits above the last line are cleared
+    np.testing.assert_array_equal(to_port_words(packed), words & ((1 << num_lines) - 1))
+    expected = (words[:, np.newaxis] >> np.arange(num_lines).astype(np.uint32)) & 1 == 1
+    np.testing.assert_array_equal(unpack(packed), expected)
+
+    with pytest.raises(ValueError):
+        to_port_words(pack(np.zeros((1, 20), dtype=bool)), np.uint8)
+
+@pytest.mark.parametrize('num_lines', [1, 9, 16])
+def test_transitions(num_lines):
+    lines = random_lines(300, num_lines, seed = 2)
+    found = transitions(pack(lines))
+    for actual, expected in zip(found, brute_force(lines)):
+        np.testing.assert_array_equal(actual, expected)
+
+    previous = ~lines[0]
+    found = transitions(pack(lines), pack(previous[np.newaxis]).words[0])
+    assert np.all(found.line[found.index == 0] == np.arange(num_lines))
+    for actual, expected in zip(found, brute_force(lines, previous)):
+        np.testing.assert_array_equal(actual, expected)
+
+def test_transition_finder_across_chunks():
+    lines = random_lines(500, 11, seed = 3)
+    finder = TransitionFinder()
+    parts = [finder.find(pack(lines[start:stop])) for start, stop in [(0, 1), (1, 100), (100, 100), (100, 317), (317, 500)]]
+    for i, expected in enumerate(brute_force(lines)):
+        np.testing.assert_array_equal(np.concatenate([part[i] for part in parts]), expected)
+
+def test_empty():
+    found = transitions(pack(np.zeros((0, 4), dtype=bool)))
+    assert len(found.index) == len(found.line) == len(found.rising) == 0
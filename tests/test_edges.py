@@ -0,0 +1,101 @@
+from daq_tools import Simulated_SoftTiming, Edge
+from daq_tools.edges import PollingEdgeWatcher
+import queue
+import threading
+import time
+import pytest
+
+TIMEOUT = 2.0
+
+@pytest.fixture
+def daq():
+    with Simulated_SoftTiming(0) as daq:
+        yield daq
+
+def test_on_edge(daq):
+    events = queue.Queue()
+    rising = daq.on_edge(2, events.put)
+    both = daq.on_edge(2, events.put, Edge.BOTH)
+    time.sleep(0.05) # initial state polled: no event
+
+    daq.set_digital_input(2, True)
+    first, second = events.get(timeout = TIMEOUT), events.get(timeout = TIMEOUT)
+    assert first.channel == second.channel == 2 and first.rising and second.rising
+
+    daq.set_digital_input(2, False)
+    event = events.get(timeout = TIMEOUT)
+    assert not event.rising and event.latency > 0
+
+    daq.remove_edge_callback(both)
+    daq.set_digital_input(2, True)
+    assert events.get(timeout = TIMEOUT).rising
+    daq.set_digital_input(2, False)
+    time.sleep(0.1)
+    assert events.empty()
+
+    daq.remove_edge_callback(rising)
+    stats = daq.get_edge_stats()
+    assert stats.events == 4 and stats.errors == 0
+    assert stats.reads == stats.transactions > 0
+
+def test_wait_for_edge(daq):
+    assert daq.wait_for_edge(5, timeout = 0.05) is None
+
+    timer = threading.Timer(0.05, daq.set_digital_input, (5, True))
+    timer.start()
+    event = daq.wait_for_edge(5, Edge.RISING, timeout = TIMEOUT)
+    timer.join()
+    assert event is not None and event.channel == 5 and event.rising
+
+class RecordingWatcher(PollingEdgeWatcher):
+    """Keeps the interval in use and the channels read at every poll"""
+
+    def __init__(self, *args, **kwargs):
+        self.polls = []
+        super().__init__(*args, **kwargs)
+
+    def _poll(self, channels):
+        self.polls.append((self.interval, channels))
+        return super()._poll(channels)
+
+def test_one_transaction_per_poll(daq):
+    watcher = RecordingWatcher(daq, min_interval = 1e-3, max_interval = 1e-3)
+    try:
+        for channel in range(4):
+            watcher.add(channel, Edge.BOTH, lambda event: None)
+        time.sleep(0.02)
+        transactions = daq.num_transactions
+        polls = len(watcher.polls)
+        time.sleep(0.05)
+        assert daq.num_transactions - transactions == pytest.approx(len(watcher.polls) - polls, abs = 1)
+        assert watcher.polls[-1][1] == [0, 1, 2, 3]
+    finally:
+        watcher.stop()
+
+def test_backoff_when_idle(daq):
+    watcher = RecordingWatcher(daq, min_interval = 1e-3, max_interval = 8e-3, backoff = 2)
+    try:
+        events = queue.Queue()
+        watcher.add(1, Edge.RISING, events.put)
+        time.sleep(0.1)
+        assert watcher.interval == 8e-3
+        daq.set_digital_input(1, True)
+        events.get(timeout = TIMEOUT)
+        polls = len(watcher.polls)
+        while len(watcher.polls) < polls + 4:
+            time.sleep(1e-3)
+        # back to the shortest interval after an edge, then growing again
+        intervals = [interval for interval, channels in watcher.polls[polls:polls + 4]]
+        assert intervals[0] <= 2e-3 and intervals == sorted(intervals)
+    finally:
+        watcher.stop()
+
+def test_failing_callback_does_not_stop_the_watcher(daq):
+    events = queue.Queue()
+    def broken(event):
+        raise RuntimeError('callback error')
+    daq.on_edge(3, broken)
+    daq.on_edge(3, events.put)
+    time.sleep(0.05)
+    daq.set_digital_input(3, True)
+    assert events.get(timeout = TIMEOUT).rising
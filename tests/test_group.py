@@ -0,0 +1,46 @@
+from daq_tools import Simulated_SoftTiming, DAQGroup, IOMethod
+import time
+import pytest
+
+@pytest.fixture
+def group():
+    daqs = {name: Simulated_SoftTiming(name, latency=0.02) for name in ('a', 'b', 'c')}
+    for i, daq in enumerate(daqs.values()):
+        for channel in range(4):
+            daq.set_analog_input(channel, 10 * i + channel)
+    with DAQGroup(daqs) as group:
+        yield group
+
+def test_execute_keeps_result_order(group):
+    operations = [
+        (IOMethod.ANALOG_READ, ('c', 1), 0),
+        (IOMethod.DIGITAL_WRITE, ('a', 0), 1),
+        (IOMethod.ANALOG_READ, ('a', 3), 0),
+        (IOMethod.ANALOG_READ, ('b', 2), 0),
+        (IOMethod.ANALOG_WRITE, ('b', 0), 0.5),
+        (IOMethod.ANALOG_READ, ('c', 0), 0),
+        (IOMethod.ANALOG_READ, ('a', 1), 0),
+    ]
+    assert group.execute(operations) == [21, None, 3, 12, None, 20, 1]
+    assert group.daqs['a'].digital_output[0] is True
+    assert group.daqs['b'].analog_output[0] == 0.5
+
+def test_execute_runs_devices_concurrently(group):
+    # one transaction per device, all devices at once
+    start = time.perf_counter()
+    group.execute([(IOMethod.ANALOG_READ, (name, 0), 0) for name in 'abc' for _ in range(3)])
+    assert time.perf_counter() - start < 2 * 0.02
+    assert all(daq.num_transactions == 2 for daq in group.daqs.values()) # reset when opened, batch
+
+def test_unknown_device(group):
+    with pytest.raises(ValueError):
+        group.execute([(IOMethod.ANALOG_READ, ('d', 0), 0)])
+    with pytest.raises(ValueError):
+        group.analog_read(('d', 0))
+
+def test_single_calls_and_channels(group):
+    group.digital_write(('b', 2), True)
+    assert group.daqs['b'].digital_output[2] is True
+    assert group.analog_read(('c', 3)) == 23
+    assert ('c', 1) in group.list_pwm_output_channels()
+    assert set(group.latency()) == {'a', 'b', 'c'}
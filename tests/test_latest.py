@@ -0,0 +1,68 @@
+from daq_tools import LatestValues, IOMethod, IOOperation
+import multiprocessing
+import math
+import numpy as np
+import pytest
+
+INPUTS = [IOOperation(IOMethod.ANALOG_READ, 0), IOOperation(IOMethod.ANALOG_READ, 3), (IOMethod.DIGITAL_READ, 2)]
+
+@pytest.fixture
+def latest():
+    latest = LatestValues(INPUTS)
+    yield latest
+    latest.close()
+
+def test_update_and_get(latest):
+    assert latest.inputs == [IOOperation(IOMethod.ANALOG_READ, 0), IOOperation(IOMethod.ANALOG_READ, 3), IOOperation(IOMethod.DIGITAL_READ, 2)]
+    assert math.isnan(latest.get(IOMethod.ANALOG_READ, 3).time)
+
+    latest.update([1.0, 2.0, 1.0], timestamp = 10.0)
+    latest.update([5.0], timestamp = 11.0, rows = [latest.row(IOMethod.ANALOG_READ, 3)])
+    assert latest.get(IOMethod.ANALOG_READ, 3) == (5.0, 11.0, 2)
+    assert latest.get(IOMethod.DIGITAL_READ, 2) == (1.0, 10.0, 1)
+    assert latest.values() == {(IOMethod.ANALOG_READ, 0): 1.0, (IOMethod.ANALOG_READ, 3): 5.0, (IOMethod.DIGITAL_READ, 2): 1.0}
+
+    latest.publish_chunk(np.arange(12.0).reshape(4, 3))
+    latest.publish_chunk(np.empty((0, 3)))
+    table, version = latest.snapshot()
+    np.testing.assert_array_equal(table['value'], [9, 10, 11])
+    np.testing.assert_array_equal(table['count'], [2, 3, 2])
+    assert version == 4 # the table was written when created, then 3 updates
+    assert latest.get(IOMethod.ANALOG_READ, 0).age >= 0
+
+    with pytest.raises(KeyError):
+        latest.get(IOMethod.ANALOG_READ, 1)
+
+def test_attach(latest):
+    latest.publish(0.0, [1.0, 2.0, 3.0])
+    other = LatestValues.attach(latest.name, len(INPUTS))
+    try:
+        assert other.inputs == latest.inputs
+        assert other.values() == latest.values()
+    finally:
+        other.close()
+    # the memory belongs to the creator
+    assert latest.get(IOMethod.ANALOG_READ, 0).value == 1.0
+
+def write(latest, num_updates):
+    for k in range(1, num_updates + 1):
+        latest.update(np.full(len(INPUTS), float(k)), timestamp = float(k))
+    latest.close()
+
+def test_snapshots_are_consistent(latest):
+    # rows written together by another process are always read together
+    num_updates = 20_000
+    writer = multiprocessing.get_context('fork').Process(target = write, args = (latest, num_updates))
+    writer.start()
+    out = np.empty(len(INPUTS), dtype = latest.snapshot()[0].dtype)
+    last_version = 0
+    while writer.is_alive():
+        table, version = latest.snapshot(out)
+        assert version >= last_version
+        last_version = version
+        assert np.all(table['value'] == table['value'][0])
+        assert np.all(table['count'] == table['count'][0])
+        assert np.all(table['time'] == table['value']) or table['count'][0] == 0
+    writer.join()
+    assert writer.exitcode == 0
+    assert latest.get(IOMethod.ANALOG_READ, 3).count == num_updates
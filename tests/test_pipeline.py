@@ -0,0 +1,124 @@
+from daq_tools.pipeline import ChunkRing, RingWriter, RingReader
+from daq_tools.clock import ChunkHeader, TimestampedChunk
+from daq_tools.digital import PackedDigital, pack, unpack
+import multiprocessing
+import queue
+import threading
+import numpy as np
+import pytest
+
+@pytest.fixture
+def ring():
+    ring = ChunkRing(16, 3, num_slots = 4, num_consumers = 3)
+    yield ring
+    ring.close()
+
+def chunk(k, n = 10):
+    return np.full((n, 3), float(k))
+
+def test_refcount_release(ring):
+    assert ring.refcount(0) == 0 # not written yet
+    for k in range(4):
+        assert ring.put(chunk(k), timeout = 0)
+    assert ring.full()
+    assert ring.refcount(0) == 3
+    assert not ring.put(chunk(4), timeout = 0.01) # every slot is held
+
+    # consumers release at their own pace, a slot is reused once all of them did
+    np.testing.assert_array_equal(ring.get(0), chunk(0))
+    ring.get(0) # releases chunk 0 for consumer 0, holds chunk 1
+    ring.get(1)
+    ring.release(1)
+    assert (ring.refcount(0), ring.refcount(1)) == (1, 3)
+    assert ring.full()
+
+    ring.get(2)
+    ring.release(2)
+    assert ring.refcount(0) == 0 and not ring.full()
+    assert ring.put(chunk(4), timeout = 0)
+    assert ring.full()
+    assert [ring.lag(c) for c in range(3)] == [3, 4, 4]
+
+    # the slot of chunk 0 now holds chunk 4
+    for consumer, first in [(0, 2), (1, 1), (2, 1)]:
+        got = [ring.get(consumer) for _ in range(5 - first)]
+        assert [x[0, 0] for x in got] == [float(k) for k in range(first, 5)]
+        assert ring.get(consumer) is None
+    assert ring.drained()
+    assert ring.refcount(4) == 0
+
+def test_consumers_see_every_chunk_in_order(ring):
+    num_chunks = 200
+    results = {consumer: [] for consumer in range(3)}
+
+    def consume(consumer):
+        reader = RingReader(ring, consumer)
+        for _ in range(num_chunks):
+            results[consumer].append(reader.get(timeout = 5)[0, 0])
+
+    threads = [threading.Thread(target = consume, args = (c,)) for c in range(3)]
+    for thread in threads:
+        thread.start()
+    writer = RingWriter(ring)
+    for k in range(num_chunks):
+        writer.put(chunk(k, n = 1 + k % 16), timeout = 5)
+    for thread in threads:
+        thread.join()
+    assert all(values == list(map(float, range(num_chunks))) for values in results.values())
+
+def test_chunk_types_round_trip():
+    ring = ChunkRing(8, 2, dtype = np.uint8, num_slots = 2)
+    try:
+        lines = np.random.default_rng(0).random((8, 13)) < 0.5
+        packed = pack(lines)
+        header = ChunkHeader(1000, 8, 12.5)
+        ring.put(TimestampedChunk(header, packed))
+        ring.put(np.arange(6, dtype = np.uint8).reshape(3, 2))
+
+        got = ring.get(0)
+        assert isinstance(got, TimestampedChunk) and got.header == header
+        assert isinstance(got.data, PackedDigital)
+        np.testing.assert_array_equal(unpack(got.data), lines)
+        with pytest.raises(ValueError):
+            got.data.words[0, 0] = 1 # read-only view
+
+        plain = ring.get(0)
+        assert isinstance(plain, np.ndarray)
+        np.testing.assert_array_equal(plain, np.arange(6).reshape(3, 2))
+        assert ring.get(0) is None
+
+        with pytest.raises(ValueError):
+            ring.put(np.zeros((9, 2), dtype = np.uint8))
+    finally:
+        ring.close()
+
+def test_writer_and_reader_queue_interface(ring):
+    writer, reader = RingWriter(ring), RingReader(ring, 1)
+    with pytest.raises(queue.Empty):
+        reader.get_nowait()
+    for k in range(4):
+        writer.put_nowait(chunk(k))
+    assert writer.qsize() == 4
+    with pytest.raises(queue.Full):
+        writer.put_nowait(chunk(4))
+
+    abandon = threading.Event()
+    abandon.set()
+    RingWriter(ring, abandon).put(chunk(4)) # dropped instead of raising
+    assert reader.get()[0, 0] == 0
+
+def read_in_child(ring, consumer, out):
+    out.put([float(ring.get(consumer)[0, 0]) for _ in range(2)])
+    ring.release(consumer)
+    ring.close()
+
+def test_other_process(ring):
+    ring.put(chunk(1))
+    ring.put(chunk(2))
+    context = multiprocessing.get_context('spawn')
+    out = context.Queue()
+    child = context.Process(target = read_in_child, args = (ring, 2, out))
+    child.start()
+    assert out.get(timeout = 30) == [1.0, 2.0]
+    child.join()
+    assert ring.refcount(0) == 2 and ring.refcount(1) == 2 # consumers 0 and 1 still hold them
@@ -0,0 +1,42 @@
+from daq_tools import RealtimeConfig, Policy, measure_scheduling_latency
+from daq_tools import realtime
+import os
+import pytest
+
+def test_measure_scheduling_latency():
+    stats = measure_scheduling_latency(duration = 0.05, period = 1e-3)
+    assert 45 <= stats.count <= 51
+    assert 0 <= stats.minimum <= stats.maximum
+
+def test_default_config_changes_nothing(monkeypatch):
+    def unexpected(*args):
+        raise AssertionError('should not be called')
+    monkeypatch.setattr(os, 'sched_setaffinity', unexpected, raising = False)
+    monkeypatch.setattr(os, 'sched_setscheduler', unexpected, raising = False)
+    monkeypatch.setattr(realtime, '_lock_memory', unexpected)
+    assert RealtimeConfig().apply() == []
+
+def test_settings_without_permissions_are_skipped(monkeypatch):
+    def denied(*args):
+        raise PermissionError(1, 'Operation not permitted')
+    monkeypatch.setattr(os, 'sched_setaffinity', denied, raising = False)
+    monkeypatch.setattr(os, 'sched_setscheduler', denied, raising = False)
+    monkeypatch.setattr(realtime, '_lock_memory', denied)
+
+    config = RealtimeConfig(cpus = [0], policy = Policy.FIFO, priority = 50, lock_memory = True, probe_duration = 0.01)
+    assert config.apply() == ['cpus', 'policy', 'lock_memory']
+
+    session = config.enter('reader')
+    assert session.failed == ['cpus', 'policy', 'lock_memory']
+    assert session.latency.count > 0
+    assert session.preemptions >= 0
+    session.close()
+
+@pytest.mark.skipif(not hasattr(os, 'sched_getaffinity'), reason = 'Linux only')
+def test_affinity():
+    cpus = sorted(os.sched_getaffinity(0))
+    assert RealtimeConfig(cpus = cpus[:1]).apply() == []
+    try:
+        assert os.sched_getaffinity(0) == set(cpus[:1])
+    finally:
+        os.sched_setaffinity(0, cpus)
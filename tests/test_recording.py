@@ -0,0 +1,75 @@
+from daq_tools import Recorder, RecordingReader
+from daq_tools.digital import pack
+import numpy as np
+import pytest
+
+def record(path, x, chunk_sizes, packed = False):
+    recorder = Recorder(str(path), x.shape[1], 1000.0, base_level = 2, top_level = 6, packed = packed)
+    start = 0
+    for i, size in enumerate(chunk_sizes + [len(x)]):
+        chunk = x[start:start + size]
+        # digital chunks either packed already or as 0/1 samples
+        recorder.write(pack(chunk) if packed and i % 2 else chunk)
+        start += size
+    recorder.close()
+    return RecordingReader(str(path))
+
+def brute_force(x, index, stop):
+    bounds = list(index[1:]) + [stop]
+    bins = [x[a:b] for a, b in zip(index, bounds)]
+    return (
+        np.array([b.min(axis=0) for b in bins]),
+        np.array([b.max(axis=0) for b in bins]),
+        np.array([b.mean(axis=0) for b in bins]),
+    )
+
+def check_envelope(reader, x, start, stop, num_bins):
+    envelope = reader.envelope(start, stop, num_bins)
+    stop = min(stop, len(x))
+    assert envelope.index[0] == start
+    assert np.all(np.diff(envelope.index) > 0) and envelope.index[-1] < stop
+    assert len(envelope.index) >= num_bins
+    minimum, maximum, mean = brute_force(x, envelope.index, stop)
+    np.testing.assert_array_equal(envelope.minimum, minimum)
+    np.testing.assert_array_equal(envelope.maximum, maximum)
+    np.testing.assert_allclose(envelope.mean, mean)
+
+RANGES = [(0, 1000, 10), (3, 997, 7), (100, 613, 20), (37, 2000, 3), (500, 530, 10)]
+
+@pytest.mark.parametrize('chunk_sizes', [[1000], [1] * 50 + [13] * 30, [7, 300, 64, 129]])
+def test_envelope_against_brute_force(tmp_path, chunk_sizes):
+    x = np.random.default_rng(0).standard_normal((1000, 3))
+    reader = record(tmp_path / 'rec', x, chunk_sizes)
+
+    assert reader.num_samples == 1000
+    np.testing.assert_array_equal(reader.samples(250, 260), x[250:260])
+    for start, stop, num_bins in RANGES:
+        check_envelope(reader, x, start, stop, num_bins)
+
+def test_zoomed_in_returns_samples(tmp_path):
+    x = np.random.default_rng(1).standard_normal((100, 2))
+    reader = record(tmp_path / 'rec', x, [])
+    envelope = reader.envelope(10, 20, 50)
+    np.testing.assert_array_equal(envelope.index, np.arange(10, 20))
+    np.testing.assert_array_equal(envelope.minimum, x[10:20])
+    assert len(reader.envelope(20, 10, 5).index) == 0
+
+def test_packed_digital(tmp_path):
+    x = (np.random.default_rng(2).random((1000, 11)) < 0.3).astype(np.uint8)
+    reader = record(tmp_path / 'rec', x, [100, 233, 5], packed = True)
+
+    assert reader.packed and reader.num_samples == 1000
+    np.testing.assert_array_equal(reader.samples(0, 1000), x)
+    np.testing.assert_array_equal(reader.packed_samples(5, 50).words, pack(x[5:50]).words)
+    for start, stop, num_bins in RANGES:
+        check_envelope(reader, x, start, stop, num_bins)
+
+def test_read_while_recording(tmp_path):
+    x = np.random.default_rng(3).standard_normal((1000, 2))
+    path = str(tmp_path / 'rec')
+    recorder = Recorder(path, 2, 1000.0, base_level = 2, top_level = 6, flush_interval = 0)
+    recorder.write(x[:501])
+    reader = RecordingReader(path)
+    assert reader.num_samples == 501
+    check_envelope(reader, x[:501], 0, 1000, 10)
+    recorder.close()
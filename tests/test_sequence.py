@@ -0,0 +1,85 @@
+from daq_tools import PulseSequence
+import numpy as np
+import pytest
+
+RATE = 1000
+
+def brute_force(events, num_samples):
+    """events: (channel, sample, value) in the order they were added"""
+    outputs = {}
+    for channel, sample, value in sorted(events, key = lambda e: e[1]): # stable
+        outputs.setdefault(channel, np.zeros(num_samples))[sample:] = value
+    return outputs
+
+def words(outputs, lines):
+    out = np.zeros(len(next(iter(outputs.values()))), dtype=np.uint32)
+    for line in lines:
+        out |= (outputs[line] > 0.5).astype(np.uint32) << np.uint32(line)
+    return out
+
+def check(compiled, expected_words, expected_levels):
+    n = compiled.num_samples
+    full = compiled.render(0, n)
+    np.testing.assert_array_equal(full.digital, expected_words)
+    if expected_levels is None:
+        assert full.analog is None
+    else:
+        np.testing.assert_array_equal(full.analog, expected_levels)
+    for chunk_size in [1, 7, 64, n]:
+        chunks = list(compiled.chunks(chunk_size))
+        np.testing.assert_array_equal(np.concatenate([c.digital for c in chunks]), expected_words)
+        if expected_levels is not None:
+            np.testing.assert_array_equal(np.concatenate([c.analog for c in chunks]), expected_levels)
+    part = compiled.render(123, 457)
+    np.testing.assert_array_equal(part.digital, expected_words[123:457])
+
+def test_pulse_trains_against_brute_force():
+    seq = PulseSequence(RATE)
+    seq.digital_pulse(0, start = 0.01, width = 0.003, period = 0.02, count = 40)
+    seq.digital_pulse(3, start = 0.5, width = 0.1)
+    seq.analog_pulse(1, start = 0.2, width = 0.05, value = 2.5, baseline = 0.5, period = 0.1, count = 5)
+    seq.analog(1, 0.23, 4.0)
+    seq.digital(3, 0.5, False) # same sample as the rising edge, added later: wins
+    compiled = seq.compile(duration = 1.0)
+
+    events = [(0, 10 + 20 * i + d, v) for i in range(40) for d, v in ((0, 1), (3, 0))]
+    events += [(3, 500, 1), (3, 600, 0)]
+    events += [(1, 200 + 100 * i + d, v) for i in range(5) for d, v in ((0, 2.5), (50, 0.5))]
+    events += [(1, 230, 4.0), (3, 500, 0)]
+    outputs = brute_force(events, 1000)
+    check(compiled, words(outputs, [0, 3]), outputs[1][:, np.newaxis])
+
+    assert compiled.digital_lines == [0, 3] and compiled.analog_channels == [1]
+    assert not compiled.periodic
+    assert compiled.report.num_samples == 1000
+    assert 0 < compiled.report.periodic_samples < 1000
+    assert compiled.report.table_bytes < compiled.report.full_bytes
+
+def test_periodic():
+    seq = PulseSequence(RATE)
+    seq.digital_pulse(1, start = 0, width = 0.002, period = 0.01, count = 100)
+    seq.digital_pulse(2, start = 0.005, width = 0.001, period = 0.01, count = 100)
+    compiled = seq.compile(duration = 1.0)
+
+    assert compiled.periodic
+    assert compiled.segments[0].block_size == 10 and compiled.segments[0].count == 100
+    block = np.array([0b10] * 2 + [0] * 3 + [0b100] + [0] * 4, dtype=np.uint32)
+    check(compiled, np.tile(block, 100), None)
+    np.testing.assert_array_equal(compiled.period().digital, block)
+    np.testing.assert_array_equal(compiled.period(min_size = 25).digital, np.tile(block, 3))
+
+def test_cut_pulse_train_merges_tail():
+    # the sequence ends in the middle of a pulse: still one repeated segment
+    seq = PulseSequence(RATE)
+    seq.digital_pulse(0, start = 0, width = 0.004, period = 0.01, count = 20)
+    compiled = seq.compile(duration = 0.192)
+    assert len(compiled.segments) == 1
+    assert compiled.segments[0].extra == 2
+    block = np.array([1] * 4 + [0] * 6, dtype=np.uint32)
+    np.testing.assert_array_equal(compiled.render(0, 192).digital, np.tile(block, 20)[:192])
+
+def test_errors():
+    with pytest.raises(ValueError):
+        PulseSequence(RATE).compile()
+    with pytest.raises(ValueError):
+        PulseSequence(RATE).digital_pulse(0, start = 0, width = 0.01, period = 0.005, count = 2)
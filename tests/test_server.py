@@ -0,0 +1,120 @@
+from daq_tools import Simulated_SoftTiming, DeviceServer, DeviceClient, DeviceServerError, IOMethod, IOOperation
+from daq_tools.server import HEADER, RESULT, MessageType, Status, _Request
+import socket
+import time
+import pytest
+
+@pytest.fixture
+def board():
+    with Simulated_SoftTiming(0) as board:
+        yield board
+
+@pytest.fixture
+def server(board, tmp_path):
+    server = DeviceServer(board, str(tmp_path / 'daq.sock'), poll_interval=0.01)
+    server.start()
+    yield server
+    server.shutdown()
+
+@pytest.fixture
+def client(server):
+    while not server._channels: # not listening yet
+        time.sleep(1e-3)
+    with DeviceClient(server.address) as client:
+        yield client
+
+def test_round_trip(board, client):
+    board.set_analog_input(3, 1.5)
+    results = client.execute([
+        IOOperation(IOMethod.DIGITAL_WRITE, 0, 1),
+        IOOperation(IOMethod.ANALOG_READ, 3),
+        IOOperation(IOMethod.PWM_WRITE, 1, 0.25),
+    ])
+    assert results == [None, 1.5, None]
+    assert board.digital_output[0] is True
+    assert board.pwm_output[1] == 0.25
+    assert client.get_output_state().digital == {0: True}
+
+    client.reset_state()
+    assert board.digital_output[0] is False
+    assert client.list_pwm_output_channels() == board.list_pwm_output_channels()
+
+@pytest.mark.parametrize('operation', [
+    IOOperation(IOMethod.PWM_WRITE, 0, 5.0), # bad value
+    IOOperation(IOMethod.PWM_READ, 0), # not supported by the simulated board
+    IOOperation(IOMethod.DIGITAL_WRITE, 99, 1), # no such channel
+])
+def test_invalid_request(board, client, operation):
+    with pytest.raises(DeviceServerError):
+        client.execute([IOOperation(IOMethod.DIGITAL_WRITE, 0, 1), operation])
+    # rejected before reaching the board
+    assert board.digital_output.get(0, False) is False
+    assert client.execute([IOOperation(IOMethod.ANALOG_READ, 0)]) == [0.0]
+
+class Pair:
+    """Server side socket to build requests on, and the client side to read the replies from"""
+
+    def __init__(self):
+        self.server, self.client = socket.socketpair()
+        self.request_id = 0
+
+    def request(self, *operations):
+        self.request_id += 1
+        return _Request(self.server, MessageType.EXECUTE, self.request_id, list(operations))
+
+    def reply(self):
+        status, request_id, count = HEADER.unpack(self.client.recv(HEADER.size))
+        size = count * RESULT.size if status == Status.OK else count
+        payload = self.client.recv(size) if size else b''
+        return Status(status), request_id, payload
+
+def test_failed_batch_only_fails_its_request(board, monkeypatch):
+    server = DeviceServer(board, '')
+    a, b = Pair(), Pair()
+
+    def broken(channel, duty_cycle):
+        raise RuntimeError('device error')
+    monkeypatch.setattr(board, '_pwm_write', broken)
+
+    server._process([
+        a.request(IOOperation(IOMethod.DIGITAL_WRITE, 0, 1)),
+        b.request(IOOperation(IOMethod.PWM_WRITE, 1, 0.5)),
+    ])
+    assert a.reply()[0] == Status.OK
+    status, _, message = b.reply()
+    assert status == Status.ERROR and b'device error' in message
+    assert board.digital_output[0] is True
+
+def test_conflicting_requests_run_separately(board, monkeypatch):
+    server = DeviceServer(board, '')
+    pairs = [Pair() for _ in range(3)]
+    monkeypatch.setattr(board, 'can_batch', lambda ops: len({op.channel for op in ops}) == len(ops))
+    transactions = board.num_transactions
+
+    server._process([
+        pairs[0].request(IOOperation(IOMethod.DIGITAL_WRITE, 0, 1)),
+        pairs[1].request(IOOperation(IOMethod.DIGITAL_WRITE, 1, 1)),
+        pairs[2].request(IOOperation(IOMethod.DIGITAL_WRITE, 0, 0)), # same line as the first request
+    ])
+    assert [pair.reply()[0] for pair in pairs] == [Status.OK] * 3
+    assert board.num_transactions - transactions == 2
+    assert (board.digital_output[0], board.digital_output[1]) == (False, True)
+
+def test_reset_connection_drops_only_that_client(board):
+    server = DeviceServer(board, '')
+
+    class Resetting:
+        closed = False
+        def recv(self, size):
+            raise ConnectionResetError(104, 'Connection reset by peer')
+        def close(self):
+            self.closed = True
+
+    class Selector:
+        def unregister(self, conn):
+            pass
+
+    conn = Resetting()
+    server._buffers[conn] = bytearray()
+    assert server._receive(conn, Selector()) == []
+    assert conn.closed and conn not in server._buffers
@@ -0,0 +1,65 @@
+from daq_tools.statistics import (
+    RunningStatistics, COUNT, MEAN, VARIANCE, MINIMUM, MAXIMUM, RMS, SATURATED,
+    EXP_MEAN, EXP_VARIANCE, WINDOW_MEAN, WINDOW_VARIANCE
+)
+import numpy as np
+import pytest
+
+TAU, WINDOW = 50, 100
+
+def splits(n, sizes):
+    start = 0
+    for size in sizes:
+        yield slice(start, start + size)
+        start += size
+    yield slice(start, n)
+
+def exponential(x, alpha):
+    # one sample at a time, as the docstring defines it
+    mean, mean_squares = x[0].copy(), x[0] ** 2
+    for sample in x:
+        mean = (1 - alpha) * mean + alpha * sample
+        mean_squares = (1 - alpha) * mean_squares + alpha * sample ** 2
+    return mean, mean_squares - mean ** 2
+
+@pytest.mark.parametrize('sizes', [[], [1] * 30, [3, 97, 250, 1, 64], [150] * 5, [999]])
+def test_against_numpy(sizes):
+    rng = np.random.default_rng(0)
+    x = 5 + 2 * rng.standard_normal((1000, 3))
+    x[::37, 1] = 10 # saturated samples
+    statistics = RunningStatistics(3, saturation_low = -1, saturation_high = 10, tau = TAU, window = WINDOW, max_chunk = 64)
+    for part in splits(len(x), sizes):
+        snapshot = statistics.update(x[part])
+
+    assert np.all(snapshot[COUNT] == 1000)
+    np.testing.assert_allclose(snapshot[MEAN], np.mean(x, axis=0))
+    np.testing.assert_allclose(snapshot[VARIANCE], np.var(x, axis=0, ddof=1))
+    np.testing.assert_array_equal(snapshot[MINIMUM], x.min(axis=0))
+    np.testing.assert_array_equal(snapshot[MAXIMUM], x.max(axis=0))
+    np.testing.assert_allclose(snapshot[RMS], np.sqrt(np.mean(x ** 2, axis=0)))
+    np.testing.assert_array_equal(snapshot[SATURATED], np.sum((x <= -1) | (x >= 10), axis=0))
+
+    mean, variance = exponential(x, statistics.alpha)
+    np.testing.assert_allclose(snapshot[EXP_MEAN], mean)
+    np.testing.assert_allclose(snapshot[EXP_VARIANCE], variance)
+
+    np.testing.assert_allclose(snapshot[WINDOW_MEAN], np.mean(x[-WINDOW:], axis=0))
+    np.testing.assert_allclose(snapshot[WINDOW_VARIANCE], np.var(x[-WINDOW:], axis=0, ddof=1))
+
+def test_window_not_full_yet():
+    x = np.random.default_rng(1).standard_normal(40)
+    statistics = RunningStatistics(1, window = WINDOW)
+    statistics.update(x[:15])
+    snapshot = statistics.update(x[15:])
+    np.testing.assert_allclose(snapshot[WINDOW_MEAN], np.mean(x))
+    np.testing.assert_allclose(snapshot[WINDOW_VARIANCE], np.var(x, ddof=1))
+
+def test_reset():
+    statistics = RunningStatistics(2)
+    statistics.update(np.ones((10, 2)))
+    statistics.reset()
+    snapshot = statistics.update(np.full((5, 2), 3.0))
+    np.testing.assert_array_equal(snapshot[COUNT], 5)
+    np.testing.assert_array_equal(snapshot[MEAN], 3)
+    np.testing.assert_array_equal(snapshot[MINIMUM], 3)
+    np.testing.assert_array_equal(snapshot[EXP_MEAN], 3)
@@ -0,0 +1,69 @@
+from daq_tools import Simulated_SoftTiming, TracingDAQ, read_trace, replay_trace, IOMethod, IOOperation
+from daq_tools.trace import RESET, FLAG_BATCH, FLAG_BATCH_START, FLAG_ERROR
+import math
+import pytest
+
+def calls(path):
+    return [(r.method, r.flags, r.channel, r.value) for r in read_trace(path)]
+
+def record(daq, path):
+    daq.set_analog_input(2, 0.75)
+    daq.set_digital_input(4, True)
+    with TracingDAQ(daq, path) as traced:
+        traced.digital_write(1, True)
+        traced.pwm_write(0, 0.25)
+        assert traced.analog_read(2) == 0.75
+        traced.execute([IOOperation(IOMethod.DIGITAL_READ, 4)]) # one operation batch
+        traced.execute([
+            IOOperation(IOMethod.ANALOG_WRITE, 1, 1.5),
+            IOOperation(IOMethod.DIGITAL_READ, 4),
+            IOOperation(IOMethod.DIGITAL_WRITE, 1, 0),
+        ])
+        with pytest.raises(ValueError):
+            traced.pwm_write(0, 2.0)
+        traced.reset_state()
+
+def test_record(tmp_path):
+    path = tmp_path / 'trace.bin'
+    record(Simulated_SoftTiming(0), path)
+
+    records = list(read_trace(path))
+    assert [r[:3] for r in records] == [
+        (IOMethod.DIGITAL_WRITE, 0, 1),
+        (IOMethod.PWM_WRITE, 0, 0),
+        (IOMethod.ANALOG_READ, 0, 2),
+        (IOMethod.DIGITAL_READ, FLAG_BATCH | FLAG_BATCH_START, 4),
+        (IOMethod.ANALOG_WRITE, FLAG_BATCH | FLAG_BATCH_START, 1),
+        (IOMethod.DIGITAL_READ, FLAG_BATCH, 4),
+        (IOMethod.DIGITAL_WRITE, FLAG_BATCH, 1),
+        (IOMethod.PWM_WRITE, FLAG_ERROR, 0),
+        (RESET, 0, 0),
+    ]
+    # reads record the value read
+    assert [r.value for r in records[:6]] == [1, 0.25, 0.75, 1, 1.5, 1]
+    timestamps = [r.timestamp for r in records]
+    assert timestamps == sorted(timestamps)
+    assert all(r.duration >= 0 and not math.isnan(r.value) for r in records)
+
+def test_replay_gives_the_same_calls(tmp_path):
+    original = tmp_path / 'original.bin'
+    record(Simulated_SoftTiming(0), original)
+
+    # replaying through a TracingDAQ records the replayed calls
+    replayed = Simulated_SoftTiming(1)
+    replayed.set_analog_input(2, 0.75)
+    replayed.set_digital_input(4, True)
+    with TracingDAQ(replayed, tmp_path / 'replayed.bin') as traced:
+        report = replay_trace(original, traced, speed = None)
+
+    assert calls(tmp_path / 'replayed.bin') == calls(original)
+    assert report.num_calls == 7
+    assert report.num_errors == 1
+    assert report.durations.keys() == {'execute', 'reset_state', *map(str, [IOMethod.DIGITAL_WRITE, IOMethod.PWM_WRITE, IOMethod.ANALOG_READ])}
+    assert replayed.digital_output[1] is False and replayed.analog_output[1] == 0.0
+
+def test_not_a_trace(tmp_path):
+    path = tmp_path / 'other.bin'
+    path.write_bytes(b'\0' * 64)
+    with pytest.raises(ValueError):
+        list(read_trace(path))
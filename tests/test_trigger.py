@@ -0,0 +1,66 @@
+from daq_tools import TriggeredCapture, EdgeTrigger, ThresholdTrigger, Edge
+import numpy as np
+import pytest
+
+PRE, POST = 5, 10
+
+def stream(rising_edges, length = 100, pulse = 2):
+    """Sample index on channel 0, TTL pulses on channel 1"""
+    x = np.zeros((length, 2))
+    x[:, 0] = np.arange(length)
+    for index in rising_edges:
+        x[index:index + pulse, 1] = 1
+    return x
+
+def capture_all(capture, x, chunk_size):
+    events = []
+    for start in range(0, len(x), chunk_size):
+        events.extend(capture.process(x[start:start + chunk_size]))
+    return events
+
+@pytest.mark.parametrize('chunk_size', [1, 4, 13, 100])
+@pytest.mark.parametrize('max_chunk', [3, 4096])
+def test_windows_across_chunks(chunk_size, max_chunk):
+    # 3: not enough history, 28: dead time of 20, 95: not enough samples yet
+    x = stream([3, 20, 28, 40, 60, 95])
+    capture = TriggeredCapture(2, PRE, POST, EdgeTrigger(1), max_chunk = max_chunk)
+    events = capture_all(capture, x, chunk_size)
+
+    assert [event.trigger_index for event in events] == [20, 40, 60]
+    for event in events:
+        np.testing.assert_array_equal(event.data, x[event.trigger_index - PRE:event.trigger_index + POST])
+
+    stats = capture.stats
+    assert stats.num_samples == 100
+    assert stats.num_triggers == 6
+    assert stats.num_events == 3
+    assert stats.dropped_no_history == 1
+    assert stats.dropped_dead_time == 1
+    assert stats.dead_samples == 4 * POST # triggers 20, 40, 60 and 95
+
+def test_dead_time_and_reset():
+    x = stream([10, 14, 30], pulse = 1)
+    capture = TriggeredCapture(2, 0, 2, EdgeTrigger(1), dead_time = 0)
+    assert [event.trigger_index for event in capture.process(x)] == [10, 14, 30]
+
+    capture.reset()
+    assert capture.stats.num_samples == 0
+    assert [event.trigger_index for event in capture.process(x[:20])] == [10, 14]
+
+def test_falling_edges():
+    x = stream([10, 40], pulse = 5)
+    capture = TriggeredCapture(2, PRE, POST, EdgeTrigger(1, Edge.FALLING))
+    assert [event.trigger_index for event in capture_all(capture, x, 7)] == [15, 45]
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 5, 50])
+def test_threshold_hysteresis_across_chunks(chunk_size):
+    # noise around the level only fires once per crossing
+    x = np.array([0, 0.9, 1.1, 0.95, 1.05, 2, 0.95, 1.02, 0.2, 0.1, 1.5, 0.5])[:, np.newaxis]
+    trigger = ThresholdTrigger(0, 1.0, hysteresis = 0.2)
+    found = np.concatenate([
+        trigger.find(x[start:start + chunk_size]) + start for start in range(0, len(x), chunk_size)
+    ])
+    np.testing.assert_array_equal(found, [2, 10])
+
+    with pytest.raises(ValueError):
+        ThresholdTrigger(0, 1.0, hysteresis = -1)